@@ -27,6 +27,7 @@ from datetime import datetime, timedelta
 from weboob.capabilities.bank import ICapBank, AccountNotFound, Account, Recipient
 from weboob.capabilities.messages import ICapMessages, Thread
 from weboob.tools.backend import BaseBackend, BackendConfig
+from weboob.tools.capabilities.bank.cache import cache_accounts, cache_account, invalidate_accounts
 from weboob.tools.value import ValueBackendPassword
 
 from .browser import BNPorc
@@ -73,10 +74,12 @@ class BNPorcBackend(BaseBackend, ICapBank, ICapMessages):
         self.config['rotating_password'].set(old)
         self.config.save()
 
+    @cache_accounts
     def iter_accounts(self):
         for account in self.browser.get_accounts_list():
             yield account
 
+    @cache_account
     def get_account(self, _id):
         if not _id.isdigit():
             raise AccountNotFound()
@@ -102,6 +105,7 @@ class BNPorcBackend(BaseBackend, ICapBank, ICapMessages):
             recipient.label = account.label
             yield recipient
 
+    @invalidate_accounts
     def transfer(self, account, to, amount, reason=None):
         if isinstance(account, Account):
             account = account.id
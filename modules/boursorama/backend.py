@@ -63,7 +63,7 @@ class BoursoramaBackend(BaseBackend, ICapBank):
 
     def iter_history(self, account):
         with self.browser:
-            for history in self.browser.get_history(account):
+            for history in self.limit_results(self.browser.get_history(account), sorted_by='date', tolerance=3):
                 yield history
 
     # TODO
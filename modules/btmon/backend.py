@@ -46,7 +46,7 @@ class BtmonBackend(BaseBackend, ICapTorrent):
         torrent = self.browser.get_torrent(id)
         if not torrent:
             return None
-        return self.browser.openurl(torrent.url.encode('utf-8')).read()
+        return self.browser.open_blob(torrent.url.encode('utf-8'))
 
     def iter_torrents(self, pattern):
         return self.browser.iter_torrents(quote_plus(pattern.encode('utf-8')))
@@ -23,6 +23,7 @@ from decimal import Decimal
 
 from weboob.capabilities.bank import ICapBank, AccountNotFound, Recipient, Account
 from weboob.tools.backend import BaseBackend, BackendConfig
+from weboob.tools.capabilities.bank.cache import cache_accounts, cache_account, invalidate_accounts
 from weboob.tools.value import ValueBackendPassword
 
 from .browser import CICBrowser
@@ -45,10 +46,12 @@ class CICBackend(BaseBackend, ICapBank):
     def create_default_browser(self):
         return self.create_browser(self.config['login'].get(), self.config['password'].get())
 
+    @cache_accounts
     def iter_accounts(self):
         for account in self.browser.get_accounts_list():
             yield account
 
+    @cache_account
     def get_account(self, _id):
         account = self.browser.get_account(_id)
         if account:
@@ -64,9 +67,9 @@ class CICBackend(BaseBackend, ICapBank):
 
     def iter_history(self, account):
         with self.browser:
-            for tr in self.browser.get_history(account):
-                if not tr._is_coming:
-                    yield tr
+            transactions = (tr for tr in self.browser.get_history(account) if not tr._is_coming)
+            for tr in self.limit_results(transactions, sorted_by='date', tolerance=3):
+                yield tr
 
     def iter_transfer_recipients(self, ignored):
         for account in self.browser.get_accounts_list().itervalues():
@@ -75,6 +78,7 @@ class CICBackend(BaseBackend, ICapBank):
             recipient.label = account.label
             yield recipient
 
+    @invalidate_accounts
     def transfer(self, account, to, amount, reason=None):
         if isinstance(account, Account):
             account = account.id
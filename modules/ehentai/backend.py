@@ -94,7 +94,7 @@ class EHentaiBackend(BaseBackend, ICapGallery, ICapCollection):
             image.url = self.browser.get_image_url(image)
             if 'data' in fields:
                 ratelimit("ehentai_get", 2)
-                image.data = self.browser.readurl(image.url)
+                image.data = self.browser.open_blob(image.url)
 
     def iter_resources(self, objs, split_path):
         if BaseGallery in objs:
@@ -80,7 +80,7 @@ class INGBackend(BaseBackend, ICapBank, ICapBill):
 
     def iter_history(self, account):
         with self.browser:
-            for history in self.browser.get_history(account.id):
+            for history in self.limit_results(self.browser.get_history(account.id), sorted_by='date', tolerance=3):
                 yield history
 
     def iter_transfer_recipients(self, account):
@@ -57,8 +57,7 @@ class IzneoBrowser(BaseBrowser):
 
     def fill_image(self, image, fields):
         if 'data' in fields:
-            image.data = self.readurl(self.request_class(
-                image.url, None, {'Referer': image.gallery.url}))
+            image.data = self.open_blob(image.url, {'Referer': image.gallery.url})
 
 
 class IzneoBackend(BaseBackend, ICapGallery):
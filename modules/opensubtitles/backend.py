@@ -48,7 +48,7 @@ class OpensubtitlesBackend(BaseBackend, ICapSubtitle):
         if not subtitle:
             return None
 
-        return self.browser.openurl(subtitle.url.encode('utf-8')).read()
+        return self.browser.open_blob(subtitle.url.encode('utf-8'))
 
     def iter_subtitles(self, language, pattern):
         if language not in LANGUAGE_CONV.keys():
@@ -49,7 +49,7 @@ class PiratebayBackend(BaseBackend, ICapTorrent):
 
         if torrent.url is NotAvailable and torrent.magnet:
             raise MagnetOnly(torrent.magnet)
-        return self.browser.openurl(torrent.url.encode('utf-8')).read()
+        return self.browser.open_blob(torrent.url.encode('utf-8'))
 
     def iter_torrents(self, pattern):
         return self.browser.iter_torrents(pattern.replace(' ', '+'))
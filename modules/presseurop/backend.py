@@ -24,7 +24,6 @@ from weboob.tools.backend import BackendConfig
 from weboob.tools.value import Value
 from .browser import NewspaperPresseuropBrowser
 from .tools import rssid, url2id
-from weboob.tools.newsfeed import Newsfeed
 
 
 class NewspaperPresseuropBackend(GenericNewspaperBackend, ICapMessages):
@@ -51,7 +50,7 @@ class NewspaperPresseuropBackend(GenericNewspaperBackend, ICapMessages):
 
     def iter_threads(self):
         daily = []
-        for article in Newsfeed(self.RSS_FEED, self.RSSID).iter_entries():
+        for article in self.get_feed(self.RSSID).iter_entries():
             if "/news-brief/" in article.link:
                 day = self.browser.get_daily_date(article.link)
                 if day and (day not in daily):
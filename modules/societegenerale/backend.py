@@ -60,9 +60,9 @@ class SocieteGeneraleBackend(BaseBackend, ICapBank):
 
     def iter_history(self, account):
         with self.browser:
-            for tr in self.browser.iter_history(account):
-                if not tr._coming:
-                    yield tr
+            transactions = (tr for tr in self.browser.iter_history(account) if not tr._coming)
+            for tr in self.limit_results(transactions, sorted_by='date', tolerance=3):
+                yield tr
 
     def iter_coming(self, account):
         with self.browser:
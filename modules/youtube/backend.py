@@ -120,6 +120,10 @@ class YoutubeBackend(BaseBackend, ICapVideo, ICapCollection):
         YOUTUBE_MAX_START_INDEX = 1000
         yt_service = gdata.youtube.service.YouTubeService()
 
+        if max_results is None and self.condition is None:
+            # Results are not filtered, so no more than count are needed.
+            max_results = self.count
+
         start_index = 1
         nb_yielded = 0
         while True:
@@ -177,3 +181,6 @@ class YoutubeBackend(BaseBackend, ICapVideo, ICapCollection):
         raise CollectionNotFound(collection.split_path)
 
     OBJECTS = {YoutubeVideo: fill_video}
+    # fill_video() only uses the browser while holding its lock, and
+    # downloads thumbnails with urllib, so videos can be filled at once.
+    FILL_CONCURRENCY = 4
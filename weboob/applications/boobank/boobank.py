@@ -25,6 +25,7 @@ from weboob.capabilities.base import empty
 from weboob.capabilities.bank import ICapBank, Account, Transaction
 from weboob.tools.application.repl import ReplApplication
 from weboob.tools.application.formatters.iformatter import IFormatter, PrettyFormatter
+from weboob.tools.capabilities.bank.sync import iter_new_history
 
 
 __all__ = ['Boobank']
@@ -176,6 +177,10 @@ class Boobank(ReplApplication):
                           }
     COLLECTION_OBJECTS = (Account, Transaction, )
 
+    def load_default_backends(self):
+        # The storage keeps the marks of "history ID new".
+        self.load_backends(ICapBank, storage=self.create_storage())
+
     def _complete_account(self, exclude=None):
         if exclude:
             exclude = '%s@%s' % self.parse_id(exclude)
@@ -194,20 +199,31 @@ class Boobank(ReplApplication):
         args = line.split(' ')
         if len(args) == 2:
             return self._complete_account()
+        if len(args) == 3:
+            return ['new']
 
-    def do_history(self, id):
+    def do_history(self, line):
         """
-        history ID
+        history ID [new]
 
         Display history of transactions.
+
+        With "new", only display transactions which are new since the last
+        call of "history ID new".
         """
+        id, new = self.parse_command_args(line, 2, 1)
+        if new not in (None, 'new'):
+            print >>sys.stderr, 'Error: unknown argument "%s"' % new
+            return 2
+
         account = self.get_object(id, 'get_account', [])
         if not account:
             print >>sys.stderr, 'Error: please give an account ID (hint: use list command)'
             return 2
 
+        function = iter_new_history if new else 'iter_history'
         self.start_format()
-        for backend, transaction in self.do('iter_history', account, backends=account.backend):
+        for backend, transaction in self.do(function, account, backends=account.backend):
             self.format(transaction)
         self.flush()
 
@@ -27,7 +27,7 @@ from weboob.applications.suboob.suboob import SubtitleInfoFormatter, SubtitleLis
 from weboob.capabilities.torrent import ICapTorrent, MagnetOnly
 from weboob.capabilities.cinema import ICapCinema
 from weboob.capabilities.subtitle import ICapSubtitle
-from weboob.capabilities.base import empty
+from weboob.capabilities.base import Blob, empty
 from weboob.tools.application.repl import ReplApplication
 from weboob.tools.application.formatters.iformatter import IFormatter, PrettyFormatter
 from weboob.core import CallErrors
@@ -484,15 +484,15 @@ class Cineoob(ReplApplication):
         try:
             for backend, buf in self.do('get_torrent_file', _id, backends=backend_name, caps=ICapTorrent):
                 if buf:
-                    if dest == '-':
-                        print buf
-                    else:
-                        try:
-                            with open(dest, 'w') as f:
-                                f.write(buf)
-                        except IOError, e:
-                            print >>sys.stderr, 'Unable to write .torrent in "%s": %s' % (dest, e)
-                            return 1
+                    with Blob.wrap(buf) as blob:
+                        if dest == '-':
+                            blob.save_to(sys.stdout)
+                        else:
+                            try:
+                                blob.save_to(dest)
+                            except IOError, e:
+                                print >>sys.stderr, 'Unable to write .torrent in "%s": %s' % (dest, e)
+                                return 1
                     return
         except CallErrors, errors:
             for backend, error, backtrace in errors:
@@ -592,15 +592,15 @@ class Cineoob(ReplApplication):
         try:
             for backend, buf in self.do('get_subtitle_file', _id, backends=backend_name, caps=ICapSubtitle):
                 if buf:
-                    if dest == '-':
-                        print buf
-                    else:
-                        try:
-                            with open(dest, 'w') as f:
-                                f.write(buf)
-                        except IOError, e:
-                            print >>sys.stderr, 'Unable to write file in "%s": %s' % (dest, e)
-                            return 1
+                    with Blob.wrap(buf) as blob:
+                        if dest == '-':
+                            blob.save_to(sys.stdout)
+                        else:
+                            try:
+                                blob.save_to(dest)
+                            except IOError, e:
+                                print >>sys.stderr, 'Unable to write file in "%s": %s' % (dest, e)
+                                return 1
                     return
         except CallErrors, errors:
             for backend, error, backtrace in errors:
@@ -21,7 +21,10 @@ from __future__ import with_statement
 
 import sys
 import os
+from glob import glob
+from Queue import Queue
 from re import search, sub
+from threading import Thread, Lock
 
 from weboob.tools.application.repl import ReplApplication
 from weboob.capabilities.base import empty
@@ -46,6 +49,138 @@ class GalleryListFormatter(PrettyFormatter):
             return obj.description
 
 
+class ImagesDownloader(object):
+    """
+    Download images of a gallery in a directory, with several fetchers.
+
+    Images are named after their position in the gallery, and their data are
+    written by chunks, without being kept in memory. Each image is written
+    in a ".part" file, which is renamed once complete: when a download is
+    started again, complete images are skipped, and partial ones are
+    resumed if the website allows it.
+
+    :param backend: backend of the gallery
+    :type backend: :class:`weboob.capabilities.gallery.ICapGallery`
+    :param dest: directory where images are written
+    :type dest: str
+    :param fetchers: number of images downloaded at once
+    :type fetchers: int
+    """
+    CHUNK_SIZE = 64*1024
+
+    def __init__(self, backend, dest, fetchers=4):
+        self.backend = backend
+        self.dest = dest
+        self.fetchers = max(1, fetchers)
+        # Images waiting for a fetcher, bounded to read pages as they are
+        # downloaded.
+        self.queue = Queue(self.fetchers * 2)
+        self.failed = []
+        self.mutex = Lock()
+        # The default open_image() fills the image with the browser of the
+        # backend, which can't be used by several fetchers at once.
+        self.shared_browser = getattr(type(backend).open_image, 'im_func', None) is \
+                              ICapGallery.open_image.im_func
+
+    def download(self, images, first=0):
+        """
+        Download images.
+
+        :param images: images of the gallery, in order
+        :type images: iter[:class:`weboob.capabilities.gallery.BaseImage`]
+        :param first: position of the first image to download
+        :type first: int
+        :returns: positions of images which have not been downloaded
+        :rtype: list[int]
+        """
+        threads = []
+        for n in xrange(self.fetchers):
+            thread = Thread(target=self._fetch, name='galleroob-fetcher')
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        try:
+            i = 0
+            for img in images:
+                i += 1
+                if i < first:
+                    continue
+                self.queue.put((i, img))
+        finally:
+            for thread in threads:
+                self.queue.put(None)
+            for thread in threads:
+                # Join with a timeout to be interruptible.
+                while thread.isAlive():
+                    thread.join(1)
+
+        return sorted(self.failed)
+
+    def _print(self, msg, stream=sys.stdout):
+        with self.mutex:
+            print >>stream, msg
+
+    def _fetch(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+
+            i, img = job
+            try:
+                if not self.download_image(i, img):
+                    self._print("Couldn't get page %d" % i, sys.stderr)
+                    self.failed.append(i)
+            except Exception, e:
+                self._print("Couldn't get page %d: %s" % (i, e), sys.stderr)
+                self.failed.append(i)
+
+    def download_image(self, i, img):
+        """
+        Download an image, unless it has already been downloaded.
+
+        :returns: False if the image is not available
+        :rtype: bool
+        """
+        prefix = os.path.join(self.dest, '%03d' % i)
+        part = prefix + '.part'
+        if [name for name in glob(prefix + '.*') if name != part]:
+            return True
+
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        if self.shared_browser:
+            with self.backend:
+                fp, start = self.backend.open_image(img, offset)
+        else:
+            fp, start = self.backend.open_image(img, offset)
+        if fp is None:
+            return False
+
+        try:
+            with open(part, 'r+b' if start > 0 else 'wb') as f:
+                f.seek(start)
+                f.truncate()
+                while True:
+                    chunk = fp.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+        finally:
+            fp.close()
+
+        ext = search(r"\.([^\.]{1,5})$", img.url)
+        if ext:
+            ext = ext.group(1)
+        else:
+            ext = "jpg"
+
+        name = '%s.%s' % (prefix, ext)
+        os.rename(part, name)
+        self._print('Wrote file %s' % name)
+        return True
+
+
 class Galleroob(ReplApplication):
     APPNAME = 'galleroob'
     VERSION = '0.f'
@@ -60,6 +195,10 @@ class Galleroob(ReplApplication):
     def __init__(self, *args, **kwargs):
         ReplApplication.__init__(self, *args, **kwargs)
 
+    def add_application_options(self, group):
+        group.add_option('-j', '--fetchers', type='int', default=4,
+                         help='number of images downloaded at once (default: 4)')
+
     def do_search(self, pattern):
         """
         search PATTERN
@@ -112,34 +251,16 @@ class Galleroob(ReplApplication):
             os.mkdir(dest)
         except OSError:
             pass  # ignore error on existing directory
-        os.chdir(dest)  # fail here if dest couldn't be created
-
-        i = 0
-        for img in backend.iter_gallery_images(gallery):
-            i += 1
-            if i < first:
-                continue
-
-            backend.fillobj(img, ('url', 'data'))
-            if img.data is None:
-                backend.fillobj(img, ('url', 'data'))
-                if img.data is None:
-                    print >>sys.stderr, "Couldn't get page %d, exiting" % i
-                    break
-
-            ext = search(r"\.([^\.]{1,5})$", img.url)
-            if ext:
-                ext = ext.group(1)
-            else:
-                ext = "jpg"
-
-            name = '%03d.%s' % (i, ext)
-            print 'Writing file %s' % name
-
-            with open(name, 'w') as f:
-                f.write(img.data)
-
-        os.chdir(os.path.pardir)
+        if not os.path.isdir(dest):
+            print >>sys.stderr, 'Unable to create directory %s' % dest
+            return 1
+
+        downloader = ImagesDownloader(backend, dest, self.options.fetchers)
+        failed = downloader.download(backend.iter_gallery_images(gallery), first)
+        if failed:
+            print >>sys.stderr, "Couldn't get pages %s, run the command again to resume" % \
+                                ', '.join(str(i) for i in failed)
+            return 1
 
     def do_info(self, line):
         """
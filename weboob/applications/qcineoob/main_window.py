@@ -252,7 +252,7 @@ class MainWindow(QtMainWindow):
         self.ui.stopButton.show()
 
     def stopProcess(self):
-        self.process.process.finish_event.set()
+        self.process.process.cancel()
 
     def addMovie(self, backend, movie):
         if not backend:
@@ -17,13 +17,15 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
+from __future__ import with_statement
+
 import sys
 
 from PyQt4.QtCore import Qt, SIGNAL
 from PyQt4.QtGui import QFrame, QFileDialog
 
 from weboob.applications.qcineoob.ui.subtitle_ui import Ui_Subtitle
-from weboob.capabilities.base import empty
+from weboob.capabilities.base import Blob, empty
 
 
 class Subtitle(QFrame):
@@ -77,12 +79,12 @@ class Subtitle(QFrame):
             return
         result = fileDial.selectedFiles()
         if len(result) > 0:
-            dest = result[0]
+            dest = unicode(result[0])
             data = self.backend.get_subtitle_file(self.subtitle.id)
-            try:
-                with open(dest, 'w') as f:
-                    f.write(data)
-            except IOError, e:
-                print >>sys.stderr, 'Unable to write subtitle file in "%s": %s' % (dest, e)
-                return 1
+            with Blob.wrap(data) as blob:
+                try:
+                    blob.save_to(dest)
+                except IOError, e:
+                    print >>sys.stderr, 'Unable to write subtitle file in "%s": %s' % (dest, e)
+                    return 1
             return
@@ -17,6 +17,8 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
+from __future__ import with_statement
+
 import sys
 
 from PyQt4.QtCore import Qt, SIGNAL
@@ -24,7 +26,7 @@ from PyQt4.QtGui import QFrame, QFileDialog
 
 from weboob.applications.qcineoob.ui.torrent_ui import Ui_Torrent
 from weboob.applications.weboorrents.weboorrents import sizeof_fmt
-from weboob.capabilities.base import empty
+from weboob.capabilities.base import Blob, empty
 
 
 class Torrent(QFrame):
@@ -81,12 +83,12 @@ class Torrent(QFrame):
             return
         result = fileDial.selectedFiles()
         if len(result) > 0:
-            dest = result[0]
+            dest = unicode(result[0])
             data = self.backend.get_torrent_file(self.torrent.id)
-            try:
-                with open(dest, 'w') as f:
-                    f.write(data)
-            except IOError, e:
-                print >>sys.stderr, 'Unable to write .torrent in "%s": %s' % (dest, e)
-                return 1
+            with Blob.wrap(data) as blob:
+                try:
+                    blob.save_to(dest)
+                except IOError, e:
+                    print >>sys.stderr, 'Unable to write .torrent in "%s": %s' % (dest, e)
+                    return 1
             return
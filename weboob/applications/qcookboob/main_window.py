@@ -125,7 +125,7 @@ class MainWindow(QtMainWindow):
             return num
 
     def stopProcess(self):
-        self.process.process.finish_event.set()
+        self.process.process.cancel()
 
     def doAction(self, description, fun, args):
         ''' Call fun with args as arguments
@@ -20,6 +20,7 @@
 
 from PyQt4.QtGui import QFrame, QImage, QPixmap
 
+from weboob.capabilities.base import Blob
 from weboob.tools.application.qt import QtDo
 from weboob.applications.qvideoob.ui.minivideo_ui import Ui_MiniVideo
 from .video import Video
@@ -52,7 +53,7 @@ class MiniVideo(QFrame):
             return
 
         if video.thumbnail and video.thumbnail.data:
-            img = QImage.fromData(video.thumbnail.data)
+            img = QImage.fromData(Blob.wrap(video.thumbnail.data).read())
             self.ui.imageLabel.setPixmap(QPixmap.fromImage(img))
 
     def enterEvent(self, event):
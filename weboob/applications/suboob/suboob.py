@@ -22,7 +22,7 @@ from __future__ import with_statement
 import sys
 
 from weboob.capabilities.subtitle import ICapSubtitle
-from weboob.capabilities.base import empty
+from weboob.capabilities.base import Blob, empty
 from weboob.tools.application.repl import ReplApplication
 from weboob.tools.application.formatters.iformatter import IFormatter, PrettyFormatter
 from weboob.core import CallErrors
@@ -143,15 +143,15 @@ class Suboob(ReplApplication):
         try:
             for backend, buf in self.do('get_subtitle_file', _id, backends=backend_name):
                 if buf:
-                    if dest == '-':
-                        print buf
-                    else:
-                        try:
-                            with open(dest, 'w') as f:
-                                f.write(buf)
-                        except IOError, e:
-                            print >>sys.stderr, 'Unable to write file in "%s": %s' % (dest, e)
-                            return 1
+                    with Blob.wrap(buf) as blob:
+                        if dest == '-':
+                            blob.save_to(sys.stdout)
+                        else:
+                            try:
+                                blob.save_to(dest)
+                            except IOError, e:
+                                print >>sys.stderr, 'Unable to write file in "%s": %s' % (dest, e)
+                                return 1
                     return
         except CallErrors, errors:
             for backend, error, backtrace in errors:
@@ -22,16 +22,70 @@ from __future__ import with_statement
 import subprocess
 import sys
 import os
+from threading import Lock
+import time
 
 from weboob.capabilities.video import ICapVideo, BaseVideo
 from weboob.capabilities.base import empty
 from weboob.tools.application.repl import ReplApplication
 from weboob.tools.application.media_player import InvalidMediaPlayer, MediaPlayer, MediaPlayerNotFound
 from weboob.tools.application.formatters.iformatter import PrettyFormatter
+from weboob.tools.browser import StandardBrowser
+from weboob.tools.browser.download import Downloader
 
 __all__ = ['Videoob']
 
 
+def sizeof_fmt(num):
+    for x in ['bytes', 'KB', 'MB', 'GB', 'TB']:
+        if num < 1024.0:
+            return "%-4.1f%s" % (num, x)
+        num /= 1024.0
+
+
+class DownloadProgress(object):
+    """
+    Print the progress of downloads on a line of stderr.
+    """
+    def __init__(self, downloader=None):
+        self.downloader = downloader
+        self.tty = sys.stderr.isatty()
+        self.mutex = Lock()
+
+    def __call__(self, download):
+        downloader = self.downloader
+        downloads = downloader.downloads
+        finished = len([d for d in downloads if d.finished])
+        downloaded = sum(d.downloaded for d in downloads)
+        resumed = sum(d.resumed for d in downloads)
+        started = [d.started_at for d in downloads if d.started_at is not None]
+        elapsed = time.time() - min(started) if started else 0
+
+        line = '[%d/%d] %s' % (finished, len(downloads), sizeof_fmt(downloaded).strip())
+        sizes = [d.size for d in downloads]
+        if None not in sizes and sum(sizes) > 0:
+            line += ' / %s (%d%%)' % (sizeof_fmt(sum(sizes)).strip(), 100 * downloaded / sum(sizes))
+        if elapsed > 0:
+            line += ' - %s/s' % sizeof_fmt((downloaded - resumed) / elapsed).strip()
+
+        with self.mutex:
+            if download.finished:
+                if download.error is None:
+                    msg = 'Downloaded %s' % download.dest
+                else:
+                    msg = 'Unable to download %s: %s' % (download.dest, download.error)
+                if self.tty:
+                    sys.stderr.write('\r\033[K')
+                sys.stderr.write('%s\n' % msg)
+            if self.tty:
+                sys.stderr.write('\r\033[K%s' % line)
+            sys.stderr.flush()
+
+    def close(self):
+        if self.tty:
+            sys.stderr.write('\n')
+
+
 class VideoListFormatter(PrettyFormatter):
     MANDATORY_FIELDS = ('id', 'title', 'duration', 'date')
 
@@ -69,10 +123,56 @@ class Videoob(ReplApplication):
         ReplApplication.__init__(self, *args, **kwargs)
         self.player = MediaPlayer(self.logger)
 
+    def add_application_options(self, group):
+        group.add_option('-j', '--connections', type='int', default=4,
+                         help='maximum number of simultaneous connections of downloads (default: 4)')
+        group.add_option('--limit-rate', type='int', metavar='KB',
+                         help='limit the bandwidth of downloads, in KB per second')
+
     def main(self, argv):
         self.load_config()
         return ReplApplication.main(self, argv)
 
+    def get_downloader(self):
+        rate = self.options.limit_rate
+        progress = DownloadProgress()
+        progress.downloader = Downloader(self.options.connections,
+                                         bandwidth=rate * 1024 if rate else None,
+                                         progress=progress)
+        return progress.downloader
+
+    def get_download_dest(self, video):
+        ext = video.ext
+        if not ext:
+            ext = 'avi'
+        return '%s.%s' % (video.id, ext)
+
+    def add_download(self, downloader, video, dest=None):
+        """
+        Add a video to download through the browser of its backend, to keep
+        its cookies.
+        """
+        if dest is None:
+            dest = self.get_download_dest(video)
+
+        backend = self.weboob.get_backend(video.backend)
+        browser = getattr(backend, 'browser', None)
+        if not isinstance(browser, StandardBrowser):
+            return downloader.add(StandardBrowser(logger=self.logger), video.url, dest)
+        # The browser is shared with the backend and between connections.
+        return downloader.add(browser, video.url, dest, lock=backend)
+
+    def run_downloads(self, downloader):
+        try:
+            failed = downloader.run()
+        except KeyboardInterrupt:
+            downloader.progress.close()
+            print >>sys.stderr, 'Interrupted, run the command again to resume downloads.'
+            return 1
+        downloader.progress.close()
+        if failed:
+            return 1
+
     def complete_download(self, text, line, *ignored):
         args = line.split(' ')
         if len(args) == 2:
@@ -105,10 +205,12 @@ class Videoob(ReplApplication):
             return True
 
         if dest is None:
-            ext = video.ext
-            if not ext:
-                ext = 'avi'
-            dest = '%s.%s' % (video.id, ext)
+            dest = self.get_download_dest(video)
+
+        if video.url.startswith('http://') or video.url.startswith('https://'):
+            downloader = self.get_downloader()
+            self.add_download(downloader, video, dest)
+            return self.run_downloads(downloader)
 
         if video.url.startswith('rtmp'):
             if not check_exec('rtmpdump'):
@@ -125,6 +227,40 @@ class Videoob(ReplApplication):
 
         os.spawnlp(os.P_WAIT, args[0], *args)
 
+    def complete_download_all(self, text, line, *ignored):
+        return self._complete_object()
+
+    def do_download_all(self, line):
+        """
+        download_all ID [ID...]
+
+        Download several videos, in the current directory.
+
+        Files are downloaded at once, with at most --connections connections.
+        """
+        ids = line.split()
+        if not ids:
+            print >>sys.stderr, 'This command takes at least an argument: %s' % \
+                                self.get_command_help('download_all', short=True)
+            return 2
+
+        downloader = self.get_downloader()
+        ret = 0
+        for _id in ids:
+            video = self.get_object(_id, 'get_video', ['url'])
+            if not video:
+                print >>sys.stderr, 'Video not found: %s' % _id
+                ret = 3
+            elif not video.url or not (video.url.startswith('http://') or video.url.startswith('https://')):
+                print >>sys.stderr, 'Error: no HTTP URL available for %s, use the download command.' % _id
+                ret = 4
+            else:
+                self.add_download(downloader, video)
+
+        if downloader.downloads:
+            return self.run_downloads(downloader) or ret
+        return ret
+
     def complete_play(self, text, line, *ignored):
         args = line.split(' ')
         if len(args) == 2:
@@ -25,7 +25,7 @@ from weboob.capabilities.torrent import ICapTorrent, MagnetOnly
 from weboob.tools.application.repl import ReplApplication
 from weboob.tools.application.formatters.iformatter import IFormatter, PrettyFormatter
 from weboob.core import CallErrors
-from weboob.capabilities.base import NotAvailable
+from weboob.capabilities.base import Blob, NotAvailable
 
 
 __all__ = ['Weboorrents']
@@ -131,15 +131,15 @@ class Weboorrents(ReplApplication):
         try:
             for backend, buf in self.do('get_torrent_file', _id, backends=backend_name):
                 if buf:
-                    if dest == '-':
-                        print buf
-                    else:
-                        try:
-                            with open(dest, 'w') as f:
-                                f.write(buf)
-                        except IOError, e:
-                            print >>sys.stderr, 'Unable to write .torrent in "%s": %s' % (dest, e)
-                            return 1
+                    with Blob.wrap(buf) as blob:
+                        if dest == '-':
+                            blob.save_to(sys.stdout)
+                        else:
+                            try:
+                                blob.save_to(dest)
+                            except IOError, e:
+                                print >>sys.stderr, 'Unable to write .torrent in "%s": %s' % (dest, e)
+                                return 1
                     return
         except CallErrors, errors:
             for backend, error, backtrace in errors:
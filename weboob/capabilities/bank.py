@@ -205,6 +205,10 @@ class ICapBank(ICapCollection):
         """
         Iter history of transactions on a specific account.
 
+        If the history is paginated, backends should stop fetching pages
+        when older transactions can not match the condition of the call (see
+        :func:`weboob.tools.backend.BaseBackend.limit_results`).
+
         :param account: account to get history
         :type account: :class:`Account`
         :rtype: iter[:class:`Transaction`]
@@ -18,10 +18,15 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
+from __future__ import with_statement
+
 import warnings
 import datetime
 from decimal import Decimal
 from copy import deepcopy, copy
+from StringIO import StringIO
+from tempfile import SpooledTemporaryFile
+from threading import Lock
 
 from weboob.tools.misc import to_unicode
 from weboob.tools.ordereddict import OrderedDict
@@ -29,8 +34,8 @@ from weboob.tools.ordereddict import OrderedDict
 
 __all__ = ['UserError', 'FieldNotFound', 'NotAvailable',
            'NotLoaded', 'IBaseCap', 'Field', 'IntField', 'DecimalField',
-           'FloatField', 'StringField', 'BytesField', 'DateField',
-           'DeltaField', 'empty', 'CapBaseObject']
+           'FloatField', 'StringField', 'BytesField', 'Blob', 'BlobField',
+           'DateField', 'DeltaField', 'empty', 'CapBaseObject']
 
 
 def empty(value):
@@ -221,6 +226,251 @@ class BytesField(Field):
         return str(value)
 
 
+class _SpoolReader(object):
+    """
+    Reader of a spooled file, with its own position, so several readers can
+    share the same file.
+    """
+    def __init__(self, spool, mutex):
+        self.spool = spool
+        self.mutex = mutex
+        self.pos = 0
+
+    def read(self, size=-1):
+        with self.mutex:
+            self.spool.seek(self.pos)
+            data = self.spool.read(size)
+        self.pos += len(data)
+        return data
+
+    def close(self):
+        pass
+
+
+class Blob(object):
+    """
+    Binary data which is read by chunks, instead of being kept in memory.
+
+    The data is read from file-like objects given by *opener*, which is
+    called each time the blob is opened, and only when it is read.
+
+    >>> blob = Blob.from_data('hello world')
+    >>> list(blob.iter_chunks(4))
+    ['hell', 'o wo', 'rld']
+    >>> blob.read()
+    'hello world'
+    >>> blob.read()
+    'hello world'
+
+    :param opener: callable which returns a file-like object reading the
+                   data from the beginning
+    :type opener: callable
+    :param size: size in bytes of the data, if it is known
+    :type size: int
+    """
+    CHUNK_SIZE = 64*1024
+    # Size above which spooled data is written on disk.
+    SPOOL_SIZE = 1024*1024
+
+    def __init__(self, opener, size=None):
+        self.opener = opener
+        self.size = size
+        # Called by close() to release the resources kept by the blob
+        self.release = None
+
+    @classmethod
+    def from_data(cls, data):
+        """
+        Get a blob of data already in memory.
+
+        :type data: str
+        """
+        return cls(lambda: StringIO(data), len(data))
+
+    @classmethod
+    def from_stream(cls, stream, size=None):
+        """
+        Get a blob of a stream which can be read only once, like an HTTP
+        response.
+
+        The stream is copied in a temporary file the first time the blob is
+        opened, so it can be read again, and then closed. The temporary file
+        is kept in memory as long as it is smaller than :attr:`SPOOL_SIZE`,
+        until :func:`close` is called.
+
+        >>> blob = Blob.from_stream(lambda: StringIO('hello world'))
+        >>> blob.read()
+        'hello world'
+        >>> blob.size
+        11
+        >>> blob.close()
+
+        :param stream: file-like object, or callable which returns it; the
+                       callable is called only when the blob is opened
+        :param size: size in bytes of the data, if it is known
+        :type size: int
+        """
+        mutex = Lock()
+        spooled = []
+
+        def opener():
+            with mutex:
+                if not spooled:
+                    source = stream() if callable(stream) else stream
+                    spool = SpooledTemporaryFile(cls.SPOOL_SIZE)
+                    try:
+                        while True:
+                            chunk = source.read(cls.CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            spool.write(chunk)
+                    except:
+                        spool.close()
+                        raise
+                    finally:
+                        source.close()
+                    blob.size = spool.tell()
+                    spooled.append(spool)
+            return _SpoolReader(spooled[0], mutex)
+
+        def release():
+            with mutex:
+                if spooled:
+                    spooled.pop().close()
+                elif not callable(stream):
+                    stream.close()
+
+        blob = cls(opener, size)
+        blob.release = release
+        return blob
+
+    @classmethod
+    def wrap(cls, value):
+        """
+        Get a blob of the value of a :class:`BlobField`, which may be a
+        :class:`str` or a :class:`Blob`.
+
+        :rtype: :class:`Blob`
+        """
+        if isinstance(value, Blob):
+            return value
+        return cls.from_data(value)
+
+    def open(self):
+        """
+        Open the data from the beginning.
+
+        :returns: a file-like object, which has to be closed
+        """
+        return self.opener()
+
+    def read(self):
+        """
+        Read the whole data in memory. Large data should rather be read with
+        :func:`iter_chunks`.
+
+        :rtype: str
+        """
+        fp = self.open()
+        try:
+            return fp.read()
+        finally:
+            fp.close()
+
+    def iter_chunks(self, size=None):
+        """
+        Iterate on the data by chunks, from the beginning.
+
+        :param size: size of chunks (default is :attr:`CHUNK_SIZE`)
+        :type size: int
+        :rtype: iter[str]
+        """
+        fp = self.open()
+        try:
+            for chunk in self._read_chunks(fp, size):
+                yield chunk
+        finally:
+            fp.close()
+
+    def _read_chunks(self, fp, size=None):
+        size = size or self.CHUNK_SIZE
+        while True:
+            chunk = fp.read(size)
+            if not chunk:
+                break
+            yield chunk
+
+    def save_to(self, path):
+        """
+        Write the data in a file.
+
+        :param path: path of the file, or a file-like object
+        :returns: number of written bytes
+        :rtype: int
+        """
+        # The data is opened before the file, so the file is not created if
+        # the data can not be read.
+        fp = self.open()
+        try:
+            if isinstance(path, basestring):
+                with open(path, 'wb') as f:
+                    return self._write_chunks(fp, f)
+            return self._write_chunks(fp, path)
+        finally:
+            fp.close()
+
+    def _write_chunks(self, fp, f):
+        written = 0
+        for chunk in self._read_chunks(fp):
+            f.write(chunk)
+            written += len(chunk)
+        return written
+
+    def close(self):
+        """
+        Release the resources kept by the blob, like the copy of a stream.
+        """
+        if self.release is not None:
+            self.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, v, tb):
+        self.close()
+
+    def __deepcopy__(self, memo):
+        # The data is not modified, it can be shared by copies of objects.
+        return self
+
+    def __unicode__(self):
+        if self.size is None:
+            return u'<binary data>'
+        return u'<binary data, %d bytes>' % self.size
+
+    def __str__(self):
+        return unicode(self).encode('utf-8')
+
+    def __repr__(self):
+        return '<Blob size=%r>' % self.size
+
+
+class BlobField(Field):
+    """
+    A field which accepts :class:`Blob` objects, to read large data by
+    chunks, and :class:`str` strings.
+
+    Use :func:`Blob.wrap` to read its value in both cases.
+    """
+    def __init__(self, doc, **kwargs):
+        Field.__init__(self, doc, Blob, str, **kwargs)
+
+    def convert(self, value):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        return value
+
+
 class DateField(Field):
     """
     A field which accepts only :class:`datetime.date` and :class:`datetime.datetime` types.
@@ -245,6 +495,17 @@ class DeltaField(Field):
         Field.__init__(self, doc, datetime.timedelta, **kwargs)
 
 
+# Default values of these types can be shared by every instances.
+_IMMUTABLE_TYPES = (type(None), type, bool, int, long, float, basestring, Decimal,
+                    datetime.date, datetime.time, datetime.timedelta, tuple, frozenset)
+
+
+class _Deleted(object):
+    """
+    Marks a field which has been deleted from an object.
+    """
+
+
 class _CapBaseObjectMeta(type):
     def __new__(cls, name, bases, attrs):
         fields = [(field_name, attrs.pop(field_name)) for field_name, obj in attrs.items() if isinstance(obj, Field)]
@@ -254,9 +515,16 @@ class _CapBaseObjectMeta(type):
         if new_class._fields is None:
             new_class._fields = OrderedDict()
         else:
-            new_class._fields = deepcopy(new_class._fields)
+            # Fields are not modified by instances, they can be shared.
+            new_class._fields = copy(new_class._fields)
         new_class._fields.update(fields)
 
+        # Instances store values of fields in a list, in the order of _fields.
+        new_class._fields_index = dict((field_name, i) for i, field_name in enumerate(new_class._fields))
+        new_class._fields_defaults = [field.value for field in new_class._fields.itervalues()]
+        new_class._fields_mutable = [i for i, value in enumerate(new_class._fields_defaults)
+                                     if not isinstance(value, _IMMUTABLE_TYPES)]
+
         if new_class.__doc__ is None:
             new_class.__doc__ = ''
         for name, field in fields:
@@ -298,9 +566,16 @@ class CapBaseObject(object):
     _fields = None
 
     def __init__(self, id, backend=None):
+        self._init_values()
         self.id = to_unicode(id)
         self.backend = backend
-        self._fields = deepcopy(self._fields)
+
+    def _init_values(self):
+        values = list(self._fields_defaults)
+        for i in self._fields_mutable:
+            values[i] = deepcopy(values[i])
+        object.__setattr__(self, '_values', values)
+        return values
 
     @property
     def fullid(self):
@@ -326,7 +601,7 @@ class CapBaseObject(object):
 
     def copy(self):
         obj = copy(self)
-        obj._fields = copy(self._fields)
+        object.__setattr__(obj, '_values', list(self._values))
         return obj
 
     def set_empty_fields(self, value, excepts=()):
@@ -351,8 +626,9 @@ class CapBaseObject(object):
 
         if hasattr(self, 'id') and self.id is not None:
             yield 'id', self.id
-        for name, field in self._fields.iteritems():
-            yield name, field.value
+        for name, value in zip(self._fields, self._values):
+            if value is not _Deleted:
+                yield name, value
 
     def __eq__(self, obj):
         if isinstance(obj, CapBaseObject):
@@ -361,21 +637,27 @@ class CapBaseObject(object):
             return False
 
     def __getattr__(self, name):
-        if self._fields is not None and name in self._fields:
-            return self._fields[name].value
-        else:
-            raise AttributeError("'%s' object has no attribute '%s'" % (
-                self.__class__.__name__, name))
+        if name == '_values':
+            # __init__ has not been called yet.
+            return self._init_values()
+
+        index = self._fields_index.get(name)
+        if index is not None:
+            value = self._values[index]
+            if value is not _Deleted:
+                return value
+        raise AttributeError("'%s' object has no attribute '%s'" % (
+            self.__class__.__name__, name))
 
     def __setattr__(self, name, value):
-        try:
-            attr = (self._fields or {})[name]
-        except KeyError:
-            if not name in dir(self) and not name.startswith('_'):
+        index = self._fields_index.get(name)
+        if index is None or self._values[index] is _Deleted:
+            if not name.startswith('_') and not hasattr(self.__class__, name) and not name in self.__dict__:
                 warnings.warn('Creating a non-field attribute %s. Please prefix it with _' % name,
                               AttributeCreationWarning, stacklevel=2)
             object.__setattr__(self, name, value)
         else:
+            attr = self._fields[name]
             if not empty(value):
                 try:
                     # Try to convert value to the wanted one.
@@ -396,13 +678,18 @@ class CapBaseObject(object):
                 raise ValueError(
                     'Value for "%s" needs to be of type %r, not %r' % (
                         name, attr.types, type(value)))
-            attr.value = value
+            self._values[index] = value
 
     def __delattr__(self, name):
-        try:
-            self._fields.pop(name)
-        except KeyError:
+        if name in self.__dict__:
+            object.__delattr__(self, name)
+            return
+
+        index = self._fields_index.get(name)
+        if index is None or self._values[index] is _Deleted:
             object.__delattr__(self, name)
+        else:
+            self._values[index] = _Deleted
 
     def to_dict(self):
         def iter_decorate(d):
@@ -20,7 +20,7 @@
 
 from weboob.tools.capabilities.thumbnail import Thumbnail
 from .base import IBaseCap, CapBaseObject, NotLoaded, Field, StringField, \
-                  BytesField, IntField, FloatField, DateField
+                  Blob, BlobField, IntField, FloatField, DateField, empty
 
 __all__ = ['BaseGallery', 'BaseImage', 'ICapGallery']
 
@@ -78,7 +78,7 @@ class BaseImage(CapBaseObject):
     thumbnail = Field('Thumbnail of the image', Thumbnail)
     url =       StringField('Direct URL to image')
     ext =       StringField('Extension of image')
-    data =      BytesField('Data of image')
+    data =      BlobField('Data of image')
     gallery =   Field('Reference to the Gallery object', BaseGallery)
 
     def __init__(self, _id, index=None, thumbnail=NotLoaded, url=NotLoaded,
@@ -136,3 +136,44 @@ class ICapGallery(IBaseCap):
         :rtype: :class:`Gallery`
         """
         raise NotImplementedError()
+
+    def iter_gallery_images(self, gallery):
+        """
+        Iter images of a gallery, in the order of pages.
+
+        :param gallery: gallery
+        :type gallery: :class:`BaseGallery`
+        :rtype: iter[:class:`BaseImage`]
+        """
+        raise NotImplementedError()
+
+    def open_image(self, image, offset=0):
+        """
+        Open the data of an image, to read it by chunks instead of loading it
+        in the ``data`` field.
+
+        The default implementation fills the ``data`` field. Backends can
+        overload it to stream the data from the website; it is then called
+        by several threads at once, without the lock of the backend.
+
+        :param image: image to open
+        :type image: :class:`BaseImage`
+        :param offset: position where to start reading, to resume a download
+        :type offset: int
+        :returns: a file-like object (or None if the image is not available),
+                  and the position where it starts, which may be 0 if the
+                  website does not support resuming
+        :rtype: tuple
+        """
+        self.fillobj(image, ('url', 'data'))
+        if empty(image.data):
+            return None, 0
+        data = Blob.wrap(image.data).open()
+        # Skip the data which has already been read.
+        position = 0
+        while position < offset:
+            skipped = len(data.read(min(offset - position, Blob.CHUNK_SIZE)))
+            if not skipped:
+                break
+            position += skipped
+        return data, position
@@ -76,8 +76,11 @@ class ICapSubtitle(IBaseCap):
         """
         Get the content of the subtitle file.
 
+        Large files can be given as a :class:`weboob.capabilities.base.Blob`,
+        to be read by chunks.
+
         :param _id: ID of subtitle
         :type _id: str
-        :rtype: str
+        :rtype: str or :class:`weboob.capabilities.base.Blob`
         """
         raise NotImplementedError()
@@ -62,6 +62,10 @@ class ICapTorrent(IBaseCap):
         """
         Search torrents and iterate on results.
 
+        Backends may use the condition and count of the call (see
+        :attr:`weboob.tools.backend.BaseBackend.condition`) to filter results
+        on the server side, or to stop fetching pages.
+
         :param pattern: pattern to search
         :type pattern: str
         :rtype: iter[:class:`Torrent`]
@@ -82,8 +86,11 @@ class ICapTorrent(IBaseCap):
         """
         Get the content of the .torrent file.
 
+        Large files can be given as a :class:`weboob.capabilities.base.Blob`,
+        to be read by chunks.
+
         :param _id: ID of torrent
         :type _id: str
-        :rtype: str
+        :rtype: str or :class:`weboob.capabilities.base.Blob`
         """
         raise NotImplementedError()
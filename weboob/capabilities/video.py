@@ -77,7 +77,9 @@ class ICapVideo(IBaseCap):
         :param sortby: sort by... (use SEARCH_* constants)
         :param nsfw: include non-suitable for work videos if True
         :type nsfw: bool
-        :param max_results: maximum number of results to return
+        :param max_results: maximum number of results to return. If it is
+                            None, backends may use the count of the call
+                            (:attr:`weboob.tools.backend.BaseBackend.count`)
         :type max_results: int
         :rtype: iter[:class:`BaseVideo`]
         """
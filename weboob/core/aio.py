@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2013 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+from __future__ import with_statement
+
+from threading import RLock
+from time import time
+
+try:
+    import asyncio
+except ImportError:
+    try:
+        import trollius as asyncio
+    except ImportError:
+        raise ImportError('Please install python-trollius')
+
+from weboob.core.bcall import BackendsCall, CallErrors, CallTimeout
+from weboob.core.scheduler import IScheduler
+from weboob.tools.log import getLogger
+
+
+__all__ = ['AsyncioScheduler', 'AsyncBackendsCall']
+
+
+class AsyncioScheduler(IScheduler):
+    """
+    Scheduler using an asyncio event loop.
+
+    Functions are blocking, so they are called in the default executor of the
+    loop.
+
+    :param loop: event loop to use; default is the one of the current thread
+    """
+    def __init__(self, loop=None):
+        self.logger = getLogger('scheduler')
+        self.loop = loop or asyncio.get_event_loop()
+        self.mutex = RLock()
+        self.count = 0
+        # Timer handles by event id (None while the event is not armed)
+        self.handles = {}
+        self.stopped = False
+
+    def schedule(self, interval, function, *args):
+        return self._schedule(interval, interval, function, args, False)
+
+    def repeat(self, interval, function, *args):
+        # The first call of a repeated function is immediate.
+        return self._schedule(0, interval, function, args, True)
+
+    def _schedule(self, delay, interval, function, args, repeat):
+        if self.stopped:
+            return
+
+        with self.mutex:
+            self.count += 1
+            ev = self.count
+            self.handles[ev] = None
+        # This method may be called from another thread than the loop one.
+        self.loop.call_soon_threadsafe(self._arm, ev, delay, interval, function, args, repeat)
+        return ev
+
+    def _arm(self, ev, delay, interval, function, args, repeat):
+        with self.mutex:
+            if ev not in self.handles:
+                return
+            self.logger.debug('function "%s" will be called in %s seconds' % (function.__name__, delay))
+            self.handles[ev] = self.loop.call_later(delay, self._call, ev, interval, function, args, repeat)
+
+    def _call(self, ev, interval, function, args, repeat):
+        with self.mutex:
+            if ev not in self.handles:
+                return
+            if not repeat:
+                self.handles.pop(ev)
+
+        future = self.loop.run_in_executor(None, function, *args)
+        future.add_done_callback(lambda f: self._done(f, ev, interval, function, args, repeat))
+
+    def _done(self, future, ev, interval, function, args, repeat):
+        if future.exception() is not None:
+            # do not stop repeating because of an exception
+            self.logger.error('function "%s" raised an error: %r' % (function.__name__, future.exception()))
+        if repeat:
+            self._arm(ev, interval, interval, function, args, repeat)
+
+    def cancel(self, ev):
+        with self.mutex:
+            try:
+                handle = self.handles.pop(ev)
+            except KeyError:
+                return False
+        if handle is not None:
+            self.loop.call_soon_threadsafe(handle.cancel)
+        return True
+
+    def run(self):
+        self.loop.run_forever()
+        return True
+
+    def want_stop(self):
+        self.stopped = True
+        with self.mutex:
+            for ev in self.handles.keys():
+                self.cancel(ev)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class AsyncBackendsCall(BackendsCall):
+    """
+    Backends call which gives its results to an asyncio event loop.
+
+    It has to be created in the thread of the loop. Backends are called in
+    the threads of the Weboob executor, as for :class:`BackendsCall`, and
+    results are pushed in the loop by these threads.
+
+    A consumer which stops before the end has to call :func:`close`, or
+    backends stay blocked once the buffer of results is full.
+
+    Example with trollius:
+
+    >>> call = weboob.do_async('iter_accounts')
+    >>> try:
+    ...     while True:
+    ...         response = yield From(call.next())
+    ...         if response is None:
+    ...             break
+    ...         backend, account = response
+    ... finally:
+    ...     call.close()
+    """
+    def __init__(self, backends, condition, function, *args, **kwargs):
+        # Set before calling backends, which may store results immediately.
+        self.loop = asyncio.get_event_loop()
+        self.waiter = None
+        self.deadline_handle = None
+        BackendsCall.__init__(self, backends, condition, function, *args, **kwargs)
+
+    def _notify(self):
+        BackendsCall._notify(self)
+        if self.waiter is not None:
+            waiter, self.waiter = self.waiter, None
+            self.loop.call_soon_threadsafe(self._wake, waiter)
+
+    def _wake(self, future):
+        with self.mutex:
+            if not future.done() and not self._fill(future):
+                self.waiter = future
+
+    def _fill(self, future):
+        if self.responses:
+            future.set_result(self.responses.popleft())
+            # Backends may be waiting for room in buffer.
+            self.mutex.notifyAll()
+        elif self.finish_event.isSet():
+            if self.errors:
+                future.set_exception(CallErrors(self.errors))
+            else:
+                future.set_result(None)
+        else:
+            return False
+        return True
+
+    def next(self):
+        """
+        Get the next result.
+
+        The future gets a (backend, result) tuple, or None when every backends
+        are finished. If there were errors, its exception is
+        :class:`weboob.core.bcall.CallErrors`.
+
+        :rtype: :class:`asyncio.Future`
+        """
+        future = asyncio.Future(loop=self.loop)
+        with self.mutex:
+            if not self._fill(future):
+                self.waiter = future
+        return future
+
+    def close(self):
+        """
+        Stop the call when results are not wanted anymore: waiting results
+        are dropped and unfinished backends are aborted. It has no effect on
+        a finished call, and has to be called in the thread of the loop.
+        """
+        self.discard()
+        self.cancel()
+        if self.deadline_handle is not None:
+            self.deadline_handle.cancel()
+            self.deadline_handle = None
+        with self.mutex:
+            waiter, self.waiter = self.waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.cancel()
+
+    def set_deadline(self, deadline):
+        BackendsCall.set_deadline(self, deadline)
+        self.loop.call_soon_threadsafe(self._arm_deadline)
+
+    def _arm_deadline(self):
+        if self.deadline_handle is not None:
+            self.deadline_handle.cancel()
+            self.deadline_handle = None
+        if self.deadline is not None:
+            self.deadline_handle = self.loop.call_later(max(0, self.deadline - time()), self._deadline_reached)
+
+    def _deadline_reached(self):
+        self.deadline_handle = None
+        self.cancel(CallTimeout('Timeout exceeded'))
@@ -20,15 +20,17 @@
 
 from __future__ import with_statement
 
+from collections import deque
 from copy import copy
-from threading import Thread, Event, RLock, Timer
+from threading import Thread, Condition, Event, RLock
+from time import time
 
 from weboob.capabilities.base import CapBaseObject
 from weboob.tools.misc import get_backtrace
 from weboob.tools.log import getLogger
 
 
-__all__ = ['BackendsCall', 'CallErrors', 'IResultsCondition', 'ResultsConditionError']
+__all__ = ['BackendsCall', 'CallErrors', 'CallTimeout', 'IResultsCondition', 'ResultsConditionError']
 
 
 class CallErrors(Exception):
@@ -44,67 +46,141 @@ class CallErrors(Exception):
         return self.errors.__iter__()
 
 
+class CallTimeout(Exception):
+    """
+    Stored in :class:`CallErrors` for backends which have not finished before
+    the deadline of the call.
+    """
+
+
 class IResultsCondition(object):
     def is_valid(self, obj):
         raise NotImplementedError()
 
+    def is_beyond(self, obj, field, reverse=True):
+        """
+        Check if objects with a value of *field* beyond the one of *obj*
+        (lower if *reverse* is True, greater otherwise) can not match the
+        condition. It lets backends stop iterating on sorted results.
+
+        :rtype: :class:`bool`
+        """
+        return False
+
 
 class ResultsConditionError(Exception):
     pass
 
 
 class BackendsCall(object):
+    # Maximum number of results waiting to be consumed. When the buffer is
+    # full, backends are paused until the consumer catches up.
+    BUFFER_SIZE = 500
+
     def __init__(self, backends, condition, function, *args, **kwargs):
         """
+        Jobs are submitted to the executor of the Weboob instance which
+        owns the backends (see :class:`weboob.core.executor.IExecutor`).
+
+        Results have to be consumed, by iterating on this object or with
+        :func:`callback_thread`, or ignored with :func:`wait`.
+
         @param backends  list of backends to call.
         @param condition  a IResultsCondition object. Can be None.
         @param function  backends' method name, or callable object.
         @param args, kwargs  arguments given to called functions.
+        @param count  maximum number of results wanted by caller (keyword
+                      only, not given to functions). Can be None.
+
+        The condition and count are given to backends as hints (see
+        :attr:`weboob.tools.backend.BaseBackend.condition`).
         """
         self.logger = getLogger('bcall')
-        # Store if a backend is finished
-        self.backends = {}
-        for backend in backends:
-            self.backends[backend.name] = False
+        # Backends which are not finished
+        self.running = dict((backend.name, backend) for backend in backends)
+        # Backends stopped by cancel()
+        self.cancelled = set()
+        # Time (as returned by time.time()) after which the call is cancelled
+        self.deadline = None
         # Condition
         self.condition = condition
-        # Global mutex on object
-        self.mutex = RLock()
+        # Maximum number of results wanted
+        self.count = kwargs.pop('count', None)
+        # Global mutex on object, notified when a result is stored, when a
+        # result is consumed and when the call is finished
+        self.mutex = Condition(RLock())
         # Event set when every backends have give their data
         self.finish_event = Event()
-        # Event set when there are new responses
-        self.response_event = Event()
         # Waiting responses
-        self.responses = []
+        self.responses = deque()
+        # Do not apply backpressure anymore (results are not consumed
+        # on the fly)
+        self.unbounded = False
+        # Results are not wanted anymore
+        self.discarded = False
         # Errors
         self.errors = []
-        # Threads
-        self.threads = []
 
-        # Create jobs for each backend
-        with self.mutex:
-            for backend in backends:
-                self.threads.append(Timer(0, self._caller, (backend, function, args, kwargs)).start())
-            if not backends:
-                self.finish_event.set()
+        # Create jobs for each backend. Do not lock the mutex here, as
+        # submit() may block until workers, which store their results, have
+        # taken some jobs.
+        for backend in backends:
+            backend.weboob.executor.submit(backend.name, self._caller, backend, function, args, kwargs)
+        if not backends:
+            self.finish_event.set()
+
+    def _notify(self):
+        """
+        Called with the mutex locked when a result is stored, or when the call
+        is finished.
+        """
+        self.mutex.notifyAll()
 
     def _store_error(self, backend, error):
+        backtrace = get_backtrace(error)
         with self.mutex:
-            backtrace = get_backtrace(error)
+            if backend.name in self.cancelled:
+                # Error is probably caused by the abort, and the backend
+                # has already been reported.
+                return
             self.errors.append((backend, error, backtrace))
 
     def _store_result(self, backend, result):
+        """
+        Store a result, and wait while the buffer is full.
+
+        :returns: False if results are not wanted anymore
+        """
+        if isinstance(result, CapBaseObject):
+            if self.condition and not self.condition.is_valid(result):
+                return True
+            result.backend = backend.name
+
+        executor = backend.weboob.executor
         with self.mutex:
-            if isinstance(result, CapBaseObject):
-                if self.condition and not self.condition.is_valid(result):
-                    return
-                result.backend = backend.name
+            while len(self.responses) >= self.BUFFER_SIZE and not self.unbounded and not self.discarded:
+                # If other jobs are waiting for this worker to finish, the
+                # consumer might be waiting for them: do not stall.
+                if executor.is_congested(backend.name):
+                    self.logger.debug('%s: executor is congested, results buffer is not bounded anymore' % backend)
+                    self.unbounded = True
+                    break
+                self.mutex.wait(0.5)
+
+            if self.discarded or backend.name in self.cancelled:
+                return False
+
             self.responses.append((backend, result))
-            self.response_event.set()
+            self._notify()
+            return True
 
     def _caller(self, backend, function, args, kwargs):
         with backend:
+            hints = backend.set_call_hints(self.condition, self.count)
             try:
+                if backend.name in self.cancelled:
+                    return
+
                 # Call method on backend
                 try:
                     self.logger.debug('%s: Calling function %s' % (backend, function))
@@ -122,37 +198,103 @@ class BackendsCall(object):
                         # Loop on iterator
                         try:
                             for subresult in result:
-                                # Lock mutex only in loop in case the iterator is slow
-                                # (for example if backend do some parsing operations)
-                                self._store_result(backend, subresult)
+                                if not self._store_result(backend, subresult):
+                                    break
                         except Exception, error:
                             self._store_error(backend, error)
                     else:
                         self._store_result(backend, result)
             finally:
+                backend.set_call_hints(*hints)
                 with self.mutex:
                     # This backend is now finished
-                    self.backends[backend.name] = True
-                    for finished in self.backends.itervalues():
-                        if not finished:
-                            return
-                    self.response_event.set()
-                    self.finish_event.set()
+                    self.running.pop(backend.name, None)
+                    if not self.running:
+                        self.finish_event.set()
+                    if backend.name in self.cancelled:
+                        backend.clear_abort()
+                    self._notify()
+
+    def _wait(self, timeout=None):
+        """
+        Wait for an event on the mutex, and cancel the call if the deadline
+        is reached.
 
-    def _callback_thread_run(self, callback, errback):
-        responses = []
-        while not self.finish_event.isSet() or self.response_event.isSet():
-            self.response_event.wait()
-            with self.mutex:
-                responses = self.responses
-                self.responses = []
+        :returns: False if the call has just been cancelled
+        """
+        if self.deadline is None:
+            self.mutex.wait(timeout)
+            return True
+
+        remaining = self.deadline - time()
+        if remaining > 0:
+            self.mutex.wait(remaining if timeout is None else min(timeout, remaining))
+        if time() >= self.deadline and not self.finish_event.isSet():
+            self.cancel(CallTimeout('Timeout exceeded'))
+            return False
+        return True
+
+    def set_deadline(self, deadline):
+        """
+        Set the time after which unfinished backends are cancelled, and
+        reported in :class:`CallErrors` with a :class:`CallTimeout` error.
+
+        The deadline is checked while results are consumed, or in
+        :func:`wait`.
+
+        :param deadline: time as returned by :func:`time.time`, or None
+        :type deadline: :class:`float`
+        """
+        with self.mutex:
+            self.deadline = deadline
+            self.mutex.notifyAll()
+
+    def cancel(self, error=None):
+        """
+        Stop the call. Results already received are still given to the
+        consumer, but next ones are dropped. Unfinished backends are aborted
+        (see :func:`weboob.tools.backend.BaseBackend.abort`).
+
+        :param error: if set, this error is stored for each unfinished backend
+        :type error: :class:`Exception`
+        """
+        with self.mutex:
+            if self.finish_event.isSet():
+                return
 
-                # Reset event
-                self.response_event.clear()
+            for name, backend in self.running.iteritems():
+                self.logger.debug('%s: Call is cancelled' % backend)
+                self.cancelled.add(name)
+                if error is not None:
+                    self.errors.append((backend, error, None))
+                backend.abort()
 
-            # Consume responses
-            while responses:
-                callback(*responses.pop(0))
+            self.discarded = True
+            self.finish_event.set()
+            self._notify()
+
+    def _iter_responses(self):
+        """
+        Yield responses as they come, until every backends are finished.
+        """
+        try:
+            while True:
+                with self.mutex:
+                    while not self.responses and not self.finish_event.isSet():
+                        self._wait()
+                    if not self.responses:
+                        return
+                    response = self.responses.popleft()
+                    self.mutex.notifyAll()
+                yield response
+        finally:
+            # The consumer has stopped before the end, release the backends.
+            if not self.finish_event.isSet():
+                self.discard()
+
+    def _callback_thread_run(self, callback, errback):
+        for response in self._iter_responses():
+            callback(*response)
 
         if errback:
             with self.mutex:
@@ -178,28 +320,31 @@ class BackendsCall(object):
         thread.start()
         return thread
 
-    def wait(self):
-        self.finish_event.wait()
+    def discard(self):
+        """
+        Drop every waiting results, and stop backends at their next result.
+        """
+        with self.mutex:
+            self.discarded = True
+            self.responses.clear()
+            self.mutex.notifyAll()
 
+    def wait(self):
+        # Results are not consumed while waiting, so the buffer can't be
+        # bounded, but they are kept to be iterated later.
         with self.mutex:
+            self.unbounded = True
+            self.mutex.notifyAll()
+
+            while not self.finish_event.isSet():
+                self._wait()
+
             if self.errors:
                 raise CallErrors(self.errors)
 
     def __iter__(self):
-        # Don't know how to factorize with _callback_thread_run
-        responses = []
-        while not self.finish_event.isSet() or self.response_event.isSet():
-            self.response_event.wait()
-            with self.mutex:
-                responses = self.responses
-                self.responses = []
-
-                # Reset event
-                self.response_event.clear()
-
-            # Consume responses
-            while responses:
-                yield responses.pop(0)
+        for response in self._iter_responses():
+            yield response
 
         # Raise errors
         with self.mutex:
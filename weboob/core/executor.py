@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2013 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+from __future__ import with_statement
+
+import atexit
+from collections import deque
+from threading import Thread, Condition, RLock, local, currentThread
+from weakref import WeakSet
+
+from weboob.tools.log import getLogger
+from weboob.tools.misc import get_backtrace
+
+
+__all__ = ['IExecutor', 'ThreadPool', 'ExecutorShutdown']
+
+
+# Workers are daemon threads, so stop pools which are still alive before
+# the interpreter shutdown. Running jobs are not waited, as a hung backend
+# call would prevent the process from exiting.
+_pools = WeakSet()
+
+
+@atexit.register
+def _shutdown_pools():
+    for pool in list(_pools):
+        pool.shutdown(wait=False)
+
+
+class ExecutorShutdown(Exception):
+    """
+    Raised when a job is submitted to an executor which is stopped.
+    """
+
+
+class IExecutor(object):
+    def submit(self, key, function, *args, **kwargs):
+        """
+        Submit a job.
+
+        :param key: jobs sharing the same key are subject to the
+                    per-key concurrency limit (usually the backend name)
+        :type key: :class:`str`
+        :param function: callable to run
+        """
+        raise NotImplementedError()
+
+    def is_congested(self, key):
+        """
+        Check if jobs are waiting for a job with this key to finish, or for
+        any worker to be available.
+
+        :rtype: :class:`bool`
+        """
+        return False
+
+    def get_stats(self):
+        """
+        Get a snapshot of the executor metrics.
+
+        :rtype: :class:`dict`
+        """
+        raise NotImplementedError()
+
+    def shutdown(self, wait=True):
+        raise NotImplementedError()
+
+
+class ThreadPool(IExecutor):
+    """
+    Bounded pool of worker threads, shared by every call made with
+    :func:`weboob.core.ouiboube.Weboob.do`.
+
+    Workers are started on demand, and wait for jobs until the pool is
+    stopped.
+
+    :param max_workers: maximum number of worker threads
+    :type max_workers: int
+    :param max_queue: maximum number of jobs waiting for a worker; when the
+                      queue is full, :func:`submit` blocks. 0 means unbounded
+    :type max_queue: int
+    :param max_per_key: maximum number of jobs running at the same time with
+                        the same key. 0 means unbounded
+    :type max_per_key: int
+    """
+    def __init__(self, max_workers=10, max_queue=0, max_per_key=1):
+        self.logger = getLogger('executor')
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_per_key = max_per_key
+
+        self.mutex = RLock()
+        # Notified when a job is ready to be run by a worker
+        self.job_available = Condition(self.mutex)
+        # Notified when a job leaves the queue
+        self.queue_not_full = Condition(self.mutex)
+
+        # Jobs ready to run
+        self.ready = deque()
+        # Jobs waiting because their key has reached max_per_key
+        self.held = {}
+        # Number of ready or running jobs per key
+        self.scheduled = {}
+        self.workers = set()
+        self.idle = 0
+        self.stopped = False
+        self.local = local()
+
+        self.stats = {'submitted':   0,
+                      'completed':   0,
+                      'failed':      0,
+                      'queue_full':  0,
+                      'key_limited': 0,
+                      'overflow':    0,
+                      'peak_workers': 0,
+                      'peak_queued': 0,
+                     }
+        _pools.add(self)
+
+    def _queued(self):
+        return len(self.ready) + sum(len(jobs) for jobs in self.held.itervalues())
+
+    def _in_worker(self):
+        return getattr(self.local, 'pool', None) is self
+
+    def submit(self, key, function, *args, **kwargs):
+        job = (key, function, args, kwargs)
+        with self.mutex:
+            if self.stopped:
+                raise ExecutorShutdown('Executor is stopped')
+
+            # A worker must never wait for the queue, as it could be the one
+            # which is expected to empty it.
+            in_worker = self._in_worker()
+            if self.max_queue > 0 and not in_worker and self._queued() >= self.max_queue:
+                self.stats['queue_full'] += 1
+                while self._queued() >= self.max_queue and not self.stopped:
+                    self.queue_not_full.wait()
+                if self.stopped:
+                    raise ExecutorShutdown('Executor is stopped')
+
+            self.stats['submitted'] += 1
+            if self.max_per_key > 0 and self.scheduled.get(key, 0) >= self.max_per_key:
+                self.stats['key_limited'] += 1
+                self.held.setdefault(key, deque()).append(job)
+            else:
+                self.scheduled[key] = self.scheduled.get(key, 0) + 1
+                self.ready.append(job)
+                self._wakeup(in_worker)
+
+            self.stats['peak_queued'] = max(self.stats['peak_queued'], self._queued())
+
+    def _wakeup(self, in_worker=False):
+        if self.idle > 0:
+            self.job_available.notify()
+        elif len(self.workers) < self.max_workers:
+            self._start_worker()
+        elif in_worker:
+            # Every worker is busy, and this job is submitted by one of them,
+            # which may wait for its result: start a temporary worker to
+            # prevent a deadlock.
+            self.stats['overflow'] += 1
+            self._start_worker()
+
+    def _start_worker(self):
+        thread = Thread(target=self._worker_run, name='weboob-worker')
+        thread.daemon = True
+        self.workers.add(thread)
+        self.stats['peak_workers'] = max(self.stats['peak_workers'], len(self.workers))
+        thread.start()
+
+    def _next_job(self):
+        while not self.ready and not self.stopped:
+            if len(self.workers) > self.max_workers:
+                # Temporary worker
+                return None
+
+            # Do not give a timeout, as Condition.wait() would poll.
+            self.idle += 1
+            try:
+                self.job_available.wait()
+            finally:
+                self.idle -= 1
+
+        if self.stopped:
+            return None
+
+        self.queue_not_full.notify()
+        return self.ready.popleft()
+
+    def _job_done(self, key):
+        held = self.held.get(key)
+        if held:
+            # Keep the slot of this key for the next held job.
+            self.ready.append(held.popleft())
+            if not held:
+                self.held.pop(key)
+            self.queue_not_full.notify()
+        else:
+            self.scheduled[key] -= 1
+            if not self.scheduled[key]:
+                self.scheduled.pop(key)
+
+    def _worker_run(self):
+        self.local.pool = self
+        thread = currentThread()
+        try:
+            while True:
+                with self.mutex:
+                    job = self._next_job()
+                    if job is None:
+                        return
+
+                key, function, args, kwargs = job
+                try:
+                    function(*args, **kwargs)
+                except Exception, e:
+                    self.logger.error('Job %r (%s) raised an error: %s\n%s' % (function, key, e, get_backtrace(e)))
+                    failed = True
+                else:
+                    failed = False
+
+                with self.mutex:
+                    self.stats['failed' if failed else 'completed'] += 1
+                    self._job_done(key)
+        finally:
+            with self.mutex:
+                self.workers.discard(thread)
+
+    def is_congested(self, key):
+        with self.mutex:
+            if self.held.get(key):
+                return True
+            return bool(self.ready) and self.idle == 0 and len(self.workers) >= self.max_workers
+
+    def get_stats(self):
+        """
+        Get a snapshot of the pool saturation metrics.
+
+        Keys are:
+
+        - *workers*, *idle*, *active*: number of threads;
+        - *queued*: number of jobs waiting (ready or held by the per-key
+          limit);
+        - *saturation*: ratio of active workers on *max_workers*;
+        - cumulative counters *submitted*, *completed*, *failed*,
+          *queue_full* (submissions which had to wait), *key_limited* (jobs
+          held by the per-key limit), *overflow* (temporary workers started
+          above *max_workers*), *peak_workers* and *peak_queued*.
+
+        :rtype: :class:`dict`
+        """
+        with self.mutex:
+            stats = dict(self.stats)
+            stats['workers'] = len(self.workers)
+            stats['idle'] = self.idle
+            stats['active'] = len(self.workers) - self.idle
+            stats['queued'] = self._queued()
+            stats['max_workers'] = self.max_workers
+            stats['max_queue'] = self.max_queue
+            stats['max_per_key'] = self.max_per_key
+            stats['saturation'] = float(stats['active']) / self.max_workers if self.max_workers else 0.0
+            return stats
+
+    def shutdown(self, wait=True):
+        """
+        Stop the pool. Waiting jobs are dropped.
+
+        :param wait: if True, wait for running jobs to finish
+        :type wait: bool
+        """
+        with self.mutex:
+            self.stopped = True
+            self.ready.clear()
+            self.held.clear()
+            self.job_available.notifyAll()
+            self.queue_not_full.notifyAll()
+            workers = list(self.workers)
+
+        if wait and not self._in_worker():
+            for thread in workers:
+                thread.join()
@@ -22,10 +22,12 @@ from __future__ import with_statement
 
 import os
 import shutil
+import time
 
 from weboob.core.bcall import BackendsCall
 from weboob.core.modules import ModulesLoader, ModuleLoadError
 from weboob.core.backendscfg import BackendsConfig
+from weboob.core.executor import ThreadPool
 from weboob.core.repositories import Repositories, IProgress
 from weboob.core.scheduler import Scheduler
 from weboob.tools.backend import BaseBackend
@@ -52,11 +54,14 @@ class Weboob(object):
     :type scheduler: :class:`weboob.core.scheduler.IScheduler`
     :param storage: provide a storage where backends can save data
     :type storage: :class:`weboob.tools.storage.IStorage`
+    :param executor: pool used to run backends calls; default is a
+                     :class:`weboob.core.executor.ThreadPool`
+    :type executor: :class:`weboob.core.executor.IExecutor`
     """
     VERSION = '0.f'
     BACKENDS_FILENAME = 'backends'
 
-    def __init__(self, workdir=None, backends_filename=None, scheduler=None, storage=None):
+    def __init__(self, workdir=None, backends_filename=None, scheduler=None, storage=None, executor=None):
         self.logger = getLogger('weboob')
         self.backend_instances = {}
         self.callbacks = {'login':   lambda backend_name, value: None,
@@ -68,6 +73,11 @@ class Weboob(object):
             scheduler = Scheduler()
         self.scheduler = scheduler
 
+        # Executor shared by every backends calls
+        if executor is None:
+            executor = ThreadPool()
+        self.executor = executor
+
         # Create WORKDIR
         if workdir is not None:
             datadir = workdir
@@ -95,6 +105,7 @@ class Weboob(object):
 
         self.workdir = os.path.realpath(workdir)
         self._create_dir(workdir)
+        self.datadir = os.path.realpath(datadir)
 
         # Repositories management
         self.repositories = Repositories(workdir, datadir, self.VERSION)
@@ -126,6 +137,9 @@ class Weboob(object):
         properly unload all correctly.
         """
         self.unload_backends()
+        self.executor.shutdown(wait=False)
+        if self.storage is not None:
+            self.storage.flush()
 
     def update(self, progress=IProgress()):
         """
@@ -257,6 +271,8 @@ class Weboob(object):
             backend = self.backend_instances.pop(name)
             with backend:
                 backend.deinit()
+                if backend._fill_pool is not None:
+                    backend._fill_pool.shutdown(wait=False)
             unloaded[backend.name] = backend
 
         return unloaded
@@ -302,8 +318,8 @@ class Weboob(object):
 
     def do(self, function, *args, **kwargs):
         """
-        Do calls on loaded backends with specified arguments, in separated
-        threads.
+        Do calls on loaded backends with specified arguments, in the
+        threads of :attr:`executor`.
 
         This function has two modes:
 
@@ -321,8 +337,35 @@ class Weboob(object):
         :type caps: list[:class:`weboob.capabilities.base.IBaseCap`]
         :param condition: a condition to validate results
         :type condition: :class:`weboob.core.bcall.IResultsCondition`
+        :param count: maximum number of results wanted; like *condition*, it is
+                      given as a hint to backends
+        :type count: :class:`int`
+        :param timeout: delay in seconds after which unfinished backends are
+                        cancelled and reported in errors
+        :type timeout: :class:`float`
+        :param deadline: same as *timeout*, but as a time returned by
+                         :func:`time.time`
+        :type deadline: :class:`float`
         :rtype: A :class:`weboob.core.bcall.BackendsCall` object (iterable)
         """
+        return self._do(BackendsCall, function, *args, **kwargs)
+
+    def do_async(self, function, *args, **kwargs):
+        """
+        Same as :func:`do`, but results are delivered in the asyncio event loop
+        of the current thread. It requires asyncio (or trollius).
+
+        The calls are made in the threads of :attr:`executor`, but no other
+        thread is used to give results to the loop. If the caller stops
+        reading results before the end, it has to call
+        :func:`weboob.core.aio.AsyncBackendsCall.close`.
+
+        :rtype: A :class:`weboob.core.aio.AsyncBackendsCall` object
+        """
+        from weboob.core.aio import AsyncBackendsCall
+        return self._do(AsyncBackendsCall, function, *args, **kwargs)
+
+    def _do(self, klass, function, *args, **kwargs):
         backends = self.backend_instances.values()
         _backends = kwargs.pop('backends', None)
         if _backends is not None:
@@ -351,12 +394,19 @@ class Weboob(object):
             caps = kwargs.pop('caps')
             backends = [backend for backend in backends if backend.has_caps(caps)]
         condition = kwargs.pop('condition', None)
+        deadline = kwargs.pop('deadline', None)
+        timeout = kwargs.pop('timeout', None)
+        if timeout is not None:
+            deadline = time.time() + timeout if deadline is None else min(deadline, time.time() + timeout)
 
         # The return value MUST BE the BackendsCall instance. Please never iterate
         # here on this object, because caller might want to use other methods, like
         # wait() on callback_thread().
         # Thanks a lot.
-        return BackendsCall(backends, condition, function, *args, **kwargs)
+        call = klass(backends, condition, function, *args, **kwargs)
+        if deadline is not None:
+            call.set_deadline(deadline)
+        return call
 
     def schedule(self, interval, function, *args):
         """
@@ -20,9 +20,16 @@
 
 from __future__ import with_statement
 
-from threading import Timer, Event, RLock, _Timer
+import errno
+import heapq
+import os
+import select
+from random import uniform
+from threading import Thread, Event, RLock
+from time import time
+
+from weboob.core.executor import ThreadPool
 from weboob.tools.log import getLogger
-from weboob.tools.misc import get_backtrace
 
 
 __all__ = ['Scheduler']
@@ -45,58 +52,181 @@ class IScheduler(object):
         raise NotImplementedError()
 
 
-class RepeatedTimer(_Timer):
-    def run(self):
-        while not self.finished.isSet():
-            try:
-                self.function(*self.args, **self.kwargs)
-            except Exception:
-                # do not stop timer because of an exception
-                print get_backtrace()
-            self.finished.wait(self.interval)
-        self.finished.set()
+class Waker(object):
+    """
+    Allow a thread to sleep until a timeout, or until another thread calls
+    :func:`wake`.
+
+    Contrary to :func:`threading.Event.wait` with a timeout, it does not
+    poll, and it can be interrupted by signals (for example with Ctrl-C).
+    """
+    def __init__(self):
+        if os.name == 'posix':
+            self.rfd, self.wfd = os.pipe()
+            self.event = None
+        else:
+            self.event = Event()
+
+    def wake(self):
+        if self.event is not None:
+            self.event.set()
+        elif self.wfd is not None:
+            os.write(self.wfd, 'x')
+
+    def sleep(self, timeout=None):
+        if self.event is not None:
+            self.event.wait(timeout)
+            self.event.clear()
+            return
+
+        try:
+            ready, _, _ = select.select([self.rfd], [], [], timeout)
+        except select.error, e:
+            if e.args[0] == errno.EINTR:
+                return
+            raise
+        if ready:
+            os.read(self.rfd, 4096)
+
+    def close(self):
+        if self.event is None and self.wfd is not None:
+            os.close(self.rfd)
+            os.close(self.wfd)
+            self.rfd = self.wfd = None
+
+
+class ScheduledEvent(object):
+    def __init__(self, id, interval, function, args, repeat):
+        self.id = id
+        self.interval = interval
+        self.function = function
+        self.args = args
+        self.repeat = repeat
+        # Time of the next call, with the random jitter
+        self.when = None
+        # Time of the next call, without the jitter
+        self.due = None
+        # A call is submitted or running
+        self.running = False
 
 
 class Scheduler(IScheduler):
-    def __init__(self):
+    """
+    Scheduler using a single dispatcher thread which sleeps until the next
+    deadline. Due calls are run in a pool of threads.
+
+    If a repeated call is still running when it is due again, this run is
+    skipped.
+
+    :param jitter: maximum random delay in seconds added to every call, to
+                   avoid calling many functions at the same time
+    :type jitter: float
+    :param misfire_grace: if a call is late of more than this delay in
+                          seconds (for example after a suspend), it is
+                          skipped. None to always call functions
+    :type misfire_grace: float
+    :param max_workers: number of threads to run calls
+    :type max_workers: int
+    """
+    def __init__(self, jitter=0, misfire_grace=None, max_workers=5):
         self.logger = getLogger('scheduler')
         self.mutex = RLock()
         self.stop_event = Event()
+        self.jitter = jitter
+        self.misfire_grace = misfire_grace
         self.count = 0
+        # Scheduled events by id
         self.queue = {}
+        # Heap of (time, id). Canceled events are removed from it lazily.
+        self.heap = []
+        self.pool = ThreadPool(max_workers=max_workers, max_per_key=1)
+        self.waker = Waker()
+        self.stop_waker = Waker()
+        self.dispatcher = None
 
     def schedule(self, interval, function, *args):
-        return self._schedule(Timer, interval, self._schedule_callback, function, *args)
+        return self._schedule(interval, function, args, False)
 
     def repeat(self, interval, function, *args):
-        return self._schedule(RepeatedTimer, interval, self._repeat_callback, function, *args)
+        # The first call of a repeated function is immediate.
+        return self._schedule(interval, function, args, True)
 
-    def _schedule(self, klass, interval, meta_func, function, *args):
+    def _schedule(self, interval, function, args, repeat):
         if self.stop_event.isSet():
             return
 
         with self.mutex:
             self.count += 1
-            self.logger.debug('function "%s" will be called in %s seconds' % (function.__name__, interval))
-            timer = klass(interval, meta_func, (self.count, interval, function, args))
-            self.queue[self.count] = timer
-            timer.start()
-            return self.count
+            ev = ScheduledEvent(self.count, interval, function, args, repeat)
+            self.queue[ev.id] = ev
+            self._push(ev, time() + (0 if repeat else interval))
+            self.logger.debug('function "%s" will be called in %s seconds' % (function.__name__, ev.when - time()))
 
-    def _schedule_callback(self, count, interval, function, args):
-        with self.mutex:
-            self.queue.pop(count)
-        return function(*args)
+            if self.dispatcher is None:
+                self.dispatcher = Thread(target=self._dispatcher_run, name='weboob-scheduler')
+                self.dispatcher.daemon = True
+                self.dispatcher.start()
+            return ev.id
 
-    def _repeat_callback(self, count, interval, function, args):
-        function(*args)
-        with self.mutex:
-            try:
-                e = self.queue[count]
-            except KeyError:
-                return
-            else:
-                self.logger.debug('function "%s" will be called in %s seconds' % (function.__name__, e.interval))
+    def _push(self, ev, due):
+        # The jitter is only added to the time in the heap, so it does not
+        # accumulate over the runs of a repeated call.
+        when = due
+        if self.jitter:
+            when += uniform(0, self.jitter)
+        ev.due = due
+        ev.when = when
+        if not self.heap or when < self.heap[0][0]:
+            # The dispatcher sleeps until a later time.
+            self.waker.wake()
+        heapq.heappush(self.heap, (when, ev.id))
+
+    def _dispatcher_run(self):
+        while not self.stop_event.isSet():
+            with self.mutex:
+                now = time()
+                while self.heap and self.heap[0][0] <= now:
+                    when, id = heapq.heappop(self.heap)
+                    ev = self.queue.get(id)
+                    if ev is None or ev.when != when:
+                        # Canceled event
+                        continue
+                    self._dispatch(ev, now)
+
+                timeout = self.heap[0][0] - now if self.heap else None
+
+            self.waker.sleep(timeout)
+
+    def _dispatch(self, ev, now):
+        late = now - ev.when
+        if ev.repeat:
+            # Do not try to catch up missed calls
+            due = ev.due + ev.interval
+            if due <= now:
+                due = now + ev.interval
+            self._push(ev, due)
+        else:
+            self.queue.pop(ev.id)
+
+        if self.misfire_grace is not None and late > self.misfire_grace:
+            self.logger.warning('function "%s" is late of %d seconds, skip this call' % (ev.function.__name__, late))
+            return
+        if ev.running:
+            self.logger.debug('function "%s" is still running, skip this call' % ev.function.__name__)
+            return
+
+        ev.running = True
+        self.pool.submit(ev.id, self._call, ev)
+
+    def _call(self, ev):
+        try:
+            ev.function(*ev.args)
+        finally:
+            ev.running = False
+            # The event may have been cancelled while it was running.
+            when = ev.when
+            if ev.repeat and when is not None:
+                self.logger.debug('function "%s" will be called in %s seconds' % (ev.function.__name__, when - time()))
 
     def cancel(self, ev):
         with self.mutex:
@@ -104,22 +234,23 @@ class Scheduler(IScheduler):
                 e = self.queue.pop(ev)
             except KeyError:
                 return False
-            e.cancel()
+            # The heap entry is ignored by the dispatcher.
+            e.when = None
             self.logger.debug('scheduled function "%s" is canceled' % e.function.__name__)
             return True
 
     def _wait_to_stop(self):
         self.want_stop()
-        with self.mutex:
-            for e in self.queue.itervalues():
-                e.cancel()
-                e.join()
-            self.queue = {}
+        if self.dispatcher is not None:
+            self.dispatcher.join()
+        self.pool.shutdown(wait=True)
+        self.waker.close()
+        self.stop_waker.close()
 
     def run(self):
         try:
-            while 1:
-                self.stop_event.wait(0.1)
+            while not self.stop_event.isSet():
+                self.stop_waker.sleep()
         except KeyboardInterrupt:
             self._wait_to_stop()
             raise
@@ -130,8 +261,64 @@ class Scheduler(IScheduler):
     def want_stop(self):
         self.stop_event.set()
         with self.mutex:
-            for t in self.queue.itervalues():
-                t.cancel()
-                # Contrary to _wait_to_stop(), don't call t.join
-                # because want_stop() have to be non-blocking.
             self.queue = {}
+            self.heap = []
+            # Contrary to _wait_to_stop(), running calls are not waited
+            # because want_stop() have to be non-blocking.
+            self.waker.wake()
+            self.stop_waker.wake()
+
+
+def test():
+    class FakePool(object):
+        def __init__(self):
+            self.calls = []
+
+        def submit(self, key, function, *args):
+            self.calls.append(key)
+
+        def shutdown(self, wait=True):
+            pass
+
+    def add(scheduler, id, repeat, due):
+        ev = ScheduledEvent(id, 10, test, (), repeat)
+        scheduler.queue[ev.id] = ev
+        scheduler._push(ev, due)
+        return ev
+
+    # Late calls are skipped, and repeated ones are scheduled again.
+    scheduler = Scheduler(misfire_grace=0.05)
+    scheduler.pool.shutdown()
+    scheduler.pool = FakePool()
+    now = time()
+    once = add(scheduler, 1, False, now - 100)
+    repeated = add(scheduler, 2, True, now - 100)
+    scheduler._dispatch(once, now)
+    scheduler._dispatch(repeated, now)
+    assert scheduler.pool.calls == []
+    assert 1 not in scheduler.queue
+    assert repeated.when == now + 10
+
+    # A repeated call on time is run, but not while it is still running.
+    scheduler._dispatch(repeated, repeated.when)
+    assert scheduler.pool.calls == [2]
+    assert repeated.when == now + 20
+    scheduler._dispatch(repeated, repeated.when)
+    assert scheduler.pool.calls == [2]
+    repeated.running = False
+    scheduler._dispatch(repeated, repeated.when)
+    assert scheduler.pool.calls == [2, 2]
+    scheduler._wait_to_stop()
+
+    # The jitter does not accumulate over the runs.
+    scheduler = Scheduler(jitter=1)
+    scheduler.pool.shutdown()
+    scheduler.pool = FakePool()
+    repeated = add(scheduler, 1, True, now)
+    for i in xrange(1, 100):
+        scheduler._dispatch(repeated, repeated.when)
+        repeated.running = False
+        assert repeated.due == now + i * 10
+        assert repeated.due <= repeated.when <= repeated.due + 1
+    assert len(scheduler.pool.calls) == 99
+    scheduler._wait_to_stop()
@@ -26,7 +26,7 @@ import sys
 import tempfile
 import warnings
 
-from weboob.capabilities.base import ConversionWarning
+from weboob.capabilities.base import ConversionWarning, CapBaseObject
 from weboob.core import Weboob, CallErrors
 from weboob.core.backendscfg import BackendsConfig
 from weboob.tools.config.iconfig import ConfigError
@@ -170,8 +170,8 @@ class BaseApplication(object):
         @return  a IStorage object
         """
         if klass is None:
-            from weboob.tools.storage import StandardStorage
-            klass = StandardStorage
+            from weboob.tools.storage import BatchedStorage
+            klass = BatchedStorage
 
         if path is None:
             path = os.path.join(self.CONFDIR, self.APPNAME + '.storage')
@@ -240,10 +240,18 @@ class BaseApplication(object):
         return obj
 
     def _do_complete_iter(self, backend, count, fields, res):
-        for i, sub in enumerate(res):
+        # Only count results which will be kept by the condition.
+        condition = backend.condition
+        if fields is None or len(fields) > 0:
+            # Objects are filled while the backend gives next ones. Without
+            # condition, objects after the count are not needed.
+            res = backend.iter_fillobjs(res, fields, count if condition is None else None)
+        i = 0
+        for sub in res:
             if count and i == count:
                 break
-            sub = self._do_complete_obj(backend, fields, sub)
+            if condition is None or not isinstance(sub, CapBaseObject) or condition.is_valid(sub):
+                i += 1
             yield sub
 
     def _do_complete(self, backend, count, selected_fields, function, *args, **kwargs):
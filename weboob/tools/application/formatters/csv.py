@@ -18,10 +18,18 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
+from __future__ import absolute_import
+
+import csv
+from cStringIO import StringIO
+
+from weboob.tools.json import json
+
 from .iformatter import IFormatter
+from .stream import StreamFormatter
 
 
-__all__ = ['CSVFormatter']
+__all__ = ['CSVFormatter', 'CSVStreamFormatter']
 
 
 class CSVFormatter(IFormatter):
@@ -41,3 +49,39 @@ class CSVFormatter(IFormatter):
 
         result += self.field_separator.join(unicode(v) for v in item.itervalues())
         return result
+
+
+class CSVStreamFormatter(StreamFormatter):
+    """
+    Write objects as CSV rows, quoted when needed.
+
+    The header row is written before the first object of each class, with
+    the names of the selected fields in the order of the class. Empty values
+    are written as empty cells, decimals and dates without formatting.
+    """
+    def __init__(self, field_separator=';', **kwargs):
+        StreamFormatter.__init__(self, **kwargs)
+        self.field_separator = field_separator
+        self.buf = StringIO()
+        self.writer = csv.writer(self.buf, delimiter=field_separator, lineterminator='')
+
+    def format_schema(self, klass, schema):
+        return self.format_record([name for name, type_name in schema])
+
+    def format_record(self, record):
+        row = []
+        for value in record:
+            if value is None:
+                value = ''
+            elif isinstance(value, unicode):
+                value = value.encode('utf-8')
+            elif isinstance(value, (list, dict)):
+                value = json.dumps(value, ensure_ascii=False)
+                if isinstance(value, unicode):
+                    value = value.encode('utf-8')
+            row.append(value)
+
+        self.buf.seek(0)
+        self.buf.truncate()
+        self.writer.writerow(row)
+        return self.buf.getvalue()
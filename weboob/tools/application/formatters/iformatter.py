@@ -23,6 +23,7 @@ from __future__ import with_statement
 import os
 import sys
 import subprocess
+import time
 if sys.platform == 'win32':
     import WConio
 
@@ -50,7 +51,7 @@ else:
         finally:
             termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
 
-from weboob.capabilities.base import CapBaseObject
+from weboob.capabilities.base import CapBaseObject, _Deleted
 from weboob.tools.application.console import ConsoleApplication
 from weboob.tools.ordereddict import OrderedDict
 
@@ -63,9 +64,97 @@ class MandatoryFieldsNotFound(Exception):
         Exception.__init__(self, u'Mandatory fields not found: %s.' % ', '.join(missing_fields))
 
 
+class Projection(object):
+    """
+    Selection of fields on a class of objects, computed once and shared by
+    every objects of this class.
+
+    :param klass: class of objects
+    :type klass: :class:`CapBaseObject`
+    :param selected_fields: names of the fields to keep
+    :type selected_fields: iter[str]
+    """
+    def __init__(self, klass, selected_fields):
+        selected_fields = frozenset(selected_fields)
+        self.selected = selected_fields
+        self.with_id = 'id' in selected_fields
+        # (name, index in values) of selected fields, in the class order
+        self.fields = [(name, klass._fields_index[name]) for name in klass._fields
+                       if name in selected_fields]
+        # Fields which are hidden by the projection
+        self.hidden = frozenset(name for name in klass._fields if not name in selected_fields)
+        if not self.with_id:
+            self.hidden |= frozenset(['id'])
+        # A class which overloads iter_fields() does not necessarily iterate
+        # on its values.
+        self.generic = klass.iter_fields.im_func is not CapBaseObject.iter_fields.im_func
+
+
+class ObjectView(object):
+    """
+    Read-only view on the selected fields of an object.
+
+    It is given to :func:`IFormatter.format_obj` instead of a copy of the
+    object: fields which are not selected behave as if they had been deleted,
+    other attributes are read on the object.
+    """
+    __slots__ = ('_obj', '_projection')
+
+    def __init__(self, obj, projection):
+        self._obj = obj
+        self._projection = projection
+
+    def __getattr__(self, name):
+        if name in self._projection.hidden:
+            # Same as a deleted attribute, which falls back on the class one.
+            return getattr(self._obj.__class__, name)
+        return getattr(self._obj, name)
+
+    @property
+    def fullid(self):
+        return '%s@%s' % (self.id, self.backend)
+
+    def iter_fields(self):
+        obj = self._obj
+        projection = self._projection
+        if projection.generic:
+            for name, value in obj.iter_fields():
+                if name in projection.selected:
+                    yield name, value
+            return
+
+        if projection.with_id and obj.id is not None:
+            yield 'id', obj.id
+        values = obj._values
+        for name, index in projection.fields:
+            value = values[index]
+            if value is not _Deleted:
+                yield name, value
+
+    def to_dict(self):
+        obj = self._obj
+        result = OrderedDict()
+        for name, value in self.iter_fields():
+            if name == 'id' and obj.backend is not None:
+                value = self.fullid
+            result[name] = value
+        return result
+
+    def __repr__(self):
+        return '<ObjectView of %r>' % self._obj
+
+
 class IFormatter(object):
     MANDATORY_FIELDS = None
 
+    # Formatted objects are written to an output file when the buffer
+    # reaches BUFFER_SIZE bytes, when the first buffered line is older than
+    # FLUSH_INTERVAL seconds, or when flush_output() is called. On stdout,
+    # they are written immediately (stdout has its own buffer when it is not
+    # a terminal), so they stay in order with what applications print.
+    BUFFER_SIZE = 64*1024
+    FLUSH_INTERVAL = 1
+
     def get_bold(self):
         if self.outfile != sys.stdout:
             return ''
@@ -88,9 +177,18 @@ class IFormatter(object):
         self.print_lines = 0
         self.termrows = 0
         self.outfile = outfile
+        # Output buffer
+        self.buffer = []
+        self.buffer_size = 0
+        self.buffer_time = None
+        self.stream = None
+        self.stream_owned = False
+        self.tty = os.isatty(sys.stdout.fileno())
+        # Projections by class and selected fields
+        self.projections = {}
         # XXX if stdin is not a tty, it seems that the command fails.
 
-        if os.isatty(sys.stdout.fileno()) and os.isatty(sys.stdin.fileno()):
+        if self.tty and os.isatty(sys.stdin.fileno()):
             if sys.platform == 'win32':
                 self.termrows = WConio.gettextinfo()[8]
             else:
@@ -99,23 +197,69 @@ class IFormatter(object):
                 )
 
     def output(self, formatted):
-        if self.outfile != sys.stdout:
-            with open(self.outfile, "a+") as outfile:
-                outfile.write(formatted.encode('utf-8'))
+        if isinstance(formatted, unicode):
+            formatted = formatted.encode('utf-8')
 
-        else:
+        if self.outfile == sys.stdout and self.termrows:
+            # Paginate output
             for line in formatted.split('\n'):
-                if self.termrows and (self.print_lines + 1) >= self.termrows:
+                if (self.print_lines + 1) >= self.termrows:
+                    self.flush_output()
                     self.outfile.write(PROMPT)
                     self.outfile.flush()
                     readch()
                     self.outfile.write('\b \b' * len(PROMPT))
                     self.print_lines = 0
 
-                if isinstance(line, unicode):
-                    line = line.encode('utf-8')
-                print line
+                self._write(line)
                 self.print_lines += 1
+        else:
+            self._write(formatted)
+
+        if self.outfile == sys.stdout or \
+           self.buffer_size >= self.BUFFER_SIZE or \
+           time.time() - self.buffer_time >= self.FLUSH_INTERVAL:
+            self.flush_output()
+
+    def _write(self, line):
+        if not self.buffer:
+            self.buffer_time = time.time()
+        self.buffer.append(line)
+        self.buffer.append('\n')
+        self.buffer_size += len(line) + 1
+
+    def flush_output(self):
+        """
+        Write the buffered output.
+        """
+        if not self.buffer:
+            return
+
+        if self.stream is None:
+            if self.outfile == sys.stdout or hasattr(self.outfile, 'write'):
+                self.stream = self.outfile
+            else:
+                self.stream = open(self.outfile, 'a')
+                self.stream_owned = True
+
+        data = ''.join(self.buffer)
+        self.buffer = []
+        self.buffer_size = 0
+        self.stream.write(data)
+        if self.stream is not sys.stdout:
+            self.stream.flush()
+
+    def close_output(self):
+        """
+        Write the buffered output, and close the output file.
+        """
+        self.flush_output()
+        if self.outfile == sys.stdout:
+            sys.stdout.flush()
+        if self.stream_owned:
+            self.stream.close()
+        self.stream = None
+        self.stream_owned = False
 
     def start_format(self, **kwargs):
         pass
@@ -137,10 +281,7 @@ class IFormatter(object):
         """
         if isinstance(obj, CapBaseObject):
             if selected_fields is not None and not '*' in selected_fields:
-                obj = obj.copy()
-                for name, value in obj.iter_fields():
-                    if not name in selected_fields:
-                        delattr(obj, name)
+                obj = ObjectView(obj, self.get_projection(obj.__class__, selected_fields))
 
             if self.MANDATORY_FIELDS:
                 missing_fields = set(self.MANDATORY_FIELDS) - set([name for name, value in obj.iter_fields()])
@@ -171,12 +312,28 @@ class IFormatter(object):
             self.output(formatted)
         return formatted
 
+    def get_projection(self, klass, selected_fields):
+        """
+        Get the projection of selected fields on a class of objects.
+
+        :rtype: :class:`Projection`
+        """
+        key = (klass, tuple(selected_fields))
+        try:
+            return self.projections[key]
+        except KeyError:
+            projection = self.projections[key] = Projection(klass, selected_fields)
+            return projection
+
     def format_obj(self, obj, alias=None):
         """
         Format an object to be human-readable.
         Called by format().
         This method has to be overridden in child classes.
 
+        When fields are selected, *obj* is an :class:`ObjectView` on the
+        object, which only gives the selected fields.
+
         :param obj: object to format
         :type obj: CapBaseObject
         :rtype: str
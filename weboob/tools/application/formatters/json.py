@@ -19,10 +19,12 @@
 
 
 from weboob.tools.json import json
+from weboob.tools.ordereddict import OrderedDict
 
 from .iformatter import IFormatter
+from .stream import StreamFormatter
 
-__all__ = ['JsonFormatter']
+__all__ = ['JsonFormatter', 'JsonLinesFormatter']
 
 
 class Encoder(json.JSONEncoder):
@@ -43,3 +45,26 @@ class Encoder(json.JSONEncoder):
 class JsonFormatter(IFormatter):
     def format_dict(self, item):
         return json.dumps(item, cls=Encoder)
+
+
+class JsonLinesFormatter(StreamFormatter):
+    """
+    Write one JSON document per line.
+
+    The first line is the schema of the following objects::
+
+        {"schema": {"class": "Account", "fields": [{"name": "id", "type": "string"}, ...]}}
+
+    and each object is written as an array of the values of its selected
+    fields, in the order of the schema.
+    """
+    def __init__(self, **kwargs):
+        StreamFormatter.__init__(self, **kwargs)
+        self.encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+    def format_schema(self, klass, schema):
+        fields = [OrderedDict((('name', name), ('type', type_name))) for name, type_name in schema]
+        return self.encoder.encode({'schema': OrderedDict((('class', klass.__name__), ('fields', fields)))})
+
+    def format_record(self, record):
+        return self.encoder.encode(record)
@@ -26,7 +26,7 @@ class FormatterLoadError(Exception):
 
 
 class FormattersLoader(object):
-    BUILTINS = ['htmltable', 'multiline', 'simple', 'table', 'csv', 'webkit', 'json']
+    BUILTINS = ['htmltable', 'multiline', 'simple', 'table', 'csv', 'csvstream', 'webkit', 'json', 'jsonl']
 
     def __init__(self):
         self.formatters = {}
@@ -72,6 +72,12 @@ class FormattersLoader(object):
         elif name == 'csv':
             from .csv import CSVFormatter
             return CSVFormatter
+        elif name == 'csvstream':
+            from .csv import CSVStreamFormatter
+            return CSVStreamFormatter
         elif name == 'json':
             from .json import JsonFormatter
             return JsonFormatter
+        elif name == 'jsonl':
+            from .json import JsonLinesFormatter
+            return JsonLinesFormatter
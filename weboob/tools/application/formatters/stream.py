@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2013 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from weboob.capabilities.base import Blob, CapBaseObject, NotLoaded, NotAvailable, _Deleted
+
+from .iformatter import IFormatter, MandatoryFieldsNotFound, ObjectView
+
+
+__all__ = ['StreamFormatter', 'encode_value', 'get_type_name']
+
+
+# Names of types in schemas, checked in this order.
+TYPE_NAMES = ((bool, 'boolean'),
+              ((int, long), 'integer'),
+              (float, 'float'),
+              (Decimal, 'decimal'),
+              (basestring, 'string'),
+              (datetime, 'datetime'),
+              (date, 'date'),
+              (time, 'time'),
+              (timedelta, 'timedelta'),
+              ((list, tuple), 'list'),
+              (dict, 'dict'),
+              (Blob, 'blob'),
+              (CapBaseObject, 'object'),
+             )
+
+
+def get_type_name(types):
+    """
+    Get the name of the type of a field.
+
+    :param types: accepted types of the field
+    :type types: tuple
+    :rtype: str
+    """
+    for t in types:
+        for klass, name in TYPE_NAMES:
+            if isinstance(t, type) and issubclass(t, klass):
+                return name
+    return 'string'
+
+
+def _encode_object(obj):
+    return dict((name, encode_value(value)) for name, value in obj.iter_fields())
+
+
+def _encode_list(value):
+    return [encode_value(v) for v in value]
+
+
+def _encode_dict(value):
+    return dict((unicode(k), encode_value(v)) for k, v in value.iteritems())
+
+
+def _identity(value):
+    return value
+
+
+def _empty(value):
+    return None
+
+
+# Encoders by exact type, to avoid isinstance() checks on common values.
+ENCODERS = {unicode:      _identity,
+            str:          _identity,
+            int:          _identity,
+            long:         _identity,
+            float:        _identity,
+            bool:         _identity,
+            type(None):   _empty,
+            Decimal:      unicode,
+            datetime:     datetime.isoformat,
+            date:         date.isoformat,
+            time:         time.isoformat,
+            timedelta:    timedelta.total_seconds,
+            list:         _encode_list,
+            tuple:        _encode_list,
+            dict:         _encode_dict,
+            # Blobs are not read, only described.
+            Blob:         unicode,
+           }
+# Subclasses of these types are checked in this order.
+SUBCLASSES_ORDER = (bool, int, long, float, Decimal, unicode, str,
+                    datetime, date, time, timedelta, list, tuple, dict)
+
+
+def encode_value(value):
+    """
+    Encode a value of a field into a type which can be written by JSON and
+    CSV encoders: None, booleans, numbers, strings, lists and dicts.
+
+    Decimals are encoded as strings to keep their precision; dates, times and
+    datetimes use the ISO 8601 format, and deltas are in seconds. Blobs are
+    described without being read.
+    """
+    try:
+        return ENCODERS[type(value)](value)
+    except KeyError:
+        pass
+
+    if value is NotLoaded or value is NotAvailable:
+        return None
+    for klass in SUBCLASSES_ORDER:
+        if isinstance(value, klass):
+            return ENCODERS[klass](value)
+    if isinstance(value, CapBaseObject):
+        return _encode_object(value)
+    return unicode(value)
+
+
+class StreamFormatter(IFormatter):
+    """
+    Base class of formatters which write objects as records.
+
+    Before the first record of a class of objects, a schema is given to
+    :func:`format_schema`, with the names and types of the selected fields
+    of this class. Records are lists of encoded values, in the order of the
+    schema, given to :func:`format_record`.
+
+    Values are read from the objects through the projection of the selected
+    fields, without going through :func:`IFormatter.format_obj`.
+    """
+    def __init__(self, **kwargs):
+        IFormatter.__init__(self, **kwargs)
+        self.projection = None
+
+    def flush(self):
+        self.projection = None
+
+    def format(self, obj, selected_fields=None, alias=None):
+        if not isinstance(obj, CapBaseObject):
+            return IFormatter.format(self, obj, selected_fields, alias)
+
+        klass = obj.__class__
+        if selected_fields is None or '*' in selected_fields:
+            selected_fields = ['id'] + klass._fields.keys()
+        projection = self.get_projection(klass, selected_fields)
+
+        if self.MANDATORY_FIELDS:
+            names = set(name for name, value in ObjectView(obj, projection).iter_fields())
+            missing_fields = set(self.MANDATORY_FIELDS) - names
+            if missing_fields:
+                raise MandatoryFieldsNotFound(missing_fields)
+
+        if projection is not self.projection:
+            self.projection = projection
+            formatted = self.format_schema(klass, self.get_schema(klass, projection))
+            if formatted:
+                self.output(formatted)
+
+        formatted = self.format_record(self.get_record(obj, projection))
+        if formatted:
+            self.output(formatted)
+        return formatted
+
+    def get_schema(self, klass, projection):
+        """
+        Get the names and types of the fields of records.
+
+        :rtype: list[(str, str)]
+        """
+        schema = []
+        if projection.with_id:
+            schema.append(('id', 'string'))
+        for name, index in projection.fields:
+            schema.append((name, get_type_name(klass._fields[name].types)))
+        return schema
+
+    def get_record(self, obj, projection):
+        """
+        Get the encoded values of an object, in the order of the schema.
+
+        :rtype: list
+        """
+        record = []
+        if projection.with_id:
+            if obj.id is None:
+                record.append(None)
+            elif obj.backend is not None:
+                record.append(obj.fullid)
+            else:
+                record.append(obj.id)
+
+        if projection.generic:
+            values = dict(obj.iter_fields())
+            for name, index in projection.fields:
+                record.append(encode_value(values.get(name)))
+        else:
+            values = obj._values
+            for name, index in projection.fields:
+                value = values[index]
+                if value is _Deleted:
+                    record.append(None)
+                else:
+                    record.append(encode_value(value))
+        return record
+
+    def format_schema(self, klass, schema):
+        """
+        Format the schema of the next records.
+
+        :param klass: class of objects
+        :type klass: :class:`CapBaseObject`
+        :param schema: names and types of fields
+        :type schema: list[(str, str)]
+        :rtype: str
+        """
+        raise NotImplementedError()
+
+    def format_record(self, record):
+        """
+        Format a record.
+
+        :param record: encoded values of fields
+        :type record: list
+        :rtype: str
+        """
+        raise NotImplementedError()
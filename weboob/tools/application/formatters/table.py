@@ -18,9 +18,12 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
+from cgi import escape
+
 from prettytable import PrettyTable
 
 from weboob.capabilities.base import empty
+from weboob.tools.misc import to_unicode
 
 from .iformatter import IFormatter
 
@@ -30,43 +33,59 @@ __all__ = ['TableFormatter', 'HTMLTableFormatter']
 
 class TableFormatter(IFormatter):
     HTML = False
+    # When there are more than STREAM_ROWS rows, the columns and their widths
+    # are fixed from the first ones, and next rows are written as they come
+    # (longer values are truncated). 0 keeps every rows until flush().
+    STREAM_ROWS = 1000
 
     def __init__(self):
         IFormatter.__init__(self)
         self.queue = []
         self.keys = None
         self.header = None
+        # (index, width) of displayed columns, once streaming has started
+        self.columns = None
 
     def flush(self):
+        if self.columns is not None:
+            self.output(self.get_stream_footer())
+            self.columns = None
+            return
+
         s = self.get_formatted_table()
         if s is not None:
-            print s.encode('utf-8')
-
-    def get_formatted_table(self):
-        if len(self.queue) == 0:
-            return
+            self.output(s)
 
-        queue = [() for i in xrange(len(self.queue))]
-        column_headers = []
+    def get_available_columns(self):
         # Do not display columns when all values are NotLoaded or NotAvailable
+        columns = []
         for i in xrange(len(self.keys)):
-            available = False
             for line in self.queue:
                 if not empty(line[i]):
-                    available = True
+                    columns.append(i)
                     break
-            if available:
-                column_headers.append(self.keys[i].capitalize().replace('_', ' '))
-                for j in xrange(len(self.queue)):
-                    queue[j] += (self.queue[j][i],)
-
-        s = ''
-        if self.display_header and self.header:
-            if self.HTML:
-                s += '<p>%s</p>' % self.header
-            else:
-                s += self.header
-            s += "\n"
+        return columns
+
+    def get_column_header(self, i):
+        return self.keys[i].capitalize().replace('_', ' ')
+
+    def get_formatted_header(self):
+        if not self.display_header or not self.header:
+            return ''
+        if self.HTML:
+            return '<p>%s</p>\n' % self.header
+        else:
+            return self.header + '\n'
+
+    def get_formatted_table(self):
+        if len(self.queue) == 0:
+            return
+
+        columns = self.get_available_columns()
+        column_headers = [self.get_column_header(i) for i in columns]
+        queue = [tuple(line[i] for i in columns) for line in self.queue]
+
+        s = self.get_formatted_header()
         table = PrettyTable(list(column_headers))
         for column_header in column_headers:
             # API changed in python-prettytable. The try/except is a bad hack to support both versions
@@ -88,10 +107,60 @@ class TableFormatter(IFormatter):
 
         return s
 
+    def start_stream(self):
+        """
+        Write the queued rows, and fix the columns of next ones.
+        """
+        columns = self.get_available_columns()
+        headers = [self.get_column_header(i) for i in columns]
+        widths = [max([len(header)] + [len(self.get_cell(line[i])) for line in self.queue])
+                  for i, header in zip(columns, headers)]
+        self.columns = zip(columns, widths)
+
+        header = self.get_formatted_header()
+        lines = [header.rstrip('\n')] if header else []
+        if self.HTML:
+            lines.append('<table>')
+            lines.append('    <tr>%s</tr>' % ''.join('<th>%s</th>' % escape(header) for header in headers))
+        else:
+            lines.append(self.get_stream_separator())
+            lines.append(self.get_stream_line(headers))
+            lines.append(self.get_stream_separator())
+        lines.extend(self.get_stream_row(line) for line in self.queue)
+        self.queue = []
+        self.output(u'\n'.join(lines))
+
+    def get_cell(self, value):
+        return to_unicode(value).replace('\n', ' ')
+
+    def get_stream_separator(self):
+        return '+%s+' % '+'.join('-' * (width + 2) for i, width in self.columns)
+
+    def get_stream_line(self, values):
+        return u'| %s |' % u' | '.join(value[:width].ljust(width) for value, (i, width) in zip(values, self.columns))
+
+    def get_stream_row(self, line):
+        values = [self.get_cell(line[i]) for i, width in self.columns]
+        if self.HTML:
+            return u'    <tr>%s</tr>' % u''.join(u'<td>%s</td>' % escape(value) for value in values)
+        return self.get_stream_line(values)
+
+    def get_stream_footer(self):
+        if self.HTML:
+            return '</table>'
+        return self.get_stream_separator()
+
     def format_dict(self, item):
         if self.keys is None:
             self.keys = item.keys()
+
+        if self.columns is not None:
+            self.output(self.get_stream_row(item.values()))
+            return
+
         self.queue.append(item.values())
+        if self.STREAM_ROWS and len(self.queue) > self.STREAM_ROWS:
+            self.start_stream()
 
     def set_header(self, string):
         self.header = string
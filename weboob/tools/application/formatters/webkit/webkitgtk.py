@@ -43,6 +43,9 @@ class WebBrowser(gtk.Window):
 
 
 class WebkitGtkFormatter(HTMLTableFormatter):
+    # The whole table is displayed in a window.
+    STREAM_ROWS = 0
+
     def flush(self):
         table_string = self.get_formatted_table()
         js_filepaths = []
@@ -282,6 +282,7 @@ class ReplApplication(Cmd, ConsoleApplication):
         backends = kwargs.pop('backends', None)
         kwargs['backends'] = self.enabled_backends if backends is None else backends
         kwargs['condition'] = self.condition
+        kwargs['count'] = self.options.count
         fields = kwargs.pop('fields', self.selected_fields) or self.selected_fields
         if '$direct' in fields:
             fields = []
@@ -722,6 +723,9 @@ class ReplApplication(Cmd, ConsoleApplication):
         If an argument is given, set the condition expression used to filter the results.
         If the "off" value is given, conditional filtering is disabled.
 
+        Operators are =, !=, <, >, <=, >=, ~ (regular expression) and in
+        (comma-separated values), for example: amount<0 and label~^CB
+
         If no argument is given, print the current condition expression.
         """
         line = line.strip()
@@ -1097,3 +1101,4 @@ class ReplApplication(Cmd, ConsoleApplication):
 
     def flush(self):
         self.formatter.flush()
+        self.formatter.close_output()
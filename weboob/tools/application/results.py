@@ -18,54 +18,323 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
+import datetime
+from decimal import Decimal, InvalidOperation
+import operator
+import re
+
+from weboob.capabilities.base import empty
 from weboob.core.bcall import IResultsCondition, ResultsConditionError
+from weboob.tools.misc import to_unicode
 
 
 __all__ = ['ResultsCondition', 'ResultsConditionError']
 
 
+def _parse_datetime(value):
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError('Invalid datetime: %s' % value)
+
+
+def _parse_date(value):
+    return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _parse_time(value):
+    for fmt in ('%H:%M:%S', '%H:%M'):
+        try:
+            return datetime.datetime.strptime(value, fmt).time()
+        except ValueError:
+            pass
+    raise ValueError('Invalid time: %s' % value)
+
+
+def _parse_bool(value):
+    if value.lower() in ('1', 'true', 'yes', 'on'):
+        return True
+    if value.lower() in ('0', 'false', 'no', 'off'):
+        return False
+    raise ValueError('Invalid boolean: %s' % value)
+
+
 class ResultsCondition(IResultsCondition):
+    """
+    Condition on fields of results, for example::
+
+        amount<0 and label~^CB or category in food,restaurant
+
+    Operators are ``=``, ``!=``, ``<``, ``>``, ``<=``, ``>=``, ``~`` (search
+    of a regular expression) and ``in`` (comma-separated list of values). A
+    comparison can be negated with ``not``, and ``and`` has priority over
+    ``or``.
+
+    The expression is parsed once. For each class of results, it is compiled
+    into a list of tests, where values are converted to the types of the
+    compared fields; then only the referenced fields of objects are read.
+    """
     condition_str = None
 
+    # Converters of string values to the types of fields
+    CONVERTERS = {unicode:             to_unicode,
+                  basestring:          to_unicode,
+                  str:                 str,
+                  int:                 int,
+                  long:                long,
+                  float:               float,
+                  bool:                _parse_bool,
+                  Decimal:             Decimal,
+                  datetime.datetime:   _parse_datetime,
+                  datetime.date:       _parse_date,
+                  datetime.time:       _parse_time,
+                 }
+
+    OPERATORS = {'=':  operator.eq,
+                 '!=': operator.ne,
+                 '<':  operator.lt,
+                 '>':  operator.gt,
+                 '<=': operator.le,
+                 '>=': operator.ge,
+                }
+
+    _expr_re = re.compile(r'^\s*(not\s+)?(\w+)\s*(!=|<=|>=|=|<|>|~|\s+in\s+)\s*(.*?)\s*$')
+
     def __init__(self, condition_str):
         condition_str = condition_str.replace(' OR ', ' or ') \
                                      .replace(' AND ', ' and ') \
-                                     .replace(' NOT ', ' not ')
+                                     .replace(' NOT ', ' not ') \
+                                     .replace(' IN ', ' in ')
         or_list = []
         for _or in condition_str.split(' or '):
-            and_dict = {}
+            and_list = []
             for _and in _or.split(' and '):
-                if '!=' in _and:
-                    k, v = _and.split('!=')
-                    k = k.strip() + '!'
-                elif '=' in _and:
-                    k, v = _and.split('=')
-                else:
-                    raise ResultsConditionError(u'Could not find = or != operator in sub-expression "%s"' % _and)
-                and_dict[k.strip()] = v.strip()
-            or_list.append(and_dict)
+                m = self._expr_re.match(_and)
+                if not m:
+                    raise ResultsConditionError(u'Could not find a valid operator in sub-expression "%s"' % _and)
+                negate, field, op, value = m.groups()
+                op = op.strip()
+                if op == '~':
+                    try:
+                        value = re.compile(value)
+                    except re.error, e:
+                        raise ResultsConditionError(u'Invalid regular expression "%s": %s' % (value, e))
+                and_list.append((field, op, value, bool(negate)))
+            or_list.append(and_list)
         self.condition = or_list
         self.condition_str = condition_str
+        # Compiled tests by class of objects
+        self.compiled = {}
+        # Bounds by (class, field, reverse)
+        self.bounds = {}
 
     def is_valid(self, obj):
-        d = dict(obj.iter_fields())
+        """
+        Check if an object matches the condition.
+
+        >>> import datetime
+        >>> from decimal import Decimal
+        >>> from weboob.capabilities.bank import Transaction
+        >>> tr = Transaction(u'42')
+        >>> tr.date = datetime.date(2013, 5, 10)
+        >>> tr.label = u'CB SHOP'
+        >>> tr.category = u'food'
+        >>> tr.amount = Decimal('-12.50')
+        >>> def test(condition):
+        ...     return ResultsCondition(condition).is_valid(tr)
+        >>> test(u'amount=-12.5'), test(u'amount!=-12.5')
+        (True, False)
+        >>> test(u'amount<0'), test(u'amount>0'), test(u'amount<=-12.5'), test(u'amount>=-12')
+        (True, False, True, False)
+        >>> test(u'date>=2013-05-01'), test(u'date<2013-05-10')
+        (True, False)
+        >>> test(u'label~^CB'), test(u'label~^VIR')
+        (True, False)
+        >>> test(u'category in food,restaurant'), test(u'category in bank,tax')
+        (True, False)
+        >>> test(u'id=42')
+        True
+
+        ``not`` negates a comparison, and ``and`` has priority over ``or``:
+
+        >>> test(u'not amount<0'), test(u'not category in bank,tax')
+        (False, True)
+        >>> test(u'amount>0 and label~CB or category=food')
+        True
+        >>> test(u'amount>0 or label~CB and category=bank')
+        False
+
+        Empty fields never match a comparison:
+
+        >>> from weboob.capabilities.base import NotLoaded
+        >>> tr.rdate is NotLoaded
+        True
+        >>> test(u'rdate<2014-01-01'), test(u'not rdate<2014-01-01')
+        (False, True)
+        """
+        try:
+            compiled = self.compiled[obj.__class__]
+        except KeyError:
+            compiled = self.compiled[obj.__class__] = self._compile(obj.__class__)
+
+        values = obj._values
+        for _or in compiled:
+            for index, test in _or:
+                if not test(obj.id if index is None else values[index]):
+                    break
+            else:
+                return True
+        return False
+
+    def is_beyond(self, obj, field, reverse=True):
+        key = (obj.__class__, field, reverse)
+        try:
+            bounds = self.bounds[key]
+        except KeyError:
+            bounds = self.bounds[key] = self._compile_bounds(obj.__class__, field, reverse)
+
+        if bounds is None:
+            return False
+        value = getattr(obj, field)
+        if empty(value):
+            return False
+        for bound in bounds:
+            # Every or-group has to exclude the value.
+            try:
+                operand = bound[type(value)]
+            except KeyError:
+                return False
+            if (value >= operand) if reverse else (value <= operand):
+                return False
+        return True
+
+    def _compile_bounds(self, klass, field, reverse):
+        """
+        Get, for each or-group, the lowest (or greatest if not *reverse*)
+        values of *field* which can match, by type.
+
+        :returns: a list of dicts, or None if a group is not bounded
+        """
+        if field not in klass._fields_index:
+            return None
+        types = klass._fields[field].types
+        ops = ('=', '>', '>=', 'in') if reverse else ('=', '<', '<=', 'in')
+        tightest = max if reverse else min
+        loosest = min if reverse else max
+
+        bounds = []
         for _or in self.condition:
-            for k, v in _or.iteritems():
-                if k.endswith('!'):
-                    k = k[:-1]
-                    different = True
+            bound = None
+            for name, op, value, negate in _or:
+                if name != field or negate or op not in ops:
+                    continue
+                if op == 'in':
+                    choices = [self._convert(field, types, choice.strip()) for choice in value.split(',')]
+                    values = {}
+                    for type_ in choices[0]:
+                        if all(type_ in choice for choice in choices):
+                            values[type_] = loosest(choice[type_] for choice in choices)
                 else:
-                    different = False
-                if k in d:
-                    if different:
-                        if d[k] == v:
-                            return False
-                    else:
-                        if d[k] != v:
-                            return False
+                    values = self._convert(field, types, value)
+
+                if bound is None:
+                    bound = values
                 else:
-                    raise ResultsConditionError(u'Field "%s" is not valid.' % k)
-        return True
+                    bound = dict((type_, tightest(bound[type_], values[type_]))
+                                 for type_ in bound if type_ in values)
+            if bound is None:
+                return None
+            bounds.append(bound)
+        return bounds
+
+    def _compile(self, klass):
+        compiled = []
+        for _or in self.condition:
+            tests = []
+            for field, op, value, negate in _or:
+                if field == 'id':
+                    index = None
+                    types = (unicode,)
+                elif field in klass._fields_index:
+                    index = klass._fields_index[field]
+                    types = klass._fields[field].types
+                else:
+                    raise ResultsConditionError(u'Field "%s" is not valid.' % field)
+
+                test = self._compile_test(field, types, op, value)
+                if negate:
+                    test = self._negate(test)
+                tests.append((index, test))
+            compiled.append(tests)
+        return compiled
+
+    def _convert(self, field, types, value):
+        """
+        Convert a string to each type accepted by a field.
+
+        :rtype: dict
+        """
+        values = {}
+        for klass in types:
+            converter = self.CONVERTERS.get(klass)
+            if converter is None:
+                continue
+            try:
+                values[klass] = converter(value)
+            except (ValueError, TypeError, InvalidOperation):
+                pass
+        if not values:
+            raise ResultsConditionError(u'Value "%s" is not valid for field "%s".' % (value, field))
+
+        # Subclasses of accepted types are compared with them.
+        if datetime.date in values and datetime.datetime not in values:
+            values[datetime.datetime] = datetime.datetime.combine(values[datetime.date], datetime.time())
+        if basestring in values:
+            values.setdefault(unicode, values[basestring])
+        if unicode in values:
+            values.setdefault(str, values[unicode])
+        return values
+
+    def _compile_test(self, field, types, op, value):
+        if op == '~':
+            search = value.search
+            return lambda v: not empty(v) and search(to_unicode(v)) is not None
+
+        if op == 'in':
+            choices = [self._convert(field, types, choice.strip()) for choice in value.split(',')]
+            sets = {}
+            for values in choices:
+                for klass, choice in values.iteritems():
+                    sets.setdefault(klass, set()).add(choice)
+            return self._typed(sets, lambda v, choices: v in choices)
+
+        values = self._convert(field, types, value)
+        if op == '!=':
+            return self._negate(self._typed(values, operator.eq))
+        return self._typed(values, self.OPERATORS[op])
+
+    def _typed(self, values, func):
+        """
+        Build a test comparing a value to the operand of its type.
+        """
+        if len(values) == 1:
+            operand = values.values()[0]
+            return lambda v: not empty(v) and func(v, operand)
+
+        def test(v):
+            if empty(v):
+                return False
+            try:
+                operand = values[type(v)]
+            except KeyError:
+                return False
+            return func(v, operand)
+        return test
+
+    def _negate(self, test):
+        return lambda v: not test(v)
 
     def __str__(self):
         return unicode(self).encode('utf-8')
@@ -18,8 +18,12 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
+from __future__ import with_statement
+
+from collections import deque
 import os
-from threading import RLock
+import sys
+from threading import RLock, Event, local
 from copy import copy
 
 from weboob.capabilities.base import CapBaseObject, FieldNotFound, \
@@ -32,6 +36,36 @@ from weboob.tools.value import ValuesDict
 __all__ = ['BackendStorage', 'BackendConfig', 'BaseBackend']
 
 
+# Hints about the call in progress in the current thread
+_call_context = local()
+
+
+class _FillJob(object):
+    """
+    Fill of objects made in another thread.
+    """
+    def __init__(self, function, *args):
+        self.function = function
+        self.args = args
+        self.done = Event()
+        self.result = None
+        self.exc_info = None
+
+    def run(self):
+        try:
+            self.result = self.function(*self.args)
+        except Exception:
+            self.exc_info = sys.exc_info()
+        finally:
+            self.done.set()
+
+    def get(self):
+        self.done.wait()
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+        return self.result
+
+
 class BackendStorage(object):
     """
     This is an abstract layer to store data in storages (:mod:`weboob.tools.storage`)
@@ -243,6 +277,22 @@ class BaseBackend(object):
     # When the method is called, fields are only the one which are
     # NOT yet filled.
     OBJECTS = {}
+    # Supported objects to fill several at once
+    # The key is the class and the value the method to call to fill
+    # Method prototype: method(objects, fields)
+    # fillobjs() gives it every supported object it is called with. An object
+    # supported by both BATCH_OBJECTS and OBJECTS is filled by the method of
+    # BATCH_OBJECTS, in fillobj() too.
+    BATCH_OBJECTS = {}
+    # Number of objects taken from the iterator by iter_fillobjs() before
+    # giving them to fillobjs(), when there are BATCH_OBJECTS.
+    FILL_BATCH_SIZE = 20
+    # Maximum number of objects filled at the same time by fillobjs().
+    # Objects are then filled in other threads, which do NOT hold the lock
+    # of the backend (the caller of fillobjs() usually holds it). So keep 1,
+    # unless fill methods only use the browser while holding its lock, and
+    # no other state of the backend.
+    FILL_CONCURRENCY = 1
 
     class ConfigError(Exception):
         """
@@ -263,6 +313,11 @@ class BaseBackend(object):
         self.weboob = weboob
         self.name = name
         self.lock = RLock()
+        # Threads used by fillobjs()
+        self._fill_pool = None
+        if self.FILL_CONCURRENCY > 1:
+            from weboob.core.executor import ThreadPool
+            self._fill_pool = ThreadPool(max_workers=self.FILL_CONCURRENCY, max_per_key=0)
 
         # Private fields (which start with '_')
         self._private_config = dict((key, value) for key, value in config.iteritems() if key.startswith('_'))
@@ -320,8 +375,112 @@ class BaseBackend(object):
             kwargs.setdefault('responses_dirname', os.path.join(self.BROWSER.responses_dirname,
                                                                 self._private_config.get('_debug_dir', self.name)))
 
+        if getattr(self.BROWSER, 'HTTP_CACHE', False) or \
+           self._private_config.get('_http_cache', '').lower() in ('1', 'y', 'yes', 'true', 'on'):
+            from weboob.tools.browser.cache import HTTPCache
+            kwargs.setdefault('cache', HTTPCache.get(os.path.join(self.weboob.datadir, 'http_cache'),
+                                                     self.BROWSER.HTTP_CACHE_SIZE))
+
+        if '_retries' in self._private_config and getattr(self.BROWSER, 'RETRY_POLICY', None) is not None:
+            # Maximum number of tries of failed requests
+            kwargs.setdefault('retry_policy', self.BROWSER.RETRY_POLICY(tries=int(self._private_config['_retries'])))
+
         return self.BROWSER(*args, **kwargs)
 
+    def abort(self):
+        """
+        Abort the operation in progress on this backend, for example when a
+        call has exceeded its deadline. This method is called from another
+        thread than the one which uses the backend.
+
+        Requests of the browser fail until :func:`clear_abort` is called.
+        """
+        browser = self._browser
+        if browser is not None and hasattr(browser, 'abort'):
+            browser.abort()
+
+    def clear_abort(self):
+        """
+        Allow the browser to make requests again after :func:`abort`.
+        """
+        browser = self._browser
+        if browser is not None and hasattr(browser, 'clear_abort'):
+            browser.clear_abort()
+
+    @property
+    def condition(self):
+        """
+        Condition that results of the call in progress have to match, or None
+        (see :class:`weboob.core.bcall.IResultsCondition`).
+
+        Methods may use it to stop paginating or to filter results on the
+        server side, but they are not required to: results are checked by
+        the caller anyway.
+        """
+        return getattr(_call_context, 'condition', None)
+
+    @property
+    def count(self):
+        """
+        Maximum number of results wanted by the call in progress, or None.
+        """
+        return getattr(_call_context, 'count', None)
+
+    def set_call_hints(self, condition=None, count=None):
+        """
+        Set :attr:`condition` and :attr:`count` for the calls made in the
+        current thread.
+
+        :returns: the previous hints, as a (condition, count) tuple
+        """
+        previous = (self.condition, self.count)
+        _call_context.condition = condition
+        _call_context.count = count
+        return previous
+
+    def limit_results(self, iterator, sorted_by=None, reverse=True, tolerance=0):
+        """
+        Iterate on results until the call in progress does not need more of
+        them, which is when :attr:`count` results matching :attr:`condition`
+        have been given, or, if results are sorted, when next ones can not
+        match the condition anymore.
+
+        Example:
+
+        >>> def iter_history(self, account):
+        ...     return self.limit_results(self.browser.get_history(account), sorted_by='date')
+
+        :param iterator: results
+        :param sorted_by: name of the field on which results are sorted
+        :type sorted_by: str
+        :param reverse: True if results are sorted in descending order
+        :type reverse: bool
+        :param tolerance: number of consecutive results which can be out of
+                          the bounds of the condition before stopping, for
+                          loosely sorted results
+        :type tolerance: int
+        """
+        condition = self.condition
+        count = self.count
+        found = 0
+        beyond = 0
+        for obj in iterator:
+            if condition is None or condition.is_valid(obj):
+                found += 1
+                beyond = 0
+            elif sorted_by is not None and condition.is_beyond(obj, sorted_by, reverse):
+                beyond += 1
+            else:
+                beyond = 0
+
+            yield obj
+
+            if count is not None and found >= count:
+                return
+            if beyond > tolerance:
+                self.logger.debug(u'Next results can not match condition "%s", stop' % condition)
+                return
+
     @classmethod
     def iter_caps(klass):
         """
@@ -347,21 +506,10 @@ class BaseBackend(object):
                 return True
         return False
 
-    def fillobj(self, obj, fields=None):
-        """
-        Fill an object with the wanted fields.
-
-        :param fields: what fields to fill; if None, all fields are filled
-        :type fields: :class:`list`
-        """
-
+    def _get_missing_fields(self, obj, fields):
         def not_loaded(v):
             return (v is NotLoaded or isinstance(v, CapBaseObject) and not v.__iscomplete__())
 
-        if isinstance(fields, basestring):
-            fields = (fields,)
-
-        missing_fields = []
         if fields is None:
             # Select all fields
             if isinstance(obj, CapBaseObject):
@@ -369,6 +517,7 @@ class BaseBackend(object):
             else:
                 fields = [item[0] for item in iter_fields(obj)]
 
+        missing_fields = []
         for field in fields:
             if not hasattr(obj, field):
                 raise FieldNotFound(obj, field)
@@ -386,13 +535,38 @@ class BaseBackend(object):
             if missing:
                 missing_fields.append(field)
 
+        return missing_fields
+
+    def _get_fill_method(self, methods, obj):
+        for key, value in methods.iteritems():
+            if isinstance(obj, key):
+                return value
+        return None
+
+    def fillobj(self, obj, fields=None):
+        """
+        Fill an object with the wanted fields.
+
+        :param fields: what fields to fill; if None, all fields are filled
+        :type fields: :class:`list`
+        """
+        if isinstance(fields, basestring):
+            fields = (fields,)
+
+        missing_fields = self._get_missing_fields(obj, fields)
         if not missing_fields:
             return obj
 
-        for key, value in self.OBJECTS.iteritems():
-            if isinstance(obj, key):
-                self.logger.debug(u'Fill %r with fields: %s' % (obj, missing_fields))
-                return value(self, obj, missing_fields) or obj
+        method = self._get_fill_method(self.BATCH_OBJECTS, obj)
+        if method is not None:
+            self.logger.debug(u'Fill %r with fields: %s' % (obj, missing_fields))
+            objs = method(self, [obj], missing_fields)
+            return objs[0] if objs else obj
+
+        method = self._get_fill_method(self.OBJECTS, obj)
+        if method is not None:
+            self.logger.debug(u'Fill %r with fields: %s' % (obj, missing_fields))
+            return method(self, obj, missing_fields) or obj
 
         # Object is not supported by backend. Do not notice it to avoid flooding user.
         # That's not so bad.
@@ -400,3 +574,112 @@ class BaseBackend(object):
             setattr(obj, field, NotAvailable)
 
         return obj
+
+    def fillobjs(self, objs, fields=None):
+        """
+        Fill several objects with the wanted fields.
+
+        Objects supported by a method of :attr:`BATCH_OBJECTS` are given to it
+        at once. Other ones are filled with :func:`fillobj`, up to
+        :attr:`FILL_CONCURRENCY` at the same time.
+
+        :param objs: objects to fill
+        :type objs: :class:`list`
+        :param fields: what fields to fill; if None, all fields are filled
+        :type fields: :class:`list`
+        :returns: filled objects, in the same order
+        :rtype: :class:`list`
+        """
+        if isinstance(fields, basestring):
+            fields = (fields,)
+
+        results = list(objs)
+        # Objects to fill by batch method: method -> (indexes, missing fields)
+        batches = {}
+        singles = []
+        for i, obj in enumerate(results):
+            missing_fields = self._get_missing_fields(obj, fields)
+            if not missing_fields:
+                continue
+
+            method = self._get_fill_method(self.BATCH_OBJECTS, obj)
+            if method is None:
+                singles.append(i)
+                continue
+
+            indexes, batch_fields = batches.setdefault(method, ([], []))
+            indexes.append(i)
+            batch_fields.extend(field for field in missing_fields if field not in batch_fields)
+
+        for method, (indexes, batch_fields) in batches.iteritems():
+            self.logger.debug(u'Fill %d objects with fields: %s' % (len(indexes), batch_fields))
+            filled = method(self, [results[i] for i in indexes], batch_fields)
+            if filled:
+                for i, obj in zip(indexes, filled):
+                    results[i] = obj
+
+        if self.FILL_CONCURRENCY > 1 and len(singles) > 1:
+            jobs = [(i, self._submit_fill(self.fillobj, results[i], fields)) for i in singles]
+            for i, job in jobs:
+                results[i] = job.get()
+        else:
+            for i in singles:
+                results[i] = self.fillobj(results[i], fields)
+
+        return results
+
+    def iter_fillobjs(self, objs, fields=None, count=None):
+        """
+        Fill objects given by an iterator, and yield them in the same order.
+
+        Objects are filled by groups with :func:`fillobjs`. If
+        :attr:`FILL_CONCURRENCY` is greater than 1, a group is filled in
+        another thread while next objects are taken from the iterator.
+
+        :param objs: objects to fill
+        :type objs: iter
+        :param fields: what fields to fill; if None, all fields are filled
+        :type fields: :class:`list`
+        :param count: maximum number of objects to take from the iterator;
+                      None for no limit
+        :type count: int
+        """
+        if self.BATCH_OBJECTS:
+            size = self.FILL_BATCH_SIZE
+        else:
+            size = self.FILL_CONCURRENCY
+        # Number of groups being filled while next objects are taken
+        ahead = 1 if self.FILL_CONCURRENCY > 1 else 0
+
+        pending = deque()
+        group = []
+        taken = 0
+        for obj in objs:
+            group.append(obj)
+            taken += 1
+            # The last group is not larger than needed.
+            if len(group) >= size or taken == count:
+                pending.append(self._fill_group(group, fields))
+                group = []
+                while len(pending) > ahead:
+                    for obj in pending.popleft().get():
+                        yield obj
+            if taken == count:
+                break
+        if group:
+            pending.append(self._fill_group(group, fields))
+        while pending:
+            for obj in pending.popleft().get():
+                yield obj
+
+    def _fill_group(self, objs, fields):
+        if self.FILL_CONCURRENCY > 1:
+            return self._submit_fill(self.fillobjs, objs, fields)
+        job = _FillJob(self.fillobjs, objs, fields)
+        job.run()
+        return job
+
+    def _submit_fill(self, function, *args):
+        job = _FillJob(function, *args)
+        self._fill_pool.submit(self.name, job.run)
+        return job
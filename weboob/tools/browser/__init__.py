@@ -23,9 +23,10 @@ from weboob.tools.browser.browser import BrowserIncorrectPassword, BrowserBanned
                                          BrowserHTTPNotFound, BrowserHTTPError, \
                                          BasePage, BaseBrowser, BrokenPageError, \
                                          StandardBrowser, BrowserPasswordExpired, \
-                                         BrowserForbidden
+                                         BrowserForbidden, BrowserAborted, BrowserCircuitOpen
 
 
 __all__ = ['BrowserIncorrectPassword', 'BrowserPasswordExpired', 'BrowserBanned',
            'BrowserUnavailable', 'BrowserRetry', 'BrowserHTTPNotFound', 'BrowserHTTPError',
-           'BasePage', 'BaseBrowser', 'BrokenPageError', 'StandardBrowser', 'BrowserForbidden']
+           'BasePage', 'BaseBrowser', 'BrokenPageError', 'StandardBrowser', 'BrowserForbidden',
+           'BrowserAborted', 'BrowserCircuitOpen']
@@ -32,7 +32,7 @@ import os
 import sys
 import re
 import tempfile
-from threading import RLock
+from threading import Event, RLock, local
 import ssl
 import httplib
 import socket
@@ -41,11 +41,16 @@ import time
 import urllib
 import urllib2
 from urlparse import urlsplit
+from weakref import WeakSet
 import mimetypes
 from contextlib import closing
 from gzip import GzipFile
 
-from weboob.tools.decorators import retry
+from weboob.capabilities.base import Blob
+from weboob.tools.browser.cache import HTTPCacheProcessor
+from weboob.tools.browser.keepalive import ConnectionPool, KeepAliveHTTPHandler, KeepAliveHTTPSHandler
+from weboob.tools.browser.ratelimit import RateLimitProcessor
+from weboob.tools.browser.retry import RetryPolicy, parse_retry_after
 from weboob.tools.log import getLogger
 from weboob.tools.mech import ClientForm
 ControlNotFoundError = ClientForm.ControlNotFoundError
@@ -62,7 +67,8 @@ else:
 
 
 __all__ = ['BrowserIncorrectPassword', 'BrowserForbidden', 'BrowserBanned', 'BrowserUnavailable', 'BrowserRetry',
-           'BrowserHTTPNotFound', 'BrowserHTTPError', 'BrokenPageError', 'BasePage',
+           'BrowserHTTPNotFound', 'BrowserHTTPError', 'BrowserAborted', 'BrowserCircuitOpen',
+           'BrokenPageError', 'BasePage',
            'StandardBrowser', 'BaseBrowser']
 
 
@@ -95,6 +101,17 @@ class BrowserHTTPError(BrowserUnavailable):
     pass
 
 
+class BrowserAborted(BrowserUnavailable):
+    pass
+
+
+class BrowserCircuitOpen(BrowserUnavailable):
+    """
+    Requests to a host are refused for a while, because it has failed too
+    many times.
+    """
+
+
 class BrowserRetry(Exception):
     pass
 
@@ -146,6 +163,11 @@ class BasePage(object):
         pass
 
 
+# Browser which is opening an URL in the current thread, used by connections
+# to register their sockets.
+_context = local()
+
+
 def check_location(func):
     def inner(self, *args, **kwargs):
         if args and isinstance(args[0], basestring):
@@ -161,6 +183,76 @@ def check_location(func):
     return inner
 
 
+def _get_host(url):
+    if isinstance(url, basestring):
+        return urlsplit(url).netloc
+    if hasattr(url, 'get_host'):
+        return url.get_host()
+    return None
+
+
+# Number of nested calls of functions decorated by retry_on_error, in the
+# current thread.
+_retry_calls = local()
+
+
+def retry_on_error(func):
+    """
+    Retry a request which fails with :class:`BrowserHTTPError`, as decided by
+    the :attr:`retry_policy` of the browser.
+
+    Only the outermost decorated call of a thread applies the policy, so
+    requests made inside it (for example a login during :func:`location`)
+    are neither retried twice nor refused while the circuit is half-open.
+    """
+    def call(self, *args, **kwargs):
+        _retry_calls.depth = getattr(_retry_calls, 'depth', 0) + 1
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            _retry_calls.depth -= 1
+
+    def inner(self, *args, **kwargs):
+        policy = self.retry_policy
+        if policy is None or getattr(_retry_calls, 'depth', 0) > 0:
+            return call(self, *args, **kwargs)
+
+        host = _get_host(args[0]) if args else None
+        tries = 0
+        while True:
+            delay = policy.before(host)
+            if delay is not None:
+                if delay > 0:
+                    raise BrowserCircuitOpen('Too many failures on %s, requests are refused during %d seconds' %
+                                             (host, delay + 0.5))
+                raise BrowserCircuitOpen('Too many failures on %s, requests are refused until it is back' % host)
+            tries += 1
+            try:
+                result = call(self, *args, **kwargs)
+            except BrowserHTTPError, e:
+                delay = policy.failure(host, tries, getattr(e, 'retry_after', None))
+                if delay is None:
+                    raise
+                self.logger.debug(u'%s, retrying in %.1f seconds...' % (e, delay))
+                # The wait is interrupted by abort().
+                self.abort_event.wait(delay)
+                if self.aborted:
+                    raise BrowserAborted('Request aborted')
+            except BaseException, e:
+                if getattr(e, 'status', None) is not None:
+                    # The host has answered with an HTTP error.
+                    policy.success(host)
+                else:
+                    # The request has failed for another reason, which
+                    # says nothing about the host.
+                    policy.cancel(host)
+                raise
+            else:
+                policy.success(host)
+                return result
+    return inner
+
+
 class StandardBrowser(mechanize.Browser):
     """
     Standard Browser.
@@ -176,6 +268,11 @@ class StandardBrowser(mechanize.Browser):
     :type proxy: str
     :param factory: mechanize factory. None to use Mechanize's default
     :type factory: object
+    :param cache: HTTP cache to use. None to disable it
+    :type cache: :class:`weboob.tools.browser.cache.HTTPCache`
+    :param retry_policy: policy of retries of failed requests (default is
+                         built by :attr:`RETRY_POLICY`)
+    :type retry_policy: :class:`weboob.tools.browser.retry.RetryPolicy`
     """
 
     # ------ Class attributes --------------------------------------
@@ -193,6 +290,29 @@ class StandardBrowser(mechanize.Browser):
     DEBUG_MECHANIZE = False
     DEFAULT_TIMEOUT = 15
     INSECURE = False  # if True, do not validate SSL
+    # Reuse HTTP connections (keep-alive)
+    KEEP_ALIVE = True
+    # Maximum number of idle connections kept for each host
+    MAX_IDLE_CONNECTIONS = 2
+    # Delay in seconds after which an idle connection is closed
+    IDLE_TIMEOUT = 30
+    # If True, the connections pool is shared by every browsers of the
+    # process instead of being owned by this browser
+    SHARED_CONNECTIONS = False
+    # Use an on-disk HTTP cache (it can also be enabled with the "_http_cache"
+    # option of the backend)
+    HTTP_CACHE = False
+    # Maximum size in bytes of the HTTP cache
+    HTTP_CACHE_SIZE = 50*1024*1024
+    # Callable which builds the policy of retries of failed requests, like a
+    # subclass of RetryPolicy or a functools.partial; None to never retry
+    RETRY_POLICY = RetryPolicy
+    # Maximum number of requests per second to DOMAIN (or to each host if
+    # DOMAIN is not set), shared by every browsers of the process; None for
+    # no limit
+    RATE_LIMIT = None
+    # Number of requests which can be made at once before being limited
+    RATE_LIMIT_BURST = 1
 
     responses_dirname = None
     responses_count = 0
@@ -206,9 +326,21 @@ class StandardBrowser(mechanize.Browser):
     default_features.remove('_robots')
     default_features.remove('_refresh')
 
-    def __init__(self, firefox_cookies=None, parser=None, history=NoHistory(), proxy=None, logger=None, factory=None, responses_dirname=None):
+    handler_classes = copy(mechanize.Browser.handler_classes)
+    handler_classes['http'] = KeepAliveHTTPHandler
+    handler_classes['https'] = KeepAliveHTTPSHandler
+    handler_classes['_httpcache'] = HTTPCacheProcessor
+    default_features.append('_httpcache')
+    handler_classes['_ratelimit'] = RateLimitProcessor
+    default_features.append('_ratelimit')
+
+    def __init__(self, firefox_cookies=None, parser=None, history=NoHistory(), proxy=None, logger=None, factory=None, responses_dirname=None, cache=None, retry_policy=None):
         mechanize.Browser.__init__(self, history=history, factory=factory)
         self.logger = getLogger('browser', logger)
+        self.cache = cache
+        if retry_policy is None and self.RETRY_POLICY is not None:
+            retry_policy = self.RETRY_POLICY()
+        self.retry_policy = retry_policy
 
         self.addheaders = [
                 ['User-agent', self.USER_AGENT]
@@ -241,6 +373,20 @@ class StandardBrowser(mechanize.Browser):
         self.parser = parser
         self.lock = RLock()
 
+        # Sockets of the pending requests, and if requests are aborted
+        self.sockets = WeakSet()
+        self.aborted = False
+        # Set while requests are aborted, to interrupt waits
+        self.abort_event = Event()
+
+        # Pool of persistent connections
+        if not self.KEEP_ALIVE:
+            self.connections = None
+        elif self.SHARED_CONNECTIONS:
+            self.connections = ConnectionPool.shared(self.MAX_IDLE_CONNECTIONS, self.IDLE_TIMEOUT)
+        else:
+            self.connections = ConnectionPool(self.MAX_IDLE_CONNECTIONS, self.IDLE_TIMEOUT)
+
         if self.DEBUG_HTTP:
             # display messages from httplib
             self.set_debug_http(True)
@@ -257,11 +403,75 @@ class StandardBrowser(mechanize.Browser):
     def __exit__(self, t, v, tb):
         self.lock.release()
 
+    def close(self):
+        if self.connections is not None and not self.SHARED_CONNECTIONS:
+            self.connections.clear()
+        mechanize.Browser.close(self)
+
+    def _mech_open(self, *args, **kwargs):
+        return self._open_abortable(mechanize.Browser._mech_open, *args, **kwargs)
+
+    def _open_abortable(self, open, *args, **kwargs):
+        """
+        Call *open* to make a request which can be interrupted by
+        :func:`abort`: the sockets it opens are registered.
+        """
+        if self.aborted:
+            raise BrowserAborted('Request aborted')
+
+        previous = getattr(_context, 'browser', None)
+        _context.browser = self
+        try:
+            return open(self, *args, **kwargs)
+        except Exception, e:
+            # When the socket is closed, the error may be anything.
+            if self.aborted:
+                raise BrowserAborted('Request aborted (%s)' % e)
+            raise
+        finally:
+            _context.browser = previous
+
+    def register_socket(self, sock):
+        """
+        Register the socket of a connection opened by this browser, to be
+        able to close it with :func:`abort`.
+        """
+        self.sockets.add(sock)
+        if self.aborted:
+            self.abort()
+
+    def abort(self):
+        """
+        Abort the pending request, and refuse every new one until
+        :func:`clear_abort` is called.
+
+        It is safe to call this method from another thread than the one
+        which uses the browser.
+        """
+        self.aborted = True
+        self.abort_event.set()
+        for sock in list(self.sockets):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        # Connections whose socket has been shut down must not be reused,
+        # by this browser or by another one sharing the pool.
+        if self.connections is not None:
+            self.connections.purge()
+
+    def clear_abort(self):
+        """
+        Accept requests again after :func:`abort`.
+        """
+        self.aborted = False
+        self.abort_event.clear()
+
     def _openurl(self, *args, **kwargs):
         return mechanize.Browser.open(self, *args, **kwargs)
 
     @check_location
-    @retry(BrowserHTTPError, tries=3)
+    @retry_on_error
     def openurl(self, *args, **kwargs):
         """
         Open an URL but do not create a Page object.
@@ -279,12 +489,91 @@ class StandardBrowser(mechanize.Browser):
                 self.home()
                 return self._openurl(*args, **kwargs)
             elif if_fail == 'raise':
-                raise self.get_exception(e)('%s (url="%s")' % (e, args and args[0] or 'None'))
+                raise self.get_error(e, args and args[0] or 'None')
             else:
                 return None
         except BrowserRetry, e:
             return self._openurl(*args, **kwargs)
 
+    def open_stream(self, url, offset=0, headers=None, end=None):
+        """
+        Open an URL to read a large body by chunks.
+
+        Unlike :func:`openurl`, the response is not kept in memory to be
+        seekable, and the state of the browser (current page, history) is not
+        changed, so it can be called by several threads at once.
+
+        :param url: URL to open
+        :type url: str
+        :param offset: position in the body where to start, requested with a
+                       Range header
+        :type offset: int
+        :param headers: additional headers
+        :type headers: dict
+        :param end: position of the last byte to get, to get only a segment
+                    of the body
+        :type end: int
+        :returns: the response, and the position where its body starts (0 if
+                  the server does not support ranges)
+        :rtype: tuple
+        """
+        request_headers = dict(headers or {})
+        ranged = offset > 0 or end is not None
+        if ranged:
+            request_headers['Range'] = 'bytes=%d-%s' % (offset, end if end is not None else '')
+        self.logger.debug('Opening stream "%s" at %d' % (url, offset))
+
+        request = self.request_class(url, None, request_headers)
+        # The body must not be kept by the HTTP cache.
+        request.stream = True
+        try:
+            response = self._open_abortable(mechanize.UserAgentBase.open, request, None, self.DEFAULT_TIMEOUT)
+        except (urllib2.HTTPError, urllib2.URLError, BadStatusLine, ssl.SSLError), e:
+            if offset > 0 and isinstance(e, urllib2.HTTPError) and e.code == 416:
+                # Requested range not satisfiable
+                return self.open_stream(url, 0, headers)
+            raise self.get_error(e, url)
+
+        if ranged and response.code != 206:
+            offset = 0
+        return response, offset
+
+    def open_blob(self, url, headers=None):
+        """
+        Get the body of an URL as a :class:`weboob.capabilities.base.Blob`.
+
+        The URL is opened only when the blob is read the first time, and its
+        body is then read by chunks.
+
+        :param url: URL to open
+        :type url: str
+        :param headers: additional headers
+        :type headers: dict
+        :rtype: :class:`weboob.capabilities.base.Blob`
+        """
+        def opener():
+            # The blob may be read by another thread than the one which uses
+            # the browser.
+            with self.lock:
+                response, offset = self.open_stream(url, headers=headers)
+            return response
+        return Blob.from_stream(opener)
+
+    def get_error(self, e, url):
+        """
+        Get the exception to raise when a request has failed.
+
+        The status code of an HTTP error is given by the *status* attribute
+        of the exception, and the delay asked by its Retry-After header by the
+        *retry_after* attribute.
+        """
+        error = self.get_exception(e)('%s (url="%s")' % (e, url))
+        if isinstance(e, urllib2.HTTPError):
+            error.status = e.code
+            if e.info() is not None:
+                error.retry_after = parse_retry_after(e.info().getheader('Retry-After'))
+        return error
+
     def get_exception(self, e):
         if isinstance(e, urllib2.HTTPError) and hasattr(e, 'getcode'):
             if e.getcode() in (404, 403):
@@ -442,6 +731,87 @@ class StandardBrowser(mechanize.Browser):
             raise ssl.SSLError()
 
 
+class PagesIndex(object):
+    """
+    Compiled version of a :attr:`BaseBrowser.PAGES` table.
+
+    Regexps are compiled once, and the literal prefix of anchored regexps is
+    checked before trying to match them. Entries are tried in the order of
+    the table, and the first match wins.
+
+    :param pages: table of regexp -> page class or (page class, parser)
+    :type pages: :class:`dict`
+    """
+    _METACHARS = '.^$*+?{}[]\\|()'
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.size = len(pages)
+        self.entries = []
+        for key, value in pages.items():
+            prefix = ''
+            if isinstance(key, basestring):
+                if not key.startswith('^') and not key.endswith('$'):
+                    key = '^%s$' % key
+                if key.startswith('^'):
+                    prefix = self.literal_prefix(key[1:])
+                regexp = re.compile(key)
+            else:
+                regexp = key
+
+            if isinstance(value, (list, tuple)):
+                pageCls, parser = value[0], value[1]
+            else:
+                pageCls, parser = value, None
+            self.entries.append((prefix, regexp.search, pageCls, parser))
+
+    def is_valid(self, pages):
+        """
+        Check if the index is still the one of a table.
+        """
+        return self.pages is pages and self.size == len(pages)
+
+    @classmethod
+    def literal_prefix(cls, pattern):
+        """
+        Get the characters every string matched by an anchored regexp
+        starts with.
+        """
+        if '|' in pattern:
+            return ''
+
+        prefix = []
+        i = 0
+        while i < len(pattern):
+            c = pattern[i]
+            if c == '\\' and i + 1 < len(pattern) and not pattern[i+1].isalnum():
+                c = pattern[i+1]
+                i += 1
+            elif c in cls._METACHARS:
+                if c in '*?{' and prefix:
+                    # The previous character is optional or repeated.
+                    prefix.pop()
+                break
+            prefix.append(c)
+            i += 1
+        return ''.join(prefix)
+
+    def find(self, url):
+        """
+        Find the page which handles an URL.
+
+        :returns: a (page class, parser, match object) tuple, or None if not
+                  found. The parser is None if the table doesn't specify it.
+        """
+        for prefix, search, pageCls, parser in self.entries:
+            if prefix and not url.startswith(prefix):
+                continue
+            m = search(url)
+            if m:
+                return pageCls, parser, m
+        return None
+
+
 class BaseBrowser(StandardBrowser):
     """
     Base browser class to navigate on a website.
@@ -468,6 +838,11 @@ class BaseBrowser(StandardBrowser):
     :type get_homme: bool
     :param responses_dirname: directory to store responses
     :type responses_dirname: str
+    :param cache: HTTP cache to use. None to disable it
+    :type cache: :class:`weboob.tools.browser.cache.HTTPCache`
+    :param retry_policy: policy of retries of failed requests (default is
+                         built by :attr:`RETRY_POLICY`)
+    :type retry_policy: :class:`weboob.tools.browser.retry.RetryPolicy`
     """
 
     # ------ Class attributes --------------------------------------
@@ -475,6 +850,8 @@ class BaseBrowser(StandardBrowser):
     DOMAIN = None
     PROTOCOL = 'http'
     PAGES = {}
+    # PagesIndex of PAGES, built on first use
+    _pages_index = None
 
     # SHA-256 hash of server certificate. If set, it will automatically check it,
     # and raise a SSLError exception if it doesn't match.
@@ -511,8 +888,9 @@ class BaseBrowser(StandardBrowser):
 
     def __init__(self, username=None, password=None, firefox_cookies=None,
                  parser=None, history=NoHistory(), proxy=None, logger=None,
-                 factory=None, get_home=True, responses_dirname=None):
-        StandardBrowser.__init__(self, firefox_cookies, parser, history, proxy, logger, factory, responses_dirname)
+                 factory=None, get_home=True, responses_dirname=None, cache=None, retry_policy=None):
+        StandardBrowser.__init__(self, firefox_cookies, parser, history, proxy, logger, factory, responses_dirname, cache,
+                                 retry_policy)
         self.page = None
         self.last_update = 0.0
         self.username = username
@@ -569,7 +947,7 @@ class BaseBrowser(StandardBrowser):
             self._change_location(mechanize.Browser.follow_link(self, *args, **kwargs))
         except (mechanize.response_seek_wrapper, urllib2.HTTPError, urllib2.URLError, BadStatusLine, ssl.SSLError), e:
             self.page = None
-            raise self.get_exception(e)('%s (url="%s")' % (e, args and args[0] or 'None'))
+            raise self.get_error(e, args and args[0] or 'None')
         except (mechanize.BrowserStateError, BrowserRetry), e:
             self.home()
             raise BrowserUnavailable(e)
@@ -578,7 +956,7 @@ class BaseBrowser(StandardBrowser):
         return mechanize.Browser.open_novisit(self, *args, **kwargs)
 
     @check_location
-    @retry(BrowserHTTPError, tries=3)
+    @retry_on_error
     def location(self, *args, **kwargs):
         """
         Change location of browser on an URL.
@@ -604,7 +982,7 @@ class BaseBrowser(StandardBrowser):
                 self.location(*keep_args, **keep_kwargs)
         except (mechanize.response_seek_wrapper, urllib2.HTTPError, urllib2.URLError, BadStatusLine, ssl.SSLError), e:
             self.page = None
-            raise self.get_exception(e)('%s (url="%s")' % (e, args and args[0] or 'None'))
+            raise self.get_error(e, args and args[0] or 'None')
         except mechanize.BrowserStateError:
             self.home()
             self.location(*keep_args, **keep_kwargs)
@@ -642,6 +1020,17 @@ class BaseBrowser(StandardBrowser):
                 response.set_data(data)
         mechanize.Browser._set_response(self, response, *args, **kwargs)
 
+    def _get_pages_index(self):
+        index = self._pages_index
+        if index is None or not index.is_valid(self.PAGES):
+            index = PagesIndex(self.PAGES)
+            # Keep it with the table, which is usually a class attribute.
+            if 'PAGES' in self.__dict__:
+                self._pages_index = index
+            else:
+                self.__class__._pages_index = index
+        return index
+
     def _change_location(self, result, no_login=False):
         """
         This function is called when we have moved to a page, to load a Page
@@ -649,38 +1038,21 @@ class BaseBrowser(StandardBrowser):
         """
 
         # Find page from url
-        pageCls = None
-        parser = None
-        page_groups = None
-        page_group_dict = None
-        for key, value in self.PAGES.items():
-            if isinstance(key, basestring):
-                if not key.startswith('^') and not key.endswith('$'):
-                    regexp = re.compile('^%s$' % key)
-                else:
-                    regexp = re.compile(key)
-            else:
-                regexp = key
-            m = regexp.search(result.geturl())
-            if m:
-                if isinstance(value, (list, tuple)):
-                    pageCls = value[0]
-                    parser = value[1]
-                else:
-                    pageCls = value
-                    parser = self.parser
-
-                page_groups = m.groups()
-                page_group_dict = m.groupdict()
-                break
+        found = self._get_pages_index().find(result.geturl())
 
         # Not found
-        if not pageCls:
+        if not found:
             self.page = None
             self.logger.warning('There isn\'t any page corresponding to URL %s' % result.geturl())
             self.save_response(result, warning=True)
             return
 
+        pageCls, parser, m = found
+        if parser is None:
+            parser = self.parser
+        page_groups = m.groups()
+        page_group_dict = m.groupdict()
+
         self.logger.debug('[user_id=%s] Went on %s' % (self.username, result.geturl()))
         self.last_update = time.time()
 
@@ -718,6 +1090,18 @@ ssl.wrap_socketold = ssl.wrap_socket
 ssl.wrap_socket = mywrap_socket
 
 
+def register_socket(sock):
+    browser = getattr(_context, 'browser', None)
+    if browser is not None:
+        browser.register_socket(sock)
+
+
+class HTTPConnection2(httplib.HTTPConnection):
+    def connect(self):
+        HTTPConnection2.__bases__[0].connect(self)
+        register_socket(self.sock)
+
+
 class HTTPSConnection2(httplib.HTTPSConnection):
     _HOSTS = {}
     _PROTOCOLS = [ssl.PROTOCOL_TLSv1, ssl.PROTOCOL_SSLv3]
@@ -735,6 +1119,7 @@ class HTTPSConnection2(httplib.HTTPSConnection):
         for proto in self._get_protocols():
             sock = self._create_connection()
             try:
+                register_socket(sock)
                 self.sock = ssl.wrap_socket(sock, self.key_file, self.cert_file, ssl_version=proto)
                 self._HOSTS['%s:%s' % (self.host, self.port)] = [proto]
                 return
@@ -742,4 +1127,5 @@ class HTTPSConnection2(httplib.HTTPSConnection):
                 sock.close()
         raise e
 
+httplib.HTTPConnection = HTTPConnection2
 httplib.HTTPSConnection = HTTPSConnection2
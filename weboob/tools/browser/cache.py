@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2013 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+from __future__ import with_statement
+
+from email.utils import parsedate_tz, mktime_tz
+import hashlib
+import mimetools
+import os
+from StringIO import StringIO
+from threading import RLock
+import time
+
+import mechanize
+from mechanize._response import closeable_response
+
+from weboob.tools.json import json
+from weboob.tools.log import getLogger
+
+
+__all__ = ['HTTPCache', 'HTTPCacheProcessor']
+
+
+class CacheEntry(object):
+    """
+    Stored response.
+    """
+    def __init__(self, url, code, msg, headers, stored_at):
+        self.url = url
+        self.code = code
+        self.msg = msg
+        self.headers = headers
+        self.stored_at = stored_at
+
+        message = self.get_message()
+        self.etag = message.getheader('ETag')
+        self.last_modified = message.getheader('Last-Modified')
+        self.expires = self.get_expires(message, stored_at)
+
+    def get_message(self):
+        return mimetools.Message(StringIO(self.headers))
+
+    @staticmethod
+    def get_expires(message, stored_at):
+        """
+        Get the time until which the response is fresh, or None if it has to
+        be revalidated.
+        """
+        cache_control = [v.strip().lower() for v in message.getheader('Cache-Control', '').split(',')]
+        if 'no-cache' in cache_control or 'must-revalidate' in cache_control:
+            return None
+        for value in cache_control:
+            if value.startswith('max-age='):
+                try:
+                    return stored_at + int(value[8:])
+                except ValueError:
+                    return None
+
+        expires = message.getheader('Expires')
+        if expires:
+            date = parsedate_tz(expires)
+            if date is not None:
+                return mktime_tz(date)
+        return None
+
+    @classmethod
+    def is_cacheable(klass, request, response):
+        """
+        Check if a response can be stored.
+
+        The cache is shared by every backends, so responses which may be
+        specific to an account are not stored: private ones, and answers to
+        requests carrying cookies or credentials.
+        """
+        if response.code != 200:
+            return False
+        if request.has_header('Cookie') or request.has_header('Authorization'):
+            return False
+
+        message = response.info()
+        cache_control = [v.strip().lower() for v in message.getheader('Cache-Control', '').split(',')]
+        if 'no-store' in cache_control or 'private' in cache_control:
+            return False
+        vary = [v.strip().lower() for v in message.getheader('Vary', '').split(',') if v.strip()]
+        if vary and vary != ['accept-encoding']:
+            return False
+
+        return bool(message.getheader('ETag') or message.getheader('Last-Modified') or
+                    klass.get_expires(message, time.time()))
+
+    def is_fresh(self):
+        return self.expires is not None and time.time() < self.expires
+
+    def to_dict(self):
+        return {'url': self.url, 'code': self.code, 'msg': self.msg,
+                'headers': self.headers, 'stored_at': self.stored_at}
+
+
+class HTTPCache(object):
+    """
+    On-disk cache of HTTP responses, honoring Cache-Control, Expires, ETag
+    and Last-Modified headers.
+
+    Each response is stored in two files named after the hash of its URL.
+    When the size of stored bodies exceeds *max_size*, the least recently
+    used responses are removed.
+
+    :param path: directory where responses are stored
+    :type path: str
+    :param max_size: maximum size in bytes of the stored bodies
+    :type max_size: int
+    """
+    # Caches by path, to share the size accounting between browsers
+    _instances = {}
+    _instances_lock = RLock()
+
+    def __init__(self, path, max_size=50*1024*1024):
+        self.logger = getLogger('httpcache')
+        self.path = path
+        self.max_size = max_size
+        self.mutex = RLock()
+        self.size = None
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    @classmethod
+    def get(klass, path, max_size=50*1024*1024):
+        """
+        Get the cache of a directory, shared by every browsers of the process.
+        """
+        with klass._instances_lock:
+            if path not in klass._instances:
+                klass._instances[path] = klass(path, max_size)
+            return klass._instances[path]
+
+    def _filename(self, url):
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        return os.path.join(self.path, hashlib.sha1(url).hexdigest())
+
+    def lookup(self, url):
+        """
+        Get the stored entry of an URL, or None.
+        """
+        filename = self._filename(url)
+        try:
+            with open(filename + '.meta', 'r') as f:
+                meta = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if meta['url'] != url or not os.path.exists(filename + '.body'):
+            return None
+        return CacheEntry(**dict((str(k), v) for k, v in meta.iteritems()))
+
+    def open_body(self, entry):
+        """
+        Open the stored body of an entry, and mark it as recently used.
+        """
+        filename = self._filename(entry.url) + '.body'
+        os.utime(filename, None)
+        return open(filename, 'rb')
+
+    def store(self, url, code, msg, headers, data):
+        """
+        Store a response.
+
+        :rtype: :class:`CacheEntry`
+        """
+        # Cookies are handled by the browser, do not replay them.
+        headers = ''.join(line for line in headers.splitlines(True)
+                          if not line.lower().startswith('set-cookie'))
+        entry = CacheEntry(url, code, msg, headers, time.time())
+        filename = self._filename(url)
+        with self.mutex:
+            old_size = self._body_size(filename)
+            with open(filename + '.body', 'wb') as f:
+                f.write(data)
+            self._write_meta(filename, entry)
+            if self.size is not None:
+                self.size += len(data) - old_size
+            self._evict()
+        return entry
+
+    def refresh(self, entry, headers):
+        """
+        Update an entry after a "304 Not Modified" response.
+        """
+        message = entry.get_message()
+        for name, value in headers.items():
+            if name.lower() in ('cache-control', 'expires', 'etag', 'last-modified', 'date'):
+                message[name] = value
+        entry = CacheEntry(entry.url, entry.code, entry.msg, ''.join(message.headers), time.time())
+        with self.mutex:
+            self._write_meta(self._filename(entry.url), entry)
+        return entry
+
+    def _write_meta(self, filename, entry):
+        tmp = filename + '.meta.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(entry.to_dict(), f)
+        os.rename(tmp, filename + '.meta')
+
+    def _body_size(self, filename):
+        try:
+            return os.path.getsize(filename + '.body')
+        except OSError:
+            return 0
+
+    def _evict(self):
+        if self.size is not None and self.size <= self.max_size:
+            return
+
+        bodies = []
+        for name in os.listdir(self.path):
+            if name.endswith('.body'):
+                filename = os.path.join(self.path, name)
+                try:
+                    st = os.stat(filename)
+                except OSError:
+                    continue
+                bodies.append((st.st_mtime, st.st_size, filename[:-5]))
+
+        self.size = sum(size for mtime, size, filename in bodies)
+        bodies.sort()
+        while self.size > self.max_size and bodies:
+            mtime, size, filename = bodies.pop(0)
+            for ext in ('.meta', '.body'):
+                try:
+                    os.remove(filename + ext)
+                except OSError:
+                    pass
+            self.size -= size
+
+    def clear(self):
+        with self.mutex:
+            for name in os.listdir(self.path):
+                if name.endswith('.meta') or name.endswith('.body'):
+                    os.remove(os.path.join(self.path, name))
+            self.size = 0
+
+
+class HTTPCacheProcessor(mechanize.BaseHandler):
+    """
+    Handler which serves fresh responses from the ``cache`` of the browser,
+    and revalidates stale ones with conditional requests.
+
+    Only GET requests without data, cookies or credentials are concerned, and
+    not streams opened by
+    :func:`weboob.tools.browser.browser.StandardBrowser.open_stream`.
+    """
+    # Before HTTP handlers, and before HTTPErrorProcessor which would raise
+    # an error on "304 Not Modified" responses.
+    handler_order = 400
+
+    def _get_cache(self, req):
+        cache = getattr(self.parent, 'cache', None)
+        if cache is None or req.has_data() or req.get_method() != 'GET' or \
+           getattr(req, 'stream', False) or req.has_header('Authorization') or \
+           self._has_cookies(req):
+            return None
+        return cache
+
+    def _has_cookies(self, req):
+        # This processor runs before the cookies one, so the Cookie header is
+        # not set yet: look for the cookies which will be sent.
+        handler = getattr(self.parent, '_ua_handlers', {}).get('_cookies')
+        if handler is None:
+            return req.has_header('Cookie')
+        return req.has_header('Cookie') or bool(handler.cookiejar.cookies_for_request(req))
+
+    def http_request(self, req):
+        req.cache_entry = None
+        cache = self._get_cache(req)
+        if cache is None:
+            return req
+
+        entry = cache.lookup(req.get_full_url())
+        if entry is None:
+            return req
+
+        req.cache_entry = entry
+        if not entry.is_fresh():
+            if entry.etag:
+                req.add_unredirected_header('If-None-Match', entry.etag)
+            if entry.last_modified:
+                req.add_unredirected_header('If-Modified-Since', entry.last_modified)
+        return req
+
+    def http_open(self, req):
+        entry = getattr(req, 'cache_entry', None)
+        if entry is not None and entry.is_fresh():
+            return self._make_response(entry)
+        return None
+
+    def http_response(self, req, response):
+        cache = self._get_cache(req)
+        if cache is None or getattr(response, 'from_cache', False):
+            return response
+
+        entry = getattr(req, 'cache_entry', None)
+        if response.code == 304 and entry is not None:
+            response.close()
+            return self._make_response(cache.refresh(entry, response.info()))
+
+        if CacheEntry.is_cacheable(req, response):
+            data = response.read()
+            response.close()
+            headers = response.info()
+            cache.store(req.get_full_url(), response.code, response.msg, ''.join(headers.headers), data)
+            response = closeable_response(StringIO(data), headers, response.geturl(), response.code, response.msg)
+        return response
+
+    def _make_response(self, entry):
+        response = closeable_response(self.parent.cache.open_body(entry), entry.get_message(),
+                                      entry.url, entry.code, entry.msg)
+        response.from_cache = True
+        return response
+
+    https_request = http_request
+    https_open = http_open
+    https_response = http_response
+
+
+def test():
+    import shutil
+    import tempfile
+
+    from mechanize._response import test_response
+
+    path = tempfile.mkdtemp()
+    try:
+        cache = HTTPCache(path, max_size=10)
+        request = mechanize.Request('http://example.org/a')
+
+        # Freshness given by max-age, or by Expires.
+        response = test_response('data', [('Cache-Control', 'max-age=60')])
+        assert CacheEntry.is_cacheable(request, response)
+        entry = cache.store('http://example.org/a', 200, 'OK', ''.join(response.info().headers), 'data')
+        assert entry.is_fresh()
+        entry = cache.lookup('http://example.org/a')
+        assert entry.is_fresh()
+        assert cache.open_body(entry).read() == 'data'
+        entry.expires = time.time() - 1
+        assert not entry.is_fresh()
+        entry = CacheEntry('http://example.org/b', 200, 'OK', 'Expires: Thu, 01 Jan 1970 00:00:00 GMT\r\n', time.time())
+        assert not entry.is_fresh()
+
+        # A stale entry is revalidated, and refreshed by a 304 response.
+        entry = cache.store('http://example.org/c', 200, 'OK', 'ETag: "x"\r\nCache-Control: no-cache\r\n', 'x')
+        assert entry.etag == '"x"' and not entry.is_fresh()
+        entry = cache.refresh(entry, {'Cache-Control': 'max-age=60'})
+        assert entry.is_fresh() and entry.etag == '"x"'
+
+        # Responses specific to a user are not stored.
+        assert not CacheEntry.is_cacheable(request, test_response('data', [('Cache-Control', 'private, max-age=60')]))
+        assert not CacheEntry.is_cacheable(request, test_response('data', [('Cache-Control', 'no-store')]))
+        assert not CacheEntry.is_cacheable(request, test_response('data', []))
+        request.add_header('Cookie', 'sid=1')
+        assert not CacheEntry.is_cacheable(request, response)
+
+        # The least recently used bodies are evicted above max_size.
+        cache.max_size = 100
+        for i, name in enumerate(('a', 'c', 'd', 'e', 'f')):
+            url = 'http://example.org/' + name
+            if name in ('d', 'e', 'f'):
+                cache.store(url, 200, 'OK', 'Cache-Control: max-age=60\r\n', '1234')
+            last_used = time.time() - 100 + i
+            os.utime(cache._filename(url) + '.body', (last_used, last_used))
+        cache.max_size = 10
+        cache.size = None
+        cache._evict()
+        assert cache.size == 8
+        assert [name for name in ('a', 'c', 'd', 'e', 'f')
+                if cache.lookup('http://example.org/' + name) is not None] == ['e', 'f']
+    finally:
+        shutil.rmtree(path)
@@ -0,0 +1,453 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2013 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+from __future__ import with_statement
+
+import httplib
+import os
+from Queue import Queue
+import re
+from threading import Thread, Lock
+import time
+
+from weboob.tools.browser.browser import BrowserUnavailable, BrowserHTTPNotFound
+from weboob.tools.json import json
+from weboob.tools.log import getLogger
+
+
+__all__ = ['DownloadError', 'BandwidthLimiter', 'Download', 'Downloader']
+
+
+class DownloadError(Exception):
+    """
+    A download can not be finished.
+    """
+
+
+class BandwidthLimiter(object):
+    """
+    Limit of the bandwidth shared by several transfers.
+
+    :param rate: maximum rate in bytes per second
+    :type rate: int
+    :param burst: delay in seconds during which an unused bandwidth can be
+                  used later
+    :type burst: float
+    """
+    def __init__(self, rate, burst=1.0):
+        self.rate = float(rate)
+        self.burst = burst
+        self.mutex = Lock()
+        # Time at which the bandwidth is available again.
+        self.available_at = 0
+
+    def consume(self, size):
+        """
+        Wait until *size* bytes can be transferred.
+        """
+        with self.mutex:
+            now = time.time()
+            self.available_at = max(self.available_at, now - self.burst) + size / self.rate
+            delay = self.available_at - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Segment(object):
+    """
+    Range of bytes of a file, from *start* to *end* included.
+    """
+    def __init__(self, start, end, done=0):
+        self.start = start
+        self.end = end
+        self.done = done
+
+    @property
+    def position(self):
+        return self.start + self.done
+
+    @property
+    def remaining(self):
+        return self.end - self.position + 1
+
+    def to_list(self):
+        return [self.start, self.end, self.done]
+
+
+class Download(object):
+    """
+    Download of an URL in a file.
+
+    The body is written in a ".part" file, renamed once complete. When the
+    website supports ranges, the body is downloaded in several segments at
+    once, and the progress of segments is saved in a ".part.json" file, so
+    an interrupted download is resumed.
+
+    :param browser: browser used to open the URL, with its cookies
+    :type browser: :class:`weboob.tools.browser.StandardBrowser`
+    :param url: URL to download
+    :type url: str
+    :param dest: path of the file to write
+    :type dest: str
+    :param headers: additional headers
+    :type headers: dict
+    :param lock: lock held while the browser opens a connection, when it is
+                 shared with other threads (for example the backend owning
+                 it)
+    """
+    def __init__(self, browser, url, dest, headers=None, lock=None):
+        self.browser = browser
+        self.url = url
+        self.dest = dest
+        self.headers = headers
+        self.lock = lock
+        self.part = dest + '.part'
+        self.state_file = self.part + '.json'
+
+        self.mutex = Lock()
+        # Total size, or None if it is unknown.
+        self.size = None
+        self.segments = []
+        # Number of segments which are not finished.
+        self.pending = 0
+        # Size already downloaded when this download has started.
+        self.resumed = 0
+        self.started_at = None
+        self.saved_at = 0
+        self.finished = False
+        self.error = None
+
+    @property
+    def downloaded(self):
+        """
+        Number of downloaded bytes.
+        """
+        return sum(segment.done for segment in self.segments)
+
+    def load_state(self):
+        """
+        Get segments saved by a previous download of the same size.
+        """
+        if not os.path.exists(self.part):
+            return None
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if state.get('size') != self.size:
+            return None
+        return [Segment(*segment) for segment in state['segments']]
+
+    def save_state(self):
+        if self.size is None:
+            return
+        with self.mutex:
+            state = {'url': self.url, 'size': self.size,
+                     'segments': [segment.to_list() for segment in self.segments]}
+            self.saved_at = time.time()
+        tmp = self.state_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.rename(tmp, self.state_file)
+
+    def __repr__(self):
+        return '<Download url=%r dest=%r>' % (self.url, self.dest)
+
+
+class Downloader(object):
+    """
+    Download files with several connections at once.
+
+    Every download given to :func:`add` is done by :func:`run`, with at most
+    *connections* connections for all of them. A file is split in at most
+    *segments* segments, so big files are downloaded with several
+    connections, and several small files are downloaded at once.
+
+    :param connections: maximum number of simultaneous connections
+    :type connections: int
+    :param segments: maximum number of segments of a file (default is
+                     *connections*)
+    :type segments: int
+    :param bandwidth: maximum rate in bytes per second of all downloads
+    :type bandwidth: int
+    :param progress: callable called with a :class:`Download` when it
+                     progresses or is finished
+    :type progress: callable
+    """
+    CHUNK_SIZE = 64*1024
+    # Files are not split in segments smaller than this size.
+    MIN_SEGMENT_SIZE = 1024*1024
+    # Number of times a connection is opened again after a failure.
+    RETRIES = 3
+    # Delay in seconds between two saves of the progress of a download.
+    SAVE_INTERVAL = 5
+    # Minimum delay in seconds between two calls to progress.
+    PROGRESS_INTERVAL = 0.5
+
+    def __init__(self, connections=4, segments=None, bandwidth=None, progress=None):
+        self.logger = getLogger('downloader')
+        self.connections = max(1, connections)
+        self.max_segments = max(1, segments or self.connections)
+        self.limiter = BandwidthLimiter(bandwidth) if bandwidth else None
+        self.progress = progress
+
+        self.downloads = []
+        self.queue = Queue()
+        self.mutex = Lock()
+        # Number of jobs which are queued or running.
+        self.jobs = 0
+        self.aborted = False
+        self.progress_at = {}
+
+    def add(self, browser, url, dest, headers=None, lock=None):
+        """
+        Add a file to download.
+
+        Connections are opened by several threads at once; if the browser is
+        also used elsewhere, *lock* is held while it opens them.
+
+        :rtype: :class:`Download`
+        """
+        download = Download(browser, url, dest, headers, lock)
+        self.downloads.append(download)
+        self._queue(self._start, download)
+        return download
+
+    def run(self):
+        """
+        Download the added files, and return once every one is finished.
+
+        When it is interrupted, the progress of downloads is saved to resume
+        them later.
+
+        :returns: downloads which have failed
+        :rtype: list[:class:`Download`]
+        """
+        threads = []
+        for n in xrange(self.connections):
+            thread = Thread(target=self._work, name='downloader')
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        try:
+            while True:
+                with self.mutex:
+                    if self.jobs == 0:
+                        break
+                # Sleep instead of joining the queue, to be interruptible.
+                time.sleep(0.2)
+        except BaseException:
+            self.aborted = True
+            raise
+        finally:
+            for thread in threads:
+                self.queue.put(None)
+            for thread in threads:
+                while thread.isAlive():
+                    thread.join(1)
+            if self.aborted:
+                for download in self.downloads:
+                    if not download.finished:
+                        download.save_state()
+
+        return [download for download in self.downloads if download.error is not None]
+
+    def _queue(self, function, *args):
+        with self.mutex:
+            self.jobs += 1
+        self.queue.put((function, args))
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+
+            function, args = job
+            try:
+                if not self.aborted:
+                    function(*args)
+            except Exception, e:
+                self.logger.exception(e)
+                # Every job is about the download given first.
+                self._finish(args[0], e)
+            finally:
+                with self.mutex:
+                    self.jobs -= 1
+
+    def _start(self, download):
+        """
+        Get the size of the file and if the website supports ranges, to
+        split it in segments.
+        """
+        download.started_at = time.time()
+        if os.path.exists(download.dest) and not os.path.exists(download.part):
+            self.logger.info('%s is already downloaded' % download.dest)
+            self._finish(download)
+            return
+
+        try:
+            response, start = self._open(download, 0, end=0)
+        except BrowserUnavailable, e:
+            self._finish(download, e)
+            return
+
+        if response.code != 206:
+            # The whole body is given, without support of ranges.
+            size = response.info().getheader('Content-Length')
+            download.size = int(size) if size and size.isdigit() else None
+            download.segments = [Segment(0, download.size - 1 if download.size is not None else None)]
+            download.pending = 1
+            self._queue(self._fetch_stream, download, response)
+            return
+
+        response.read()
+        response.close()
+        m = re.match(r'bytes\s+\d+-\d+/(\d+)', response.info().getheader('Content-Range', ''))
+        if not m:
+            self._finish(download, DownloadError('Unable to get size of %s' % download.url))
+            return
+        download.size = int(m.group(1))
+
+        segments = download.load_state()
+        if segments is None:
+            count = min(self.max_segments, max(1, download.size // self.MIN_SEGMENT_SIZE))
+            length = download.size // count
+            segments = [Segment(i * length, (i + 1) * length - 1) for i in xrange(count)]
+            segments[-1].end = download.size - 1
+            with open(download.part, 'wb') as f:
+                f.truncate(download.size)
+        download.segments = segments
+        download.resumed = download.downloaded
+        download.save_state()
+
+        todo = [segment for segment in segments if segment.remaining > 0]
+        download.pending = len(todo)
+        if not todo:
+            self._finish(download)
+        for segment in todo:
+            self._queue(self._fetch_segment, download, segment)
+
+    def _fetch_segment(self, download, segment):
+        tries = 0
+        error = None
+        # Stop once the download has failed because of another segment.
+        while segment.remaining > 0 and not self.aborted and not download.finished:
+            try:
+                response, start = self._open(download, segment.position, end=segment.end)
+                if response.code != 206:
+                    response.close()
+                    raise DownloadError('Ranges are not supported anymore by %s' % download.url)
+
+                # Without buffering, so saved progress is always on disk.
+                with open(download.part, 'r+b', 0) as f:
+                    f.seek(segment.position)
+                    self._copy(download, segment, response, f)
+                if segment.remaining > 0 and not self.aborted:
+                    raise DownloadError('Connection closed before the end of the segment')
+            except (BrowserUnavailable, DownloadError, IOError, httplib.HTTPException), e:
+                tries += 1
+                if isinstance(e, BrowserHTTPNotFound) or tries > self.RETRIES:
+                    error = e
+                    break
+                self.logger.warning('Unable to download %s at %d: %s' % (download.url, segment.position, e))
+                time.sleep(tries)
+
+        with download.mutex:
+            download.pending -= 1
+            if error is not None:
+                download.error = error
+            finished = download.pending == 0
+        if finished:
+            self._finish(download, download.error)
+
+    def _open(self, download, offset, end):
+        if download.lock is None:
+            return download.browser.open_stream(download.url, offset, download.headers, end=end)
+        with download.lock:
+            return download.browser.open_stream(download.url, offset, download.headers, end=end)
+
+    def _fetch_stream(self, download, response):
+        segment = download.segments[0]
+        error = None
+        try:
+            with open(download.part, 'wb', 0) as f:
+                self._copy(download, segment, response, f)
+            if download.size is not None and segment.remaining > 0 and not self.aborted:
+                raise DownloadError('Connection closed before the end of the file')
+        except (BrowserUnavailable, DownloadError, IOError, httplib.HTTPException), e:
+            error = e
+        self._finish(download, error)
+
+    def _copy(self, download, segment, response, f):
+        try:
+            while not self.aborted:
+                if segment.end is None:
+                    size = self.CHUNK_SIZE
+                else:
+                    size = min(self.CHUNK_SIZE, segment.remaining)
+                    if size <= 0:
+                        break
+                chunk = response.read(size)
+                if not chunk:
+                    break
+                f.write(chunk)
+                with download.mutex:
+                    segment.done += len(chunk)
+                if self.limiter is not None:
+                    self.limiter.consume(len(chunk))
+                self._progress(download)
+        finally:
+            response.close()
+
+    def _progress(self, download, force=False):
+        now = time.time()
+        if now - download.saved_at > self.SAVE_INTERVAL:
+            download.save_state()
+        if self.progress is None:
+            return
+        with self.mutex:
+            if not force and now - self.progress_at.get(download, 0) < self.PROGRESS_INTERVAL:
+                return
+            self.progress_at[download] = now
+        self.progress(download)
+
+    def _finish(self, download, error=None):
+        if download.finished:
+            return
+        if error is None and self.aborted and \
+           (download.size is None or download.downloaded < download.size):
+            # Interrupted, the progress is saved by run().
+            return
+
+        download.error = error
+        if error is None and download.segments:
+            if download.size is None:
+                download.size = download.downloaded
+            os.rename(download.part, download.dest)
+            if os.path.exists(download.state_file):
+                os.remove(download.state_file)
+        elif error is not None:
+            self.logger.error('Unable to download %s: %s' % (download.url, error))
+            download.save_state()
+        download.finished = True
+        self._progress(download, force=True)
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2013 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+from __future__ import with_statement
+
+import httplib
+import select
+import socket
+from threading import Lock, RLock
+import time
+import urllib2
+
+import mechanize
+from mechanize._response import closeable_response
+
+
+__all__ = ['ConnectionPool', 'KeepAliveHTTPHandler', 'KeepAliveHTTPSHandler']
+
+
+# Requests which can be sent again when a reused connection fails.
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS', 'TRACE'])
+
+
+class ConnectionPool(object):
+    """
+    Idle HTTP connections, by scheme, host and port.
+
+    :param max_per_host: maximum number of idle connections kept for a host
+    :type max_per_host: int
+    :param idle_timeout: delay in seconds after which an idle connection is
+                         closed
+    :type idle_timeout: int
+    """
+    _shared = None
+    _shared_lock = Lock()
+
+    def __init__(self, max_per_host=2, idle_timeout=30):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.mutex = RLock()
+        self.idle = {}
+
+    @classmethod
+    def shared(cls, *args, **kwargs):
+        """
+        Get the pool shared by every browsers of the process.
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(*args, **kwargs)
+            return cls._shared
+
+    def get(self, key):
+        """
+        Get an idle connection, or None.
+        """
+        with self.mutex:
+            conns = self.idle.get(key)
+            while conns:
+                conn, last_used = conns.pop()
+                if time.time() - last_used < self.idle_timeout and not _is_dropped(conn):
+                    return conn
+                conn.close()
+
+    def put(self, key, conn):
+        """
+        Give back a connection which can be reused.
+        """
+        if _is_dropped(conn):
+            conn.close()
+            return
+        with self.mutex:
+            conns = self.idle.setdefault(key, [])
+            if len(conns) >= self.max_per_host:
+                conn.close()
+            else:
+                conns.append((conn, time.time()))
+
+    def purge(self):
+        """
+        Close idle connections which have been closed by the server, or
+        whose socket has been shut down by an aborted browser.
+        """
+        with self.mutex:
+            for key, conns in self.idle.items():
+                alive = []
+                for conn, last_used in conns:
+                    if _is_dropped(conn):
+                        conn.close()
+                    else:
+                        alive.append((conn, last_used))
+                self.idle[key] = alive
+
+    def clear(self):
+        """
+        Close every idle connections.
+        """
+        with self.mutex:
+            for conns in self.idle.itervalues():
+                for conn, last_used in conns:
+                    conn.close()
+            self.idle.clear()
+
+
+class ConnectionReleaser(object):
+    """
+    Give back the connection of a response to the pool once its body has been
+    read, or close it if the response is closed before.
+    """
+    def __init__(self, response, release, discard):
+        self.response = response
+        self.release = release
+        self.discard = discard
+        self.reading = False
+        self.finished = False
+        self._read = response.read
+        self._close = response.close
+        # HTTPResponse is an old-style class, so these attributes are used
+        # by its own methods.
+        response.read = self.read
+        response.close = self.close
+
+        if response.isclosed():
+            # No body
+            self.finish(True)
+
+    def finish(self, reusable):
+        if self.finished:
+            return
+        self.finished = True
+        if reusable and not self.response.will_close:
+            self.release()
+        else:
+            self.discard()
+
+    def read(self, *args):
+        self.reading = True
+        try:
+            data = self._read(*args)
+        finally:
+            self.reading = False
+        if self.response.isclosed():
+            self.finish(True)
+        return data
+
+    def close(self):
+        if not self.reading and not self.response.isclosed():
+            # The body has not been entirely read.
+            self.finish(False)
+        self._close()
+
+
+def keepalive_open(handler, http_class, req):
+    """
+    Make a request on a persistent connection, taken from the ``connections``
+    pool of the browser which owns the handler.
+    """
+    pool = getattr(handler.parent, 'connections', None)
+    if pool is None:
+        return mechanize.HTTPHandler.do_open.im_func(handler, http_class, req)
+
+    host_port = req.get_host()
+    if not host_port:
+        raise urllib2.URLError('no host given')
+
+    key = (req.get_type(), host_port, req._tunnel_host)
+    headers = dict(req.headers)
+    headers.update(req.unredirected_hdrs)
+    headers['Connection'] = 'keep-alive'
+    headers = dict((name.title(), val) for name, val in headers.iteritems())
+
+    # Requests made by mechanize without a timeout carry a sentinel instead.
+    timeout = req.timeout
+    if timeout is socket._GLOBAL_DEFAULT_TIMEOUT:
+        timeout = None
+
+    response = None
+    conn = pool.get(key)
+    if conn is not None:
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout if timeout is not None else socket.getdefaulttimeout())
+            # Let the browser abort requests made on this socket.
+            register = getattr(handler.parent, 'register_socket', None)
+            if register is not None:
+                register(conn.sock)
+        try:
+            conn.request(req.get_method(), req.get_selector(), req.data, headers)
+        except socket.error:
+            # The server has probably closed the connection, before the
+            # request has been entirely sent.
+            conn.close()
+        else:
+            try:
+                response = conn.getresponse()
+            except (socket.error, httplib.HTTPException), err:
+                conn.close()
+                # The request has been sent, so it is sent again only if it
+                # has no side effect, or if the server has closed the
+                # connection without answering.
+                if req.get_method() not in IDEMPOTENT_METHODS and not _no_response(err):
+                    raise urllib2.URLError(err)
+
+    if response is None:
+        conn = None
+        if timeout is not None:
+            try:
+                conn = http_class(host_port, timeout=timeout)
+            except TypeError:
+                pass
+        if conn is None:
+            conn = http_class(host_port)
+        conn.set_debuglevel(handler._debuglevel)
+        if req._tunnel_host:
+            conn.set_tunnel(req._tunnel_host)
+        try:
+            conn.request(req.get_method(), req.get_selector(), req.data, headers)
+            response = conn.getresponse()
+        except socket.error, err:
+            conn.close()
+            raise urllib2.URLError(err)
+
+    ConnectionReleaser(response, lambda: pool.put(key, conn), conn.close)
+
+    response.recv = response.read
+    fp = socket._fileobject(response, close=True)
+    return closeable_response(fp, response.msg, req.get_full_url(),
+                              response.status, response.reason)
+
+
+def _is_dropped(conn):
+    """
+    Check if a connection which is not used has been closed, by the server or
+    by a shutdown of its socket.
+    """
+    if conn.sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (select.error, socket.error, ValueError):
+        return True
+    # Nothing is expected to be read, except the end of the stream.
+    return bool(readable)
+
+
+def _no_response(error):
+    """
+    Check if a request has failed because the server has closed the
+    connection without sending any byte of the response.
+    """
+    if not isinstance(error, httplib.BadStatusLine):
+        return False
+    # Python < 2.7.4 gives repr('') as line.
+    return error.line in ('', "''") or error.line.startswith('No status line')
+
+
+class KeepAliveHTTPHandler(mechanize.HTTPHandler):
+    do_open = keepalive_open
+
+
+class KeepAliveHTTPSHandler(mechanize.HTTPSHandler):
+    do_open = keepalive_open
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2013 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+from __future__ import with_statement
+
+from threading import Lock
+import time
+
+import mechanize
+
+from weboob.tools.log import getLogger
+
+
+__all__ = ['TokenBucket', 'RateLimiter', 'RateLimitProcessor']
+
+
+class TokenBucket(object):
+    """
+    Token bucket: *rate* tokens are added per second, up to *burst* tokens,
+    and each request takes one.
+
+    When the bucket is empty, requests take tokens in advance and wait for
+    them, in their order of arrival.
+
+    :param rate: number of requests per second
+    :type rate: float
+    :param burst: number of requests which can be made at once
+    :type burst: int
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1, burst)
+        self.mutex = Lock()
+        self.tokens = float(self.burst)
+        self.updated = time.time()
+
+        # Metrics
+        self.requests = 0
+        self.waits = 0
+        self.waited = 0.0
+        self.max_wait = 0.0
+
+    def reserve(self):
+        """
+        Take a token.
+
+        :returns: delay in seconds to wait before making the request
+        :rtype: float
+        """
+        with self.mutex:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.requests += 1
+            if delay > 0:
+                self.waits += 1
+                self.waited += delay
+                self.max_wait = max(self.max_wait, delay)
+            return delay
+
+    def get_stats(self):
+        """
+        Get metrics of waits.
+
+        :returns: number of requests, number of requests which have waited,
+                  total and maximum delays in seconds
+        :rtype: dict
+        """
+        with self.mutex:
+            return {'rate': self.rate,
+                    'requests': self.requests,
+                    'waits': self.waits,
+                    'waited': self.waited,
+                    'max_wait': self.max_wait,
+                    'average_wait': self.waited / self.requests if self.requests else 0.0,
+                   }
+
+
+class RateLimiter(object):
+    """
+    Token buckets by domain.
+
+    The limiter given by :func:`shared` is used by every browsers of the
+    process, so several backends of the same module share the limit of
+    their website.
+    """
+    _shared = None
+
+    def __init__(self):
+        self.mutex = Lock()
+        self.buckets = {}
+
+    @classmethod
+    def shared(cls):
+        """
+        Get the limiter shared by every browsers of the process.
+        """
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    def get_bucket(self, domain, rate, burst=1):
+        """
+        Get the bucket of a domain.
+
+        If browsers ask different limits for the same domain, the lowest
+        one is used.
+
+        :rtype: :class:`TokenBucket`
+        """
+        with self.mutex:
+            bucket = self.buckets.get(domain)
+            if bucket is None:
+                bucket = self.buckets[domain] = TokenBucket(rate, burst)
+            elif rate < bucket.rate or burst < bucket.burst:
+                with bucket.mutex:
+                    bucket.rate = min(bucket.rate, float(rate))
+                    bucket.burst = min(bucket.burst, max(1, burst))
+                    bucket.tokens = min(bucket.tokens, bucket.burst)
+            return bucket
+
+    def get_stats(self):
+        """
+        Get metrics of waits by domain.
+
+        :rtype: dict
+        """
+        with self.mutex:
+            buckets = self.buckets.items()
+        return dict((domain, bucket.get_stats()) for domain, bucket in buckets)
+
+
+class RateLimitProcessor(mechanize.BaseHandler):
+    """
+    Handler which delays requests to respect the ``RATE_LIMIT`` of the
+    browser which owns it.
+
+    Requests are limited by the ``DOMAIN`` of the browser, or by their host
+    if it has no domain. Every request is counted, including redirections,
+    but not responses given by the HTTP cache without a request.
+    """
+    # After HTTPCacheProcessor, which tells if the cache will answer.
+    handler_order = 450
+
+    # Slices of sleeping time, to stop waiting when the browser is aborted.
+    SLEEP_SLICE = 0.5
+
+    def http_request(self, req):
+        browser = self.parent
+        rate = getattr(browser, 'RATE_LIMIT', None)
+        if not rate:
+            return req
+
+        entry = getattr(req, 'cache_entry', None)
+        if entry is not None and entry.is_fresh():
+            return req
+
+        domain = getattr(browser, 'DOMAIN', None) or req.get_host()
+        bucket = RateLimiter.shared().get_bucket(domain, rate, getattr(browser, 'RATE_LIMIT_BURST', 1))
+        delay = bucket.reserve()
+        if delay > 0:
+            getLogger('ratelimit', getattr(browser, 'logger', None)).debug(
+                'Waiting %.2f seconds before requesting %s' % (delay, domain))
+            end = time.time() + delay
+            # An aborted browser refuses the request once it is sent.
+            while not getattr(browser, 'aborted', False):
+                remaining = end - time.time()
+                if remaining <= 0:
+                    break
+                time.sleep(min(remaining, self.SLEEP_SLICE))
+        return req
+
+    https_request = http_request
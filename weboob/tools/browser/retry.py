@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2013 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+from __future__ import with_statement
+
+from email.utils import parsedate_tz, mktime_tz
+import random
+from threading import Lock
+import time
+
+
+__all__ = ['RetryPolicy', 'parse_retry_after']
+
+
+def parse_retry_after(value):
+    """
+    Get the delay in seconds of a Retry-After header, given in seconds or as
+    an HTTP date, or None if it is not valid.
+
+    :rtype: float
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    return max(0, mktime_tz(date) - time.time())
+
+
+class HostState(object):
+    """
+    Failures and retries of a host.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self):
+        self.circuit = self.CLOSED
+        self.opened_until = 0
+        # Consecutive failures
+        self.failures = 0
+        # Requests and retries of the current budget window
+        self.window_start = time.time()
+        self.requests = 0
+        self.retries = 0
+
+
+class RetryPolicy(object):
+    """
+    Policy of retries of failed requests, by host.
+
+    A failed request is retried after a delay growing exponentially from
+    *delay* up to *max_delay*, with a random jitter so clients do not retry
+    in lockstep. A Retry-After header given by the server is used instead,
+    if it is not longer than *max_delay*.
+
+    Retries of a host are limited by a budget: in each *budget_window*
+    seconds, at most *budget_ratio* retries per request are made, plus
+    *budget_min*. So a failing host is not hammered by retries.
+
+    After *threshold* consecutive failures, the circuit of the host is open:
+    requests are refused by :func:`before` during *cooldown* seconds. Then a
+    request is tried again, which closes the circuit if it succeeds, or opens
+    it again.
+
+    :param tries: maximum number of tries of a request
+    :type tries: int
+    :param delay: delay in seconds before the first retry
+    :type delay: float
+    :param max_delay: maximum delay in seconds before a retry
+    :type max_delay: float
+    :param backoff: multiplier of the delay after each retry
+    :type backoff: float
+    :param jitter: part of the delay which is random, between 0 and 1
+    :type jitter: float
+    :param budget_ratio: ratio of retries allowed per request
+    :type budget_ratio: float
+    :param budget_min: number of retries always allowed in a window
+    :type budget_min: int
+    :param budget_window: duration in seconds of a budget window
+    :type budget_window: float
+    :param threshold: number of consecutive failures which opens the circuit
+                      (0 to disable the circuit breaker)
+    :type threshold: int
+    :param cooldown: delay in seconds during which the circuit stays open
+    :type cooldown: float
+    """
+    def __init__(self, tries=3, delay=1, max_delay=10, backoff=2, jitter=0.5,
+                 budget_ratio=0.2, budget_min=3, budget_window=60,
+                 threshold=5, cooldown=60):
+        self.tries = tries
+        self.delay = delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.jitter = jitter
+        self.budget_ratio = budget_ratio
+        self.budget_min = budget_min
+        self.budget_window = budget_window
+        self.threshold = threshold
+        self.cooldown = cooldown
+
+        self.mutex = Lock()
+        self.hosts = {}
+
+    def _get_state(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState()
+        now = time.time()
+        if now - state.window_start > self.budget_window:
+            state.window_start = now
+            state.requests = 0
+            state.retries = 0
+        return state
+
+    def before(self, host):
+        """
+        Check if a request can be made to a host. It has to be followed by
+        a call to :func:`success` or :func:`failure`.
+
+        :returns: None if the request can be made, the delay in seconds
+                  before requests are accepted again if the circuit of the
+                  host is open, or 0 if it is half-open (another request is
+                  checking if the host is back)
+        :rtype: float
+        """
+        with self.mutex:
+            state = self._get_state(host)
+            if state.circuit == HostState.OPEN:
+                delay = state.opened_until - time.time()
+                if delay > 0:
+                    return delay
+                # Let one request check if the host is back.
+                state.circuit = HostState.HALF_OPEN
+            elif state.circuit == HostState.HALF_OPEN:
+                return 0
+            state.requests += 1
+            return None
+
+    def success(self, host):
+        """
+        A request to a host has succeeded, or has failed for a reason which
+        does not concern the availability of the host.
+        """
+        with self.mutex:
+            state = self._get_state(host)
+            state.failures = 0
+            state.circuit = HostState.CLOSED
+
+    def cancel(self, host):
+        """
+        A request to a host has been interrupted, or has failed for a reason
+        which does not concern the host: it counts neither as a success nor
+        as a failure. If it was checking if the host is back, the next
+        request checks it.
+        """
+        with self.mutex:
+            state = self._get_state(host)
+            if state.circuit == HostState.HALF_OPEN:
+                state.circuit = HostState.OPEN
+                state.opened_until = 0
+
+    def failure(self, host, tries, retry_after=None):
+        """
+        A request to a host has failed.
+
+        :param tries: number of tries of the request
+        :type tries: int
+        :param retry_after: delay in seconds asked by the server
+        :type retry_after: float
+        :returns: delay in seconds before retrying, or None if the request
+                  must not be retried
+        :rtype: float
+        """
+        with self.mutex:
+            state = self._get_state(host)
+            state.failures += 1
+            if state.circuit == HostState.HALF_OPEN or \
+               (self.threshold and state.failures >= self.threshold):
+                self._open(state, retry_after)
+                return None
+
+            if retry_after is not None and retry_after > self.max_delay:
+                # The host is not expected to be back soon.
+                self._open(state, retry_after)
+                return None
+
+            if tries >= self.tries or \
+               state.retries >= self.budget_min + self.budget_ratio * state.requests:
+                return None
+            state.retries += 1
+
+        if retry_after is not None:
+            return retry_after
+        delay = min(self.max_delay, self.delay * self.backoff ** (tries - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def _open(self, state, retry_after=None):
+        state.circuit = HostState.OPEN
+        state.opened_until = time.time() + max(self.cooldown, retry_after or 0)
+
+    def reset(self, host=None):
+        """
+        Forget failures of a host, or of every hosts if *host* is None.
+        """
+        with self.mutex:
+            if host is None:
+                self.hosts.clear()
+            else:
+                self.hosts.pop(host, None)
+
+
+def test():
+    policy = RetryPolicy(tries=3, delay=1, max_delay=10, backoff=2, jitter=0,
+                         budget_ratio=0, budget_min=100, threshold=3, cooldown=60)
+    host = 'example.org'
+
+    # Retries with an exponential backoff, until the maximum of tries.
+    assert policy.before(host) is None
+    assert policy.failure(host, 1) == 1
+    assert policy.failure(host, 2) == 2
+    assert policy.failure(host, 3) is None
+    policy.success(host)
+    assert policy.hosts[host].circuit == HostState.CLOSED
+
+    # A Retry-After header is followed, or opens the circuit if it is too
+    # long.
+    assert policy.failure(host, 1, retry_after=5) == 5
+    assert policy.failure(host, 1, retry_after=3600) is None
+    assert policy.before(host) > 3000
+    policy.reset(host)
+
+    # Consecutive failures open the circuit.
+    for tries in xrange(1, 3):
+        assert policy.before(host) is None
+        assert policy.failure(host, tries) is not None
+    assert policy.failure(host, 3) is None
+    state = policy.hosts[host]
+    assert state.circuit == HostState.OPEN
+    assert 59 < policy.before(host) <= 60
+
+    # After the cooldown, one request checks if the host is back.
+    state.opened_until = 0
+    assert policy.before(host) is None
+    assert state.circuit == HostState.HALF_OPEN
+    assert policy.before(host) == 0
+
+    # Its failure opens the circuit again...
+    assert policy.failure(host, 1) is None
+    assert state.circuit == HostState.OPEN
+    assert policy.before(host) > 0
+
+    # ...if it is interrupted, the next request checks the host...
+    state.opened_until = 0
+    assert policy.before(host) is None
+    policy.cancel(host)
+    assert state.circuit == HostState.OPEN
+    assert policy.before(host) is None
+    assert state.circuit == HostState.HALF_OPEN
+
+    # ...and its success closes the circuit.
+    policy.success(host)
+    assert state.circuit == HostState.CLOSED
+    assert policy.before(host) is None
+
+    # Retries are limited by the budget.
+    policy = RetryPolicy(tries=10, jitter=0, budget_ratio=0.5, budget_min=1, threshold=0)
+    for i in xrange(4):
+        policy.before(host)
+        policy.success(host)
+    assert policy.failure(host, 1) is not None
+    assert policy.failure(host, 1) is not None
+    assert policy.failure(host, 1) is not None
+    assert policy.failure(host, 1) is None
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2013 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+from __future__ import with_statement
+
+from functools import wraps
+from threading import RLock
+import time
+
+
+__all__ = ['AccountsCache', 'cache_accounts', 'cache_account', 'invalidate_accounts']
+
+
+class AccountsCache(object):
+    """
+    Accounts of a backend, by account ID.
+
+    Accounts are kept for *ttl* seconds, so getting an account or its
+    history right after listing accounts does not fetch the accounts list
+    again. Every backend instance has its own cache (see :func:`get`), and
+    copies of accounts are stored and given back, so callers can change
+    them without affecting other callers.
+
+    Backends use it with the :func:`cache_accounts`, :func:`cache_account`
+    and :func:`invalidate_accounts` decorators.
+
+    :param ttl: delay in seconds after which accounts are fetched again
+    :type ttl: int
+    """
+    # Protect the creation of the cache of a backend
+    _creation_mutex = RLock()
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.mutex = RLock()
+        # (time, list of accounts)
+        self.list = None
+        # (time, account) by account ID
+        self.accounts = {}
+
+    @classmethod
+    def get(cls, backend, *args, **kwargs):
+        """
+        Get the cache of a backend instance, created on first use.
+
+        :param backend: backend instance
+        :type backend: :class:`weboob.tools.backend.BaseBackend`
+        """
+        with cls._creation_mutex:
+            cache = getattr(backend, '_accounts_cache', None)
+            if cache is None:
+                cache = backend._accounts_cache = cls(*args, **kwargs)
+            return cache
+
+    def _is_fresh(self, stored_at):
+        return time.time() - stored_at < self.ttl
+
+    def get_list(self):
+        """
+        Get the accounts list, or None if it is not stored or has expired.
+
+        :rtype: list[:class:`weboob.capabilities.bank.Account`]
+        """
+        with self.mutex:
+            if self.list is None:
+                return None
+            stored_at, accounts = self.list
+            if not self._is_fresh(stored_at):
+                self.list = None
+                return None
+            return [account.copy() for account in accounts]
+
+    def set_list(self, accounts):
+        """
+        Store the accounts list.
+        """
+        now = time.time()
+        accounts = [account.copy() for account in accounts]
+        with self.mutex:
+            self.list = (now, accounts)
+            for account in accounts:
+                self.accounts[account.id] = (now, account)
+
+    def get_account(self, id):
+        """
+        Get an account, or None if it is not stored or has expired.
+
+        :param id: ID of the account
+        :type id: str
+        :rtype: :class:`weboob.capabilities.bank.Account`
+        """
+        with self.mutex:
+            try:
+                stored_at, account = self.accounts[id]
+            except KeyError:
+                return None
+            if not self._is_fresh(stored_at):
+                self.accounts.pop(id)
+                return None
+            return account.copy()
+
+    def set_account(self, account):
+        """
+        Store an account.
+        """
+        with self.mutex:
+            self.accounts[account.id] = (time.time(), account.copy())
+
+    def invalidate(self):
+        """
+        Forget every accounts.
+        """
+        with self.mutex:
+            self.list = None
+            self.accounts.clear()
+
+
+def cache_accounts(func):
+    """
+    Decorator of :func:`weboob.capabilities.bank.ICapBank.iter_accounts`,
+    which gives the accounts from the :class:`AccountsCache` of the backend
+    when they have been listed recently.
+
+    The list is stored only if it has been entirely iterated.
+    """
+    @wraps(func)
+    def inner(self):
+        cache = AccountsCache.get(self)
+        accounts = cache.get_list()
+        if accounts is not None:
+            for account in accounts:
+                yield account
+            return
+
+        accounts = []
+        for account in func(self):
+            # Stored before the caller can change it.
+            accounts.append(account.copy())
+            yield account
+        cache.set_list(accounts)
+    return inner
+
+
+def cache_account(func):
+    """
+    Decorator of :func:`weboob.capabilities.bank.ICapBank.get_account`,
+    which looks for the account in the :class:`AccountsCache` of the backend
+    before calling the method.
+    """
+    @wraps(func)
+    def inner(self, id, *args, **kwargs):
+        cache = AccountsCache.get(self)
+        account = cache.get_account(id)
+        if account is None:
+            account = func(self, id, *args, **kwargs)
+            if account is not None:
+                cache.set_account(account)
+        return account
+    return inner
+
+
+def invalidate_accounts(func):
+    """
+    Decorator of methods which change accounts, like
+    :func:`weboob.capabilities.bank.ICapBank.transfer`: stored accounts of
+    the backend are forgotten once the method has been called, even if it
+    has failed.
+    """
+    @wraps(func)
+    def inner(self, *args, **kwargs):
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            AccountsCache.get(self).invalidate()
+    return inner
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2013 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+import datetime
+import hashlib
+
+from weboob.capabilities.base import empty
+from weboob.tools.log import getLogger
+
+
+__all__ = ['NoStorage', 'HistorySync', 'iter_new_history', 'transaction_hash']
+
+
+class NoStorage(Exception):
+    """
+    The backend has no storage to keep the high-water mark.
+    """
+
+
+def transaction_hash(transaction):
+    """
+    Get a hash of a transaction which does not change between two syncs,
+    made from its date, amount and raw label.
+
+    :rtype: str
+    """
+    values = []
+    for value in (transaction.date, transaction.amount, transaction.raw or transaction.label):
+        if empty(value):
+            value = u''
+        values.append(unicode(value))
+    return hashlib.sha1(u'|'.join(values).encode('utf-8')).hexdigest()
+
+
+def _get_date(transaction):
+    date = transaction.date
+    if isinstance(date, datetime.datetime):
+        return date.date()
+    if isinstance(date, datetime.date):
+        return date
+    return None
+
+
+class HistorySync(object):
+    """
+    High-water mark of the history of an account, stored in the storage of
+    its backend.
+
+    The mark is the date of the most recent transaction seen, plus the hashes
+    of the transactions seen during the *overlap* days before it: banks may
+    add transactions with a past date, so these days are read again, and
+    known transactions are skipped with their hashes.
+
+    :param backend: backend of the account
+    :type backend: :class:`weboob.tools.backend.BaseBackend`
+    :param account_id: ID of the account
+    :type account_id: str
+    :param overlap: number of days before the mark which are read again
+    :type overlap: int
+    :raises: :class:`NoStorage` if the backend has been loaded without a
+             storage, as every sync would give the whole history
+    """
+    OVERLAP = 7
+    # Number of consecutive transactions older than the overlap window which
+    # are tolerated before stopping, for histories which are not exactly
+    # sorted.
+    TOLERANCE = 3
+
+    def __init__(self, backend, account_id, overlap=None):
+        if backend.storage.storage is None:
+            raise NoStorage('Backend %s has no storage to keep the history mark' % backend.name)
+
+        self.logger = getLogger('historysync', backend.logger)
+        self.backend = backend
+        self.account_id = account_id
+        self.overlap = datetime.timedelta(days=self.OVERLAP if overlap is None else overlap)
+
+        mark = backend.storage.get('history_sync', account_id, default={})
+        try:
+            self.date = datetime.datetime.strptime(mark['date'], '%Y-%m-%d').date()
+        except (KeyError, TypeError, ValueError):
+            self.date = None
+        # date of seen transactions, by hash
+        self.seen = dict(mark.get('seen', {})) if self.date is not None else {}
+
+    def is_synced(self):
+        """
+        Check if the history has already been synced once.
+        """
+        return self.date is not None
+
+    def iter_new(self, transactions):
+        """
+        Iterate on the transactions which have not been seen yet, stopping
+        once transactions are older than the overlap window.
+
+        *transactions* have to be sorted from the most recent, with at most
+        :attr:`TOLERANCE` consecutive transactions out of order. The mark is
+        updated and saved only once the iteration is finished, so an
+        interrupted iteration gives the same transactions again next time.
+
+        :param transactions: history of the account
+        :type transactions: iter[:class:`weboob.capabilities.bank.Transaction`]
+        :rtype: iter[:class:`weboob.capabilities.bank.Transaction`]
+        """
+        limit = self.date - self.overlap if self.date is not None else None
+        last_date = self.date
+        new_seen = {}
+        # Identical transactions of a same day are numbered.
+        occurrences = {}
+        count = 0
+        older = 0
+
+        for transaction in transactions:
+            date = _get_date(transaction)
+            if limit is not None and date is not None and date < limit:
+                older += 1
+                if older > self.TOLERANCE:
+                    break
+                continue
+            older = 0
+
+            h = transaction_hash(transaction)
+            occurrences[h] = occurrences.get(h, 0) + 1
+            if occurrences[h] > 1:
+                h = '%s#%d' % (h, occurrences[h])
+
+            if date is not None:
+                new_seen[h] = date
+                if last_date is None or date > last_date:
+                    last_date = date
+
+            if h in self.seen:
+                continue
+
+            count += 1
+            yield transaction
+
+        self.logger.debug('%d new transactions on account %s' % (count, self.account_id))
+        self.save(last_date, new_seen)
+
+    def save(self, date, new_seen):
+        if date is None:
+            return
+
+        limit = date - self.overlap
+        seen = {}
+        for h, d in self.seen.iteritems():
+            if isinstance(d, basestring):
+                d = datetime.datetime.strptime(d, '%Y-%m-%d').date()
+            if d >= limit:
+                seen[h] = d.strftime('%Y-%m-%d')
+        for h, d in new_seen.iteritems():
+            if d >= limit:
+                seen[h] = d.strftime('%Y-%m-%d')
+
+        self.date = date
+        self.seen = seen
+        self.backend.storage.set('history_sync', self.account_id,
+                                 {'date': date.strftime('%Y-%m-%d'), 'seen': seen})
+        self.backend.storage.save()
+
+    def reset(self):
+        """
+        Forget the mark, so the next sync gives the whole history.
+        """
+        self.date = None
+        self.seen = {}
+        self.backend.storage.delete('history_sync', self.account_id)
+        self.backend.storage.save()
+
+
+def iter_new_history(backend, account, overlap=None):
+    """
+    Iterate on the transactions of an account which are new since the last
+    call, and stop fetching the history once known transactions are reached.
+
+    It is called with the backend of the account:
+
+    >>> for backend, transaction in weboob.do(iter_new_history, account, backends=account.backend):
+    ...     print transaction
+
+    :param account: account
+    :type account: :class:`weboob.capabilities.bank.Account`
+    :param overlap: number of days before the last sync which are read again
+                    (default is :attr:`HistorySync.OVERLAP`)
+    :type overlap: int
+    :rtype: iter[:class:`weboob.capabilities.bank.Transaction`]
+    """
+    sync = HistorySync(backend, account.id, overlap)
+    return sync.iter_new(backend.iter_history(account))
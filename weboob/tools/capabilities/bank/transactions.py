@@ -31,15 +31,224 @@ from weboob.tools.log import getLogger
 __all__ = ['FrenchTransaction']
 
 
+_SPECIAL_CHARS = frozenset('.^$*+?{}[]\\|()')
+_OPTIONAL_MARKS = ('?', '*', '{')
+
+
+def _skip(source, i):
+    """
+    Get the index after the escape sequence or the character class which
+    starts at i, or -1 if it is not terminated.
+    """
+    if source[i] == '\\':
+        return i + 2
+    if source[i] == '[':
+        # ']' can be the first character of the class.
+        end = source.find(']', i + 2)
+        return end + 1 if end > 0 else -1
+    return i + 1
+
+
+def _has_alternation(source):
+    """
+    Check if a regexp has a top-level alternation.
+    """
+    depth = 0
+    i = 0
+    while 0 <= i < len(source):
+        c = source[i]
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c == '|' and depth == 0:
+            return True
+        i = _skip(source, i)
+    return i < 0
+
+
+def _group_end(source, i):
+    """
+    Get the index of the parenthesis which closes the group starting at i.
+    """
+    depth = 0
+    while 0 <= i < len(source):
+        c = source[i]
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+        i = _skip(source, i)
+    return -1
+
+
+def _literal_prefix(source):
+    """
+    Get the literal prefix of a regexp source, and if the whole source is
+    literal.
+    """
+    prefix = []
+    i = 0
+    while i < len(source):
+        c = source[i]
+        if c == '(':
+            end = _group_end(source, i)
+            if end < 0 or source[end+1:end+2] in _OPTIONAL_MARKS:
+                break
+            if source.startswith('(?P<', i):
+                start = source.index('>', i) + 1
+            elif source.startswith('(?:', i):
+                start = i + 3
+            elif source.startswith('(?', i):
+                break
+            else:
+                start = i + 1
+            content = source[start:end]
+            if _has_alternation(content):
+                break
+            sub, complete = _literal_prefix(content)
+            prefix.append(sub)
+            if not complete:
+                break
+            i = end + 1
+            continue
+
+        if c == '\\':
+            literal = source[i+1:i+2]
+            if not literal or literal.isalnum():
+                break
+            step = 2
+        elif c in _SPECIAL_CHARS:
+            break
+        else:
+            literal = c
+            step = 1
+        if source[i+step:i+step+1] in _OPTIONAL_MARKS:
+            break
+        prefix.append(literal)
+        i += step
+    else:
+        return source[:0].join(prefix), True
+    return source[:0].join(prefix), False
+
+
+def literal_prefix(regexp):
+    """
+    Get the literal string which starts every string matched by a compiled
+    regexp, or an empty string if there is none.
+
+    >>> literal_prefix(re.compile('^(?P<category>VIR(EMENT)?) (?P<text>.*)'))
+    u'VIR'
+    """
+    if regexp.flags & (re.IGNORECASE | re.VERBOSE):
+        return u''
+
+    source = regexp.pattern
+    if _has_alternation(source):
+        return u''
+    if source.startswith('^'):
+        source = source[1:]
+
+    prefix, complete = _literal_prefix(source)
+    if isinstance(prefix, str):
+        try:
+            prefix = prefix.decode('ascii')
+        except UnicodeDecodeError:
+            return u''
+    return prefix
+
+
+class PatternsClassifier(object):
+    """
+    Find the first pattern of a list of (regexp, type) which matches a label.
+
+    Only patterns whose literal prefix matches the label are tried, and
+    results are memoized by label, as the same labels come back often.
+
+    :param patterns: list of (compiled regexp, type)
+    :type patterns: list
+    """
+    MEMO_SIZE = 10000
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+        self.size = len(patterns)
+        self.prefixes = [literal_prefix(regexp) for regexp, _type in patterns]
+
+        # Indexes of patterns to try, by the first character of labels, in
+        # the order of the list.
+        self.unprefixed = [i for i, prefix in enumerate(self.prefixes) if not prefix]
+        self.candidates = {}
+        for i, prefix in enumerate(self.prefixes):
+            if prefix:
+                self.candidates.setdefault(prefix[0], list(self.unprefixed)).append(i)
+        for indexes in self.candidates.itervalues():
+            indexes.sort()
+
+        self.memo = {}
+
+    def match(self, label):
+        """
+        Get the type and the named groups of the first matching pattern.
+
+        It gives the same result as trying every pattern in order:
+
+        >>> patterns = [(re.compile('^VIR(EMENT)? (?P<text>.*)'), 'transfer'),
+        ...             (re.compile('^CB (?P<text>.*?) (?P<dd>\d{2})/(?P<mm>\d{2})'), 'card'),
+        ...             (re.compile('^(PRLV|PRELEVEMENT) (?P<text>.*)'), 'order'),
+        ...             (re.compile('.*(?P<text>RETRAIT) DAB'), 'withdrawal'),
+        ...             (re.compile('^CB (?P<text>.*)'), 'card_summary'),
+        ...             (re.compile('^(?P<text>.*)', re.IGNORECASE), 'other')]
+        >>> def sequential(label):
+        ...     for regexp, _type in patterns:
+        ...         m = regexp.match(label)
+        ...         if m:
+        ...             return (_type, m.groupdict())
+        >>> classifier = PatternsClassifier(patterns)
+        >>> labels = [u'VIREMENT SALAIRE', u'VIR LOYER', u'CB SHOP 12/05',
+        ...           u'CB RETRAIT DAB', u'CB SHOP', u'PRLV EDF',
+        ...           u'PRELEVEMENT GDF', u'cheque 42', u'']
+        >>> [classifier.match(label)[0] for label in labels]
+        ['transfer', 'transfer', 'card', 'withdrawal', 'card_summary', 'order', 'order', 'other', 'other']
+        >>> all(classifier.match(label) == sequential(label) for label in labels)
+        True
+
+        :param label: label to classify
+        :type label: unicode
+        :returns: (type, dict), or None if no pattern matches
+        """
+        try:
+            return self.memo[label]
+        except KeyError:
+            pass
+
+        result = None
+        for i in self.candidates.get(label[:1], self.unprefixed):
+            prefix = self.prefixes[i]
+            if prefix and not label.startswith(prefix):
+                continue
+            regexp, _type = self.patterns[i]
+            m = regexp.match(label)
+            if m:
+                result = (_type, m.groupdict())
+                break
+
+        if len(self.memo) >= self.MEMO_SIZE:
+            self.memo.clear()
+        self.memo[label] = result
+        return result
+
+
 class FrenchTransaction(Transaction):
     """
     Transaction with some helpers for french bank websites.
     """
     PATTERNS = []
 
-    def __init__(self, *args, **kwargs):
-        Transaction.__init__(self, *args, **kwargs)
-        self._logger = getLogger('FrenchTransaction')
+    # Shared by transactions, as getting a logger for each of them is costly.
+    _logger = getLogger('FrenchTransaction')
 
     @classmethod
     def clean_amount(klass, text):
@@ -49,6 +258,20 @@ class FrenchTransaction(Transaction):
         text = text.replace('.','').replace(',','.')
         return re.sub(u'[^\d\-\.]', '', text)
 
+    @classmethod
+    def get_classifier(klass):
+        """
+        Get the classifier of the PATTERNS of this class.
+
+        :rtype: :class:`PatternsClassifier`
+        """
+        classifier = klass.__dict__.get('_classifier')
+        if classifier is None or classifier.patterns is not klass.PATTERNS or \
+           classifier.size != len(klass.PATTERNS):
+            classifier = PatternsClassifier(klass.PATTERNS)
+            klass._classifier = classifier
+        return classifier
+
     def set_amount(self, credit='', debit=''):
         """
         Set an amount value from a string.
@@ -108,48 +331,38 @@ class FrenchTransaction(Transaction):
         else:
             self.label = self.raw
 
-        for pattern, _type in self.PATTERNS:
-            m = pattern.match(self.raw)
-            if m:
-                args = m.groupdict()
-
-                def inargs(key):
-                    """
-                    inner function to check if a key is in args,
-                    and is not None.
-                    """
-                    return args.get(key, None) is not None
-
-                self.type = _type
-                if inargs('text'):
-                    self.label = args['text'].strip()
-                if inargs('category'):
-                    self.category = args['category'].strip()
-
-                # Set date from information in raw label.
-                if inargs('dd') and inargs('mm'):
-                    dd = int(args['dd'])
-                    mm = int(args['mm'])
-
-                    if inargs('yy'):
-                        yy = int(args['yy'])
-                    else:
-                        d = self.date
-                        try:
-                            d = d.replace(month=mm, day=dd)
-                        except ValueError:
-                            d = d.replace(year=d.year-1, month=mm, day=dd)
-
-                        yy = d.year
-                        if d > self.date:
-                            yy -= 1
-
-                    if yy < 100:
-                        yy += 2000
-
-                    if inargs('HH') and inargs('MM'):
-                        self.rdate = datetime.datetime(yy, mm, dd, int(args['HH']), int(args['MM']))
-                    else:
-                        self.rdate = datetime.date(yy, mm, dd)
-
-                return
+        match = self.get_classifier().match(self.raw)
+        if match is None:
+            return
+
+        self.type, args = match
+        if args.get('text') is not None:
+            self.label = args['text'].strip()
+        if args.get('category') is not None:
+            self.category = args['category'].strip()
+
+        # Set date from information in raw label.
+        if args.get('dd') is not None and args.get('mm') is not None:
+            dd = int(args['dd'])
+            mm = int(args['mm'])
+
+            if args.get('yy') is not None:
+                yy = int(args['yy'])
+            else:
+                d = self.date
+                try:
+                    d = d.replace(month=mm, day=dd)
+                except ValueError:
+                    d = d.replace(year=d.year-1, month=mm, day=dd)
+
+                yy = d.year
+                if d > self.date:
+                    yy -= 1
+
+            if yy < 100:
+                yy += 2000
+
+            if args.get('HH') is not None and args.get('MM') is not None:
+                self.rdate = datetime.datetime(yy, mm, dd, int(args['HH']), int(args['MM']))
+            else:
+                self.rdate = datetime.date(yy, mm, dd)
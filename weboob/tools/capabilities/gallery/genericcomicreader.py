@@ -60,7 +60,7 @@ class GenericComicReaderBrowser(BaseBrowser):
 
     def fill_image(self, image, fields):
         if 'data' in fields:
-            image.data = self.readurl(image.url)
+            image.data = self.open_blob(image.url)
 
 
 class GenericComicReaderBackend(BaseBackend, ICapGallery):
@@ -113,6 +113,12 @@ class GenericComicReaderBackend(BaseBackend, ICapGallery):
         with self.browser:
             self.browser.fill_image(image, fields)
 
+    def open_image(self, image, offset=0):
+        # The browser is only locked while the request is made: the body is
+        # read without it, so several images can be downloaded at once.
+        with self.browser:
+            return self.browser.open_stream(image.url, offset)
+
     OBJECTS = {
             BaseGallery: fill_gallery,
             BaseImage: fill_image}
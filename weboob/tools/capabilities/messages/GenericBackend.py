@@ -23,7 +23,7 @@ from __future__ import with_statement
 import time
 from weboob.capabilities.messages import ICapMessages, Message, Thread
 from weboob.tools.backend import BaseBackend
-from weboob.tools.newsfeed import Newsfeed
+from weboob.tools.newsfeed import NewsfeedCache
 
 
 class GenericNewspaperBackend(BaseBackend, ICapMessages):
@@ -39,8 +39,42 @@ class GenericNewspaperBackend(BaseBackend, ICapMessages):
     RSSID = None
     URL2ID = None
     RSSSIZE = 0
+    # The feed is requested at most once during this delay (in seconds), and
+    # parsed again only if it has changed.
+    FEED_CACHE_INTERVAL = 60
+
+    def __init__(self, *args, **kwargs):
+        BaseBackend.__init__(self, *args, **kwargs)
+        self.feeds = NewsfeedCache(self.FEED_CACHE_INTERVAL)
+
+    def get_feed(self, rssid_func=None):
+        """
+        Get the parsed feed of :attr:`RSS_FEED`.
+
+        Feeds are cached by function computing the IDs of entries, so a
+        backend has to give the same one everywhere it reads its feed.
+
+        :param rssid_func: function computing the IDs of entries (default is
+                           the IDs given by the feed, which are the IDs of
+                           threads of :func:`iter_threads`)
+        :rtype: :class:`weboob.tools.newsfeed.Newsfeed`
+        """
+        return self.feeds.get(self.RSS_FEED, rssid_func)
+
+    def _entry2thread(self, entry):
+        thread = Thread(entry.id)
+        thread.title = entry.title
+        thread.date = entry.datetime
+        return thread
 
     def _get_thread(self, id):
+        if self.iter_threads.im_func is GenericNewspaperBackend.iter_threads.im_func:
+            entry = self.get_feed().get_entry(id)
+            if entry is not None:
+                return self._entry2thread(entry)
+            return None
+
+        # Threads of subclasses may not be the entries of the feed.
         for thread in self.iter_threads():
             if thread.id == id:
                 return thread
@@ -84,11 +118,8 @@ class GenericNewspaperBackend(BaseBackend, ICapMessages):
         return thread
 
     def iter_threads(self):
-        for article in Newsfeed(self.RSS_FEED, GenericNewspaperBackend.RSSID).iter_entries():
-            thread = Thread(article.id)
-            thread.title = article.title
-            thread.date = article.datetime
-            yield(thread)
+        for article in self.get_feed().iter_entries():
+            yield self._entry2thread(article)
 
     def fill_thread(self, thread, fields):
         "fill the thread"
@@ -17,7 +17,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
-from weboob.capabilities.base import CapBaseObject, NotLoaded, StringField, BytesField
+from weboob.capabilities.base import CapBaseObject, NotLoaded, StringField, BlobField
 
 
 __all__ = ['Thumbnail']
@@ -29,7 +29,7 @@ class Thumbnail(CapBaseObject):
     """
 
     url =   StringField('URL to photo thumbnail')
-    data =  BytesField('Data')
+    data =  BlobField('Data')
 
     def __init__(self, url):
         CapBaseObject.__init__(self, url)
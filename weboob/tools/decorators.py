@@ -27,6 +27,7 @@ __all__ = ['retry']
 def retry(ExceptionToCheck, tries=4, delay=3, backoff=2):
     """
     Retry decorator
+    (browsers use :class:`weboob.tools.browser.retry.RetryPolicy` instead)
     from http://www.saltycrane.com/blog/2009/11/trying-out-retry-decorator-python/
     original from http://wiki.python.org/moin/PythonDecoratorLibrary#Retry
     """
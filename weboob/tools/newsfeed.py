@@ -18,6 +18,7 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 import datetime
+import time
 
 try:
     import feedparser
@@ -31,7 +32,7 @@ if feedparser.__version__ >= '5.0':
     import re
     sgmllib.endbracket = re.compile('[<>]')
 
-__all__ = ['Entry', 'Newsfeed']
+__all__ = ['Entry', 'Newsfeed', 'NewsfeedCache']
 
 
 class Entry(object):
@@ -85,15 +86,96 @@ class Entry(object):
 
 
 class Newsfeed(object):
-    def __init__(self, url, rssid_func=None):
-        self.feed = feedparser.parse(url)
+    """
+    Parsed feed.
+
+    :param url: URL of the feed
+    :type url: str
+    :param rssid_func: function to compute IDs of entries
+    :param previous: previous version of this feed; the feed is only
+                     downloaded and parsed again if it has changed since
+                     (according to its ETag and Last-Modified headers)
+    :type previous: :class:`Newsfeed`
+    """
+    def __init__(self, url, rssid_func=None, previous=None):
+        self.url = url
         self.rssid_func = rssid_func
+        self._entries = None
+        self._index = None
+
+        if previous is None:
+            self.feed = feedparser.parse(url)
+        else:
+            self.feed = feedparser.parse(url, etag=previous.feed.get('etag'),
+                                         modified=previous.feed.get('modified'))
+            if self.feed.get('status') == 304:
+                self.feed = previous.feed
+                if previous.rssid_func == rssid_func:
+                    self._entries = previous._entries
+                    self._index = previous._index
+
+    def get_entries(self):
+        """
+        Get entries of the feed, parsed once.
+
+        :rtype: list[:class:`Entry`]
+        """
+        if self._entries is None:
+            self._entries = [Entry(entry, self.rssid_func) for entry in self.feed['entries']]
+        return self._entries
 
     def iter_entries(self):
-        for entry in self.feed['entries']:
-            yield Entry(entry, self.rssid_func)
+        return iter(self.get_entries())
 
     def get_entry(self, id):
-        for entry in self.feed['entries']:
-            if entry.id == id:
-                return Entry(entry, self.rssid_func)
+        """
+        Get an entry by its ID, or None.
+        """
+        if self._index is None:
+            index = {}
+            for raw, entry in zip(self.feed['entries'], self.get_entries()):
+                index.setdefault(entry.id, entry)
+                # Entries can also be found with their ID in the feed.
+                if hasattr(raw, 'id'):
+                    index.setdefault(raw.id, entry)
+            self._index = index
+        return self._index.get(id)
+
+
+class NewsfeedCache(object):
+    """
+    Cache of feeds, by URL and function computing the IDs of entries.
+
+    A feed is not requested again during *min_interval* seconds, and then
+    it is only parsed again if it has changed.
+
+    :param min_interval: delay in seconds during which a feed is reused
+    :type min_interval: int
+    """
+    def __init__(self, min_interval=60):
+        self.min_interval = min_interval
+        # (time, Newsfeed) by (URL, rssid_func)
+        self.feeds = {}
+
+    def get(self, url, rssid_func=None):
+        """
+        Get a feed.
+
+        :rtype: :class:`Newsfeed`
+        """
+        key = (url, rssid_func)
+        now = time.time()
+        try:
+            fetched_at, feed = self.feeds[key]
+        except KeyError:
+            feed = Newsfeed(url, rssid_func)
+        else:
+            if now - fetched_at < self.min_interval:
+                return feed
+            feed = Newsfeed(url, rssid_func, previous=feed)
+
+        self.feeds[key] = (now, feed)
+        return feed
+
+    def clear(self):
+        self.feeds.clear()
@@ -18,9 +18,32 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
+from __future__ import with_statement
+
+import atexit
 from copy import deepcopy
+import os
+from threading import RLock, Timer, current_thread
+from urllib import quote
+from weakref import WeakSet
+
+import yaml
+
+from .config.yamlconfig import YamlConfig, Loader
+from .log import getLogger
+
+
+__all__ = ['IStorage', 'StandardStorage', 'BatchedStorage']
+
 
-from .config.yamlconfig import YamlConfig
+# Storages with pending changes are flushed at exit.
+_storages = WeakSet()
+
+
+@atexit.register
+def _flush_storages():
+    for storage in list(_storages):
+        storage.flush()
 
 
 class IStorage(object):
@@ -54,6 +77,11 @@ class IStorage(object):
         """
         raise NotImplementedError()
 
+    def flush(self):
+        """
+        Write on the disk changes which have been saved but not written yet.
+        """
+
 
 class StandardStorage(IStorage):
     def __init__(self, path):
@@ -81,3 +109,119 @@ class StandardStorage(IStorage):
 
     def get(self, what, name, *args, **kwargs):
         return self.config.get(what, name, *args, **kwargs)
+
+
+class BatchedStorage(IStorage):
+    """
+    Storage where each record (the data of a backend or of an application) is
+    kept in its own YAML file, so saving a record does not rewrite the other
+    ones.
+
+    Writes are deferred: :func:`save` only marks the record as dirty, and
+    dirty records are written together at most *delay* seconds later, when
+    :func:`flush` is called, or at exit.
+
+    Files are stored in the "*path*.d" directory. If *path* is a file written
+    by :class:`StandardStorage`, its data are imported.
+
+    :param path: path of the storage
+    :type path: str
+    :param delay: maximum delay in seconds before writing saved changes. 0
+                  writes them immediately
+    :type delay: int
+    """
+    def __init__(self, path, delay=5):
+        self.logger = getLogger('storage')
+        self.path = path + '.d'
+        self.delay = delay
+        self.mutex = RLock()
+        # YamlConfig objects by (what, name)
+        self.records = {}
+        self.dirty = set()
+        self.timer = None
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+            if os.path.isfile(path):
+                self._import(path)
+
+        _storages.add(self)
+
+    def _import(self, path):
+        self.logger.debug(u'Importing storage file %s' % path)
+        config = YamlConfig(path)
+        config.load()
+        with self.mutex:
+            for what, records in config.values.iteritems():
+                for name, values in (records or {}).iteritems():
+                    record = self._record(what, name)
+                    record.values = values
+                    self.dirty.add((what, name))
+            self.flush()
+
+    def _filename(self, what, name):
+        return os.path.join(self.path, '%s.%s.yaml' % (quote(what, ''), quote(name, '')))
+
+    def _record(self, what, name):
+        try:
+            return self.records[(what, name)]
+        except KeyError:
+            pass
+
+        record = YamlConfig(self._filename(what, name))
+        try:
+            with open(record.path, 'r') as f:
+                record.values = yaml.load(f, Loader=Loader) or {}
+        except IOError:
+            pass
+        self.records[(what, name)] = record
+        return record
+
+    def load(self, what, name, default={}):
+        with self.mutex:
+            record = self._record(what, name)
+            values = deepcopy(default)
+            values.update(record.values)
+            record.values = values
+
+    def save(self, what, name):
+        with self.mutex:
+            self.dirty.add((what, name))
+            if self.delay <= 0:
+                self.flush()
+            elif self.timer is None:
+                # Do not postpone the timer on next saves, so changes are
+                # written even if the record is saved continuously.
+                self.timer = Timer(self.delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.mutex:
+            timer, self.timer = self.timer, None
+            if timer is not None:
+                timer.cancel()
+
+            dirty, self.dirty = self.dirty, set()
+            for key in dirty:
+                try:
+                    self.records[key].save()
+                except (IOError, OSError), e:
+                    self.logger.error(u'Unable to write storage of %s %s: %s' % (key[0], key[1], e))
+
+        # Wait for the cancelled timer, so it is not still running when the
+        # interpreter shuts down after the flush at exit.
+        if timer is not None and timer is not current_thread():
+            timer.join()
+
+    def set(self, what, name, *args):
+        with self.mutex:
+            self._record(what, name).set(*args)
+
+    def delete(self, what, name, *args):
+        with self.mutex:
+            self._record(what, name).delete(*args)
+
+    def get(self, what, name, *args, **kwargs):
+        with self.mutex:
+            return self._record(what, name).get(*args, **kwargs)